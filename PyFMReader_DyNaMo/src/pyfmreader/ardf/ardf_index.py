@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+""" File containing the ARDFIndex class, used to relate each force curve
+of an ARDF force map to the position of its data in the file.
+
+The records of a line are only walked once, the first time a curve of
+that line is requested. The data of the channels is skipped, so indexing
+a line only reads the VSET, VNAM and VDAT headers. """
+
+import numpy as np
+from .utils_ardf import *
+
+ardf_index_dtype = np.dtype([
+    ('offset', np.int64),
+    ('size', np.int64),
+    ('nbytes', np.int64)
+])
+
+class ARDFIndex:
+    """
+    Class used to relate each (line, point) of an ARDF force map to
+    the position of the first VDAT record of the force curve.
+
+            Properties:
+                    nb_lines (int): Number of lines of the force map.
+                    nb_points (int): Number of points per line of the force map.
+                    nb_channels (int): Number of data channels of each force curve.
+                    line_pointers (list): Position of the first VSET of each line (linPointer table).
+                    scan_down (bool): Flag indicating if the lines were acquired from bottom to top.
+                    lines (dict): Dictionary relating each indexed line to a structured array
+                                  containing the position of each curve (see ardf_index_dtype).
+
+            Methods:
+                    get_line
+                    get_curve
+    """
+    def __init__(self, file_struct, trace=1):
+        F = file_struct['FileStructure']
+        # If we have two volumes, choose the desired one
+        if F['numbVolm'] > 1 and trace != F['volm1']['trace']:
+            volm = F['volm2']
+        else:
+            volm = F['volm1']
+        self.nb_lines = volm['vdef']['lines']
+        self.nb_points = volm['vdef']['points']
+        self.nb_channels = len(F['volm1']['vchn'])
+        self.line_pointers = list(volm['idx']['linPointer'])
+        self.scan_down = volm['scanDown'] == 1
+        self.lines = {}
+
+    def get_line(self, fid, line):
+        """
+        Get the position of the force curves of a line, walking its records if
+        it is the first time the line is requested.
+
+                Parameters:
+                        fid (file object): Opened binary ARDF file.
+                        line (int): Line number, starting at 0.
+
+                Returns:
+                        curves (np.array): Structured array containing the offset of the first VDAT
+                                           record, the number of points and the size in bytes of the
+                                           VDAT records of each curve (see ardf_index_dtype).
+                                           The offset is 0 if the line has no data.
+        """
+        curves = self.lines.get(line)
+        if curves is not None:
+            return curves
+        # If ScanDown, use the adjusted line index
+        adj_line = self.nb_lines - line - 1 if self.scan_down else line
+        curves = np.zeros(self.nb_points, dtype=ardf_index_dtype)
+        loc_line = self.line_pointers[adj_line]
+        if loc_line != 0:
+            fid.seek(loc_line, 0)
+            for n in range(self.nb_points):
+                vset = local_read_vset(fid, -1)
+                if n == 0:
+                    first_point = vset['point']
+                local_read_vnam(fid, -1)
+                curves[n]['offset'] = fid.tell()
+                for r in range(self.nb_channels):
+                    vdat = local_read_vdat(fid, -1, read_data=False)
+                curves[n]['size'] = vdat['sizeData']
+                curves[n]['nbytes'] = fid.tell() - curves[n]['offset']
+                local_read_xdat(fid, -1)
+            # Retrace lines are stored from the last point to the first one.
+            if first_point != 0:
+                curves = curves[::-1].copy()
+        self.lines[line] = curves
+        return curves
+
+    def get_curve(self, fid, line, point):
+        """
+        Get the position of a single force curve.
+
+                Parameters:
+                        fid (file object): Opened binary ARDF file.
+                        line (int): Line number, starting at 0.
+                        point (int): Point number, starting at 0.
+
+                Returns:
+                        offset (int): Position of the first VDAT record of the curve or None if there is no data.
+        """
+        offset = int(self.get_line(fid, line)[point]['offset'])
+        return offset if offset != 0 else None
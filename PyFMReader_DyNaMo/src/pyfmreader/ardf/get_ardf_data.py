@@ -7,10 +7,16 @@ Created on Tue Apr 15 2025
 
 @author: Carlota Carbajo """
 
+import contextlib
+import struct
 import numpy as np
 from .read_ardf import read_ardf_metadata
 from .utils_ardf import *
 
+# ARDF pointer (crc, size, type, misc) followed by the VDAT header
+# (force, line, point, sizeData, forceType, pnt0, pnt1, pnt2, 2 x dummy)
+_vdat_header_struct = struct.Struct('<II4sI10I')
+
 def extract_ardf_data(filename, get_line, get_point, trace, file_struct=None):
     """
     Load force curve data from an Asylum Research Data File (ARDF).
@@ -194,6 +200,128 @@ def extract_ardf_data(filename, get_line, get_point, trace, file_struct=None):
     return G
 
 
+def extract_ardf_curve(fid, ardf_index, get_line, get_point, lock=None, dtype=np.float64):
+    """
+    Load the data of a single force curve from an ARDF file, seeking directly
+    to its VDAT records using the ARDF index.
+
+    Parameters:
+    ----------
+    fid : file object
+        Opened binary ARDF file.
+    ardf_index : ardf_index.ARDFIndex
+        Index of the force curves of the ARDF file.
+    get_line : int
+        Line number, starting at 0.
+    get_point : int
+        Point number, starting at 0.
+    lock : threading.Lock
+        Lock guarding the access to fid (optional).
+    dtype : np.dtype
+        Dtype of the output data, float64 by default like extract_ardf_data.
+
+    Returns:
+    -------
+    G : dict
+        Dictionary containing the force curve data ('y', 'pnt0', 'pnt1', 'pnt2')
+        or an empty dictionary if the line has no data.
+    """
+    with lock if lock is not None else contextlib.nullcontext():
+        offset = ardf_index.get_curve(fid, get_line, get_point)
+        if offset is None:
+            return {}
+        fid.seek(offset, 0)
+        theData = [local_read_vdat(fid, -1) for r in range(ardf_index.nb_channels)]
+
+    # Pad the channels with 0s if they do not have the same length
+    maxRows = max(len(vdat['data']) for vdat in theData)
+    y = np.zeros((maxRows, len(theData)), dtype=dtype)
+    for r, vdat in enumerate(theData):
+        y[:len(vdat['data']), r] = vdat['data']
+
+    # The segment markers are taken from the last channel
+    vdat = theData[-1]
+    G = {
+        'y': y,
+        'pnt0': vdat['pnt0'],
+        'pnt1': vdat['pnt1'],
+        'pnt2': vdat['pnt2']
+    }
+    return G
+
+
+def extract_ardf_volume(fid, ardf_index, get_lines=None, lock=None, dtype=np.float64):
+    """
+    Load the data of all the force curves of an ARDF file, or of a range of lines,
+    into a single preallocated array.
+
+    The lines are indexed first (only the record headers are read) to know the
+    size of the output, then the VDAT records are read in a single pass over the
+    file, in the order they are stored.
+
+    Parameters:
+    ----------
+    fid : file object
+        Opened binary ARDF file.
+    ardf_index : ardf_index.ARDFIndex
+        Index of the force curves of the ARDF file.
+    get_lines : list
+        Line numbers to load, starting at 0. If None all the lines are loaded.
+    lock : threading.Lock
+        Lock guarding the access to fid (optional).
+    dtype : np.dtype
+        Dtype of the output data, float64 by default like extract_ardf_data.
+
+    Returns:
+    -------
+    V : dict
+        Dictionary containing:
+            'lines': line numbers loaded.
+            'y': array of shape (lines, points, max curve length, channels) padded with 0s.
+            'length': number of valid points of each curve, 0 if there is no data.
+            'pnt0', 'pnt1', 'pnt2': segment markers of each curve.
+    """
+    if get_lines is None:
+        get_lines = range(ardf_index.nb_lines)
+    get_lines = np.asarray(get_lines, dtype=int)
+
+    with lock if lock is not None else contextlib.nullcontext():
+        curves = np.stack([ardf_index.get_line(fid, line) for line in get_lines])
+
+        shape = curves.shape
+        numbChannels = ardf_index.nb_channels
+        maxRows = int(curves['size'].max()) if curves.size else 0
+        V = {
+            'lines': get_lines,
+            'y': np.zeros(shape + (maxRows, numbChannels), dtype=dtype),
+            'length': np.zeros(shape, dtype=np.int64),
+            'pnt0': np.zeros(shape, dtype=np.int64),
+            'pnt1': np.zeros(shape, dtype=np.int64),
+            'pnt2': np.zeros(shape, dtype=np.int64)
+        }
+
+        # Read the curves in the order they are stored in the file
+        order = np.argsort(curves['offset'], axis=None)
+        for flat_idx in order[curves['offset'].ravel()[order] != 0]:
+            idx = np.unravel_index(flat_idx, shape)
+            offset, nbytes = curves[idx]['offset'], curves[idx]['nbytes']
+            fid.seek(offset, 0)
+            block = fid.read(nbytes)
+            pos = 0
+            for r in range(numbChannels):
+                vdat_header = _vdat_header_struct.unpack_from(block, pos)
+                local_check_type(vdat_header[2].decode('ascii'), 'VDAT', fid)
+                sizeData = vdat_header[7]
+                pos += _vdat_header_struct.size
+                V['y'][idx][:sizeData, r] = np.frombuffer(block, dtype='<f4', count=sizeData, offset=pos)
+                pos += 4 * sizeData
+            V['length'][idx] = sizeData
+            # The segment markers are taken from the last channel
+            V['pnt0'][idx], V['pnt1'][idx], V['pnt2'][idx] = vdat_header[9:12]
+
+    return V
+
+
 
 
 
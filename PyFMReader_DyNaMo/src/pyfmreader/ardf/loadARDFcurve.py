@@ -4,18 +4,63 @@
 import numpy as np
 from struct import unpack
 
-from .get_ardf_data import extract_ardf_data
+from .get_ardf_data import extract_ardf_data, extract_ardf_curve, extract_ardf_volume
 
 from ..utils.forcecurve import ForceCurve
-from ..utils.segment import Segment
+from ..utils.segment import Segment, get_time_axis
 
-def loadARDFcurve(header, idx):
+def loadARDFcurves(header, curve_indices, ardf_index, afmfile, lock=None, dtype=None):
+    """
+    Function used to load the data of several force curves from an ARDF file.
+
+    The lines containing the curves are read in a single pass over the file,
+    in the order they are stored (see get_ardf_data.extract_ardf_volume).
+
+            Parameters:
+                    header (dict): Dictionary containing all ARDF file metadata.
+                    curve_indices (list): Indices of the force curves.
+                    ardf_index (ardf.ardf_index.ARDFIndex): Index of the force curves of the file.
+                    afmfile (file object): Opened binary ARDF file.
+                    lock (threading.Lock): Lock guarding the access to afmfile (optional).
+                    dtype (np.dtype): Dtype of the curves data, if None float64 is used (optional).
+            
+            Returns:
+                    force_curves (list): List of ForceCurve objects, in the same order as curve_indices.
+    """
+    lines, points = np.divmod(np.asarray(curve_indices, dtype=int), header['ardf_nb_points'])
+    get_lines = np.unique(lines)
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    volume = extract_ardf_volume(afmfile, ardf_index, get_lines, lock, dtype)
+    force_curves = []
+    for idx, line_idx, point in zip(curve_indices, np.searchsorted(get_lines, lines), points):
+        if volume['length'][line_idx, point] == 0:
+            # The line has no data.
+            ardf_data = {}
+        else:
+            ardf_data = {
+                'y': volume['y'][line_idx, point],
+                'pnt0': volume['pnt0'][line_idx, point],
+                'pnt1': volume['pnt1'][line_idx, point],
+                'pnt2': volume['pnt2'][line_idx, point]
+            }
+        force_curves.append(loadARDFcurve(header, idx, ardf_data=ardf_data, dtype=dtype))
+    return force_curves
+
+def loadARDFcurve(header, idx, ardf_index=None, afmfile=None, lock=None, ardf_data=None, dtype=None):
     """
     Function used to load the data of a single force curve from an ARDF file.
 
+    If the ARDF index and an opened file are given, the curve data is read
+    directly from its position in the file. Otherwise the whole line is parsed.
+
             Parameters:
-                    idx (int): Index of the force curve.
                     header (dict): Dictionary containing all ARDF file metadata.
+                    idx (int): Index of the force curve.
+                    ardf_index (ardf.ardf_index.ARDFIndex): Index of the force curves of the file (optional).
+                    afmfile (file object): Opened binary ARDF file (optional).
+                    lock (threading.Lock): Lock guarding the access to afmfile (optional).
+                    ardf_data (dict): Curve data already read, i.e: by loadARDFcurves (optional).
+                    dtype (np.dtype): Dtype of the curve data, if None float64 is used (optional).
             
             Returns:
                     force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
@@ -24,11 +69,15 @@ def loadARDFcurve(header, idx):
     file_name = header['Entry_filename']
     filepath = header['file_path']
     force_curve = ForceCurve(idx, file_name)
-    curve_indices = header['all_positions_ardf']
-
-    line, point = header['all_positions_ardf'][idx]
+    line, point = divmod(idx, header['ardf_nb_points'])
+    # The curve data is read directly into dtype, i.e: float32.
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
 
-    ardf_data = extract_ardf_data(header["file_path"], line, point, 1, header)
+    if ardf_data is None and ardf_index is not None and afmfile is not None:
+        ardf_data = extract_ardf_curve(afmfile, ardf_index, line, point, lock, dtype)
+    elif ardf_data is None:
+        ardf_data = extract_ardf_data(header["file_path"], line, point, 1, header)
+        ardf_data['y'] = ardf_data['y'].astype(dtype, copy=False)
 
     # The list needs cleaning because it contains null bytes -> \x00 at the end
     clean_channel_list = [s.rstrip('\x00') for s in header['channelList'][0]]
@@ -47,7 +96,10 @@ def loadARDFcurve(header, idx):
     n_pts_per_sec = float(header['Notes']['NumPtsPerSec'])
     real_sampling_rate = n_pts_per_sec / force_decimation  # in Hz
     sampling_interval = 1 / real_sampling_rate
-    time = np.arange(len(channel_data_deflection)) * sampling_interval
+    # The time axis is shared by all the curves with the same length.
+    time = get_time_axis(len(channel_data_deflection) * sampling_interval, len(channel_data_deflection), dtype)
+    # The retract time is shifted in float64, so its first points keep their precision in float32.
+    time64 = get_time_axis(len(channel_data_deflection) * sampling_interval, len(channel_data_deflection))
 
     # Indexes indicating when approach, retraction and baseline start, repectively
     pnt_list = [ardf_data['pnt0'], ardf_data['pnt1'], ardf_data['pnt2']]
@@ -74,7 +126,7 @@ def loadARDFcurve(header, idx):
     retsegment.segment_formated_data = {
         'height':channel_data_piezo[pnt_list[1]+1:len(channel_data_deflection)],
         'vDeflection': channel_data_deflection[pnt_list[1]+1:len(channel_data_deflection)],
-        'time': time[pnt_list[1]+1:len(channel_data_deflection)]- time[pnt_list[1]]
+        'time': (time64[pnt_list[1]+1:len(channel_data_deflection)]- time64[pnt_list[1]]).astype(dtype, copy=False)
         }
     retsegment.nb_point = len(channel_data_deflection[pnt_list[1]+1:len(channel_data_deflection)])
     retsegment.force_setpoint_mode = header['Notes']['TriggerType']
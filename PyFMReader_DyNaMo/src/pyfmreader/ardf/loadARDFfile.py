@@ -2,6 +2,8 @@
 # used to load the metadata of ARDF files (Asylum Research devices)
 
 from .parseARDFheader import parseARDFheader
+from .ardf_index import ARDFIndex
+from .loadARDFimg import getARDFimagedata
 
 def loadARDFfile(filepath, UFF):
     """
@@ -17,4 +19,8 @@ def loadARDFfile(filepath, UFF):
     UFF.filemetadata = parseARDFheader(filepath)
     UFF.filemetadata['file_type'] = 'ARDF'
     UFF.isFV = bool(UFF.filemetadata['file_type'])
+    # The lines are indexed the first time one of their curves is loaded.
+    UFF._ardfindex = ARDFIndex(UFF.filemetadata)
+    # The images are decoded the first time they are accessed.
+    UFF.imagedata = getARDFimagedata(UFF.filemetadata)
     return UFF
@@ -1,21 +1,150 @@
-# File containing the function loadARDFimg,
+# File containing the ARDFImageData class and the function loadARDFimg,
 # used to load the piezo image from ARDF files.
 
-import itertools
-from struct import unpack
+import struct
+from collections.abc import Mapping
 import numpy as np
 
-def loadARDFimg(header):
+from .utils_ardf import local_read_ardf_pointer, local_check_type
+
+class ARDFImageData(Mapping):
     """
-    Function used to load the piezo image from a NANOSCOPE file.
+    Lazy dictionary containing the images of an ARDF file.
+
+    Only the position of the images is known when the file is loaded, each image
+    is decoded the first time it is accessed and kept in memory. Decoded images
+    are not pickled (i.e: when sending the UFF object to a process pool).
+
+            Properties:
+                    filepath (str): Path to the ARDF file.
+                    images (list): List of (title, IBOX position, lines, points) of each image.
+                    delete (tuple): Range of columns to delete from partial files or None.
+                    shape (tuple): Shape (lines, points) of the images.
+            
+            Methods:
+                    get_image
+                    get_stack
+    """
+    def __init__(self, filepath, images, delete=None):
+        self.filepath = filepath
+        self.images = images
+        self.delete = delete
+        self._cache = {}
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+    def __getitem__(self, image_title):
+        for idx, (title, *_) in enumerate(self.images):
+            if title == image_title:
+                return self.get_image(idx)
+        raise KeyError(image_title)
+    
+    def __iter__(self):
+        return iter(title for title, *_ in self.images)
+    
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def shape(self):
+        if not self.images:
+            return None
+        _, _, lines, points = self.images[0]
+        if self.delete is not None:
+            points = len(np.delete(np.arange(points), slice(*self.delete)))
+        return (lines, points)
+    
+    def _read_image(self, idx, out):
+        """
+        Decode an image from its IBOX table into a preallocated array.
+
+                Parameters:
+                        idx (int): Position of the image in the file.
+                        out (np.array): 2D array of shape self.shape to fill.
+                
+                Returns: None
+        """
+        _, pnt_ibox, lines, points = self.images[idx]
+        with open(self.filepath, 'rb') as fid:
+            _, _, last_type, _ = local_read_ardf_pointer(fid, pnt_ibox)
+            local_check_type(last_type, 'IBOX', fid)
+            _, numb_entry, size_entry = struct.unpack('<QII', fid.read(16))
+            entries = np.frombuffer(fid.read(numb_entry * size_entry), dtype=np.dtype([
+                ('crc', '<u4'), ('size', '<u4'), ('type', 'S4'), ('misc', '<u4'),
+                ('data', '<f4', ((size_entry - 16) // 4,))
+            ]))
+            if not np.isin(entries['type'], (b'IDAT', b'')).all():
+                raise ValueError(f"ERROR: Unexpected entry in IBOX at location {pnt_ibox}")
+            # Read closing IMAG header (GAMI), verify header type
+            _, _, last_type, _ = local_read_ardf_pointer(fid, -1)
+            local_check_type(last_type, 'GAMI', fid)
+        image_data = entries['data'].reshape((lines, points))
+        if self.delete is not None:
+            image_data = np.delete(image_data, slice(*self.delete), axis=1)
+        out[...] = image_data
+
+    def get_image(self, idx):
+        """
+        Decode a single image.
+
+                Parameters:
+                        idx (int): Position of the image in the file.
+                
+                Returns:
+                        image (np.array): 2D array containing the image data.
+        """
+        image = self._cache.get(idx)
+        if image is None:
+            image = np.empty(self.shape, dtype=np.float64)
+            self._read_image(idx, image)
+            self._cache[idx] = image
+        return image
+
+    def get_stack(self):
+        """
+        Decode all the images into a single preallocated array.
+
+                Parameters: None
+                
+                Returns:
+                        stack (np.array): 3D array of shape (lines, points, nb_images).
+        """
+        stack = np.empty(self.shape + (len(self.images),), dtype=np.float64)
+        for idx in range(len(self.images)):
+            stack[:, :, idx] = self.get_image(idx)
+        return stack
+
+def getARDFimagedata(header):
+    """
+    Function used to get the lazy image dictionary of an ARDF file.
 
             Parameters:
                     header (dict): Dictionary containing the file metadata.
             
+            Returns:
+                    imagedata (ARDFImageData): lazy dictionary containing the images of the file.
+    """
+    F = header['FileStructure']
+    images = []
+    for n in range(F['numbImag']):
+        imag = F[f"imag{n + 1}"]
+        images.append((imag['idef']['imageTitle'], imag['pntIbox'], imag['idef']['lines'], imag['idef']['points']))
+    return ARDFImageData(header['file_path'], images, F['imagDelete'])
+
+def loadARDFimg(imagedata):
+    """
+    Function used to load the piezo image from an ARDF file.
+
+            Parameters:
+                    imagedata (ARDFImageData): lazy dictionary containing the images of the file.
+            
             Returns:
                     piezoimg (np.array): 2D array containing the piezo image.
     """
     
-    piezoimg = header['y'][:, :, 0]
+    piezoimg = imagedata.get_image(0)
 
-    return piezoimg
\ No newline at end of file
+    return piezoimg
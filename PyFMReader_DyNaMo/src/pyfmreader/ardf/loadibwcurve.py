@@ -1,8 +1,7 @@
-# File containing the function loadNANOSCcurve,
-# used to load the data of force curves from NANOSCOPE files.
+# File containing the functions getIBWdata and loadIBWcurve,
+# used to load the data of force curves from ibw files.
 
 import numpy as np
-from struct import unpack
 
 
 from ..utils.forcecurve import ForceCurve
@@ -12,23 +11,21 @@ from afmformats.formats.fmt_igor import load_igor
 import pathlib
 from igor2 import binarywave
 
-def loadIBWcurve(header, idx=0):
+def getIBWdata(dslist, header, dtype=None):
     """
-    Function used to load the data of a single force curve from an ibw file.
+    Function used to decode the channels of an ibw file and precompute
+    the approach/retract split. The returned arrays are read-only, so they
+    can be shared by all the curves loaded from the file.
 
             Parameters:
-                    idx (int): Index of the force curve.
+                    dslist (list): Data parsed with afmformats load_igor.
                     header (dict): Dictionary containing ibw file metadata.
+                    dtype (np.dtype): Dtype of the channels, if None float64 is used (optional).
             
             Returns:
-                    force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
+                    ibwdata (dict): Dictionary containing the height, deflection, time and retract time channels
+                                    and the indices where the approach and retract segments start and end.
     """
-    
-    file_name = header['Entry_filename']
-    filepath = header['file_path']
-    force_curve = ForceCurve(idx, file_name)
-
-    dslist = load_igor(filepath)
     data = dslist[0]['data']
 
     index_start_retract = np.argmin(data['height (measured)'])
@@ -39,7 +36,6 @@ def loadIBWcurve(header, idx=0):
     # spring constant comes in N/m in the raw data
     force = data['force']  # newton
     height_measured = data['height (measured)']*-1  # m
-    height_piezo = data['height (piezo)']*-1 # m
     deflection = data['force'] / header['spring constant']  # m
 
     # Generate time channel from .ibw metadata
@@ -54,6 +50,58 @@ def loadIBWcurve(header, idx=0):
     real_sampling_rate = n_pts_per_sec / force_decimation  # in Hz
     sampling_interval = 1 / real_sampling_rate
     time = np.arange(len(force)) * sampling_interval  # seconds
+    # The retract time is shifted before the cast, so it keeps its precision in float32.
+    retract_time = time[index_start_retract:index_end_retract] - time[index_start_retract]
+
+    # The channels are cast once, so the curves are views of them.
+    if dtype is not None:
+        height_measured, deflection, time, retract_time = (
+            np.asarray(channel).astype(dtype, copy=False)
+            for channel in (height_measured, deflection, time, retract_time)
+        )
+    for channel in (height_measured, deflection, time, retract_time):
+        channel.flags.writeable = False
+
+    return {
+        'height': height_measured,
+        'vDeflection': deflection,
+        'time': time,
+        'retract_time': retract_time,
+        'index_start_approach': index_start_approach,
+        'index_end_approach': index_end_approach,
+        'index_start_retract': index_start_retract,
+        'index_end_retract': index_end_retract
+    }
+
+def loadIBWcurve(header, idx=0, ibwdata=None, dtype=None):
+    """
+    Function used to load the data of a single force curve from an ibw file.
+
+            Parameters:
+                    header (dict): Dictionary containing ibw file metadata.
+                    idx (int): Index of the force curve.
+                    ibwdata (dict): Decoded channels of the file, if None the file is parsed (see getIBWdata).
+                    dtype (np.dtype): Dtype of the channels when the file is parsed, if None float64 is used (optional).
+            
+            Returns:
+                    force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
+    """
+    
+    file_name = header['Entry_filename']
+    filepath = header['file_path']
+    force_curve = ForceCurve(idx, file_name)
+
+    if ibwdata is None:
+        ibwdata = getIBWdata(load_igor(filepath), header, dtype)
+
+    index_start_approach = ibwdata['index_start_approach']
+    index_end_approach = ibwdata['index_end_approach']
+    index_start_retract = ibwdata['index_start_retract']
+    index_end_retract = ibwdata['index_end_retract']
+
+    height_measured = ibwdata['height']
+    deflection = ibwdata['vDeflection']
+    time = ibwdata['time']
 
     appsegment = Segment(file_name, '0', 'Approach')
     retsegment = Segment(file_name, '1', 'Retract')
@@ -77,7 +125,7 @@ def loadIBWcurve(header, idx=0):
     retsegment.segment_formated_data = {
         'height': height_measured[index_start_retract:index_end_retract],
         'vDeflection': deflection[index_start_retract:index_end_retract],
-        'time': time[index_start_retract:index_end_retract] - time[index_start_retract]
+        'time': ibwdata['retract_time']
         }
     retsegment.nb_point = len(deflection[index_start_retract:index_end_retract])
     retsegment.force_setpoint_mode = 0
@@ -1,7 +1,10 @@
-# File containing the function loadARDFfile, 
-# used to load the metadata of ARDF files (Asylum Research devices)
+# File containing the function loadIBWfile, 
+# used to load the metadata of ibw files (Asylum Research devices)
+
+from afmformats.formats.fmt_igor import load_igor
 
 from .parseibwheader import parseIBWheader
+from .loadibwcurve import getIBWdata
 
 def loadIBWfile(filepath, UFF):
     """
@@ -14,7 +17,11 @@ def loadIBWfile(filepath, UFF):
             Returns:
                     UFF (uff.UFF): UFF object containing the loaded metadata.
     """
-    UFF.filemetadata = parseIBWheader(filepath)
+    # The file is parsed only once, the decoded channels are kept
+    # in the UFF object and shared by all the getcurve calls.
+    dslist = load_igor(filepath)
+    UFF.filemetadata = parseIBWheader(filepath, dslist)
     UFF.filemetadata['file_type'] = '.ibw'
     UFF.isFV = False
+    UFF._ibwdata = getIBWdata(dslist, UFF.filemetadata, UFF.dtype)
     return UFF
\ No newline at end of file
@@ -28,16 +28,11 @@ def parseARDFheader(filepath):
 
     header.update(file_struct)
 
-    nlines = header['y'].shape[0]
-    npoints = header['y'].shape[1]
-    all_positions_ardf = []
-
-    for line in range(nlines):
-                for point in range(npoints):
-                    all_positions_ardf.append([line, point])
-    
-    header['all_positions_ardf'] = all_positions_ardf
-    header['Entry_tot_nb_curve'] = len(all_positions_ardf)
+    # The (line, point) of each curve is computed from its index (see loadARDFcurve).
+    nlines, npoints = header['imageShape']
+    header['ardf_nb_lines'] = nlines
+    header['ardf_nb_points'] = npoints
+    header['Entry_tot_nb_curve'] = nlines * npoints
 
     # Needed to avoid errors in the GUI
     header['height_channel_key'] = 'height'
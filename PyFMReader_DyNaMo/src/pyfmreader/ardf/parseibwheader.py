@@ -7,12 +7,13 @@ import pathlib
 from igor2 import binarywave
 
 
-def parseIBWheader(filepath):
+def parseIBWheader(filepath, dslist=None):
     """
     Function used to load the metadata of an ibw file.
 
             Parameters:
                     filepath (str): Path to the ibw file.
+                    dslist (list): Data already parsed with afmformats load_igor, if None the file is parsed.
             
             Returns:
                     header (dict): Dictionary containing the ibw file metadata.
@@ -26,7 +27,8 @@ def parseIBWheader(filepath):
     header['UFF_code'] = UFF_code
     header['Entry_UFF_version'] = UFF_version
 
-    dslist = load_igor(filepath)
+    if dslist is None:
+        dslist = load_igor(filepath)
     parameters = dslist[0]['metadata']
 
 
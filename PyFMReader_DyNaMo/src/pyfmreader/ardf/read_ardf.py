@@ -15,6 +15,7 @@ def read_ardf_metadata(filename):
     """
     Reads basic metadata and header from an Asylum Research ARDF file into a dictionary.
     Does NOT load force curves. Use get_ardf_data() for detailed data extraction.
+    Does NOT load images either, only their position (see loadARDFimg.ARDFImageData).
     
     Parameters:
         filename (str): Path to the ARDF file.
@@ -79,7 +80,7 @@ def read_ardf_metadata(filename):
 
         # Initialize data arrays
         D['imageList'] = []
-        D['y'] = []
+        D['imageShape'] = None
 
         # Import all images
         for n in range(F['numbImag']):
@@ -105,29 +106,11 @@ def read_ardf_metadata(filename):
 
             # * * * * * * * * * * * * *
             # IBOX & IDAT image data
-            idat = local_read_toc(fid, -1, 'IBOX')
+            # Only the position is stored, the data is read when the image is needed.
+            F[imag_key]['pntIbox'] = fid.tell()
 
-            image_data = np.array(idat['data'])
-
-            # If it's 1D, reshape it (example: to 5x10)
-            if image_data.ndim == 1:
-                expected_height = F[imag_key]['idef']['lines']
-                expected_width = F[imag_key]['idef']['points']
-                image_data = image_data.reshape((expected_height, expected_width))
-
-            # Add 3rd dimension for stacking
-            image_data = image_data[..., None]
-
-            # Write IDAT data to image array
-            if 'y' not in D or len(D['y']) == 0:
-                D['y'] = image_data  # Initialize with first image
-            else:
-                D['y'] = np.concatenate((D['y'], image_data), axis=2)
-
-
-            # Read closing IMAG header (GAMI), verify header type
-            dum_crc, dum_size, last_type, dum_misc = local_read_ardf_pointer(fid, -1)
-            local_check_type(last_type, 'GAMI', fid)
+            if D['imageShape'] is None:
+                D['imageShape'] = (F[imag_key]['idef']['lines'], F[imag_key]['idef']['points'])
 
             # * * * * * * * * * * * * *
             # IMAG-TEXT
@@ -270,13 +253,17 @@ def read_ardf_metadata(filename):
                 inc_max = 1
 
         # After the loop — Partial file handling continued
+        F['imagDelete'] = None
         if idx_zero:
             idx_zero_min = min(idx_zero) - inc_min
             idx_zero_max = max(idx_zero) + inc_max
 
-            # Delete zero rows from D['y']
-            if isinstance(D['y'], np.ndarray):
-                D['y'] = np.delete(D['y'], slice(idx_zero_min, idx_zero_max + 1), axis=1)
+            # Zero rows to delete from the images
+            if D['imageShape'] is not None:
+                F['imagDelete'] = (idx_zero_min, idx_zero_max + 1)
+                lines, points = D['imageShape']
+                points = len(np.delete(np.arange(points), slice(*F['imagDelete'])))
+                D['imageShape'] = (lines, points)
 
         # =======================================
         # THMB: Thumbnails
@@ -144,7 +144,18 @@ def local_read_xdat(fid, address):
 # readVDAT Function
 # =======================================
 
-def local_read_vdat(fid, address):
+def local_read_vdat(fid, address, read_data=True):
+    """
+    Reads a VDAT record (data of a single channel of a force curve).
+
+    Parameters:
+        fid (file object): Opened binary file (in 'rb' mode).
+        address (int): File position to seek to (-1 means current position).
+        read_data (bool): If False, the data is skipped and only its position is returned in 'pntData'.
+
+    Returns:
+        vdat (dict): Dictionary with parsed VDAT data.
+    """
     if address != -1:
         fid.seek(address, 0)  # Seek from beginning of file (BOF)
 
@@ -169,7 +180,11 @@ def local_read_vdat(fid, address):
     vdat['pnt2'] = read_uint32()
     _ = [read_uint32() for _ in range(2)]  # dummy values
 
-    vdat['data'] = read_floats(vdat['sizeData'])
+    if read_data:
+        vdat['data'] = read_floats(vdat['sizeData'])
+    else:
+        vdat['pntData'] = fid.tell()
+        fid.seek(4 * vdat['sizeData'], 1)  # COF
 
     return vdat
 
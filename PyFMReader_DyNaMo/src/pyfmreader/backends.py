@@ -0,0 +1,49 @@
+# File containing the dispatch table of the format backends.
+# The backend modules are imported the first time they are used,
+# so only the dependencies of the loaded formats are imported
+# (i.e: nptdms, afmformats, tifffile, pandas or scipy).
+
+import importlib
+from functools import lru_cache
+
+# Relates each backend function to the module where it is defined.
+backends = {
+    # JPK
+    'loadJPKfile': '.jpk.loadjpkfile',
+    'loadJPKThermalFile': '.jpk.loadjpkthermalfile',
+    'loadJPKcurve': '.jpk.loadjpkcurve',
+    'loadJPKcurves': '.jpk.loadjpkcurve',
+    'computeJPKPiezoImg': '.jpk.loadjpkimg',
+    # NANOSCOPE
+    'loadNANOSCfile': '.nanosc.loadnanoscfile',
+    'loadNANOSCcurve': '.nanosc.loadnanosccurve',
+    'loadNANOSCcurves': '.nanosc.loadnanosccurve',
+    'loadNANOSCvolume': '.nanosc.loadnanosccurve',
+    'loadNANOSCimg': '.nanosc.loadnanoscimg',
+    # PS-NEX
+    'loadTDMSfile': '.ps_nex.loadpsnexfile',
+    'openPSNEXfile': '.ps_nex.loadpsnexcurve',
+    'loadPSNEXcurve': '.ps_nex.loadpsnexcurve',
+    # ARDF
+    'loadARDFfile': '.ardf.loadARDFfile',
+    'loadARDFcurve': '.ardf.loadARDFcurve',
+    'loadARDFcurves': '.ardf.loadARDFcurve',
+    'loadARDFimg': '.ardf.loadARDFimg',
+    # IBW
+    'loadIBWfile': '.ardf.loadibwfile',
+    'loadIBWcurve': '.ardf.loadibwcurve',
+}
+
+@lru_cache(maxsize=None)
+def getbackend(name):
+    """
+    Get a backend function, importing its module if it is the first time it is used.
+
+            Parameters:
+                    name (str): Name of the backend function (see backends).
+            
+            Returns:
+                    backend (function): Backend function.
+    """
+    module = importlib.import_module(backends[name], __package__)
+    return getattr(module, name)
@@ -3,7 +3,8 @@
 # File extensions of files supported by this library
 jpkfiles = ('jpk-force', 'jpk-force-map', 'jpk-qi-data','jpk-qi-series')        # As in 18-07-2022
 nanoscfiles = ('spm', 'pfc')                                    # As in 18-07-2022
-ufffiles = ('uff')                                              # As in 18-07-2022
+ufffiles = ('uff', '.uff')                                      # As in 18-07-2022
+uffzfiles = ('uffz', '.uffz')                                   # As in 16-10-2026
 jpkthermalfiles = ('tnd')                                       # As in 18-07-2022
 psnexfiles = ('tdms','.tdms','PSNEX.tdms')                      # As in 31.05.2024
 ibwfiles = ('.ibw')                                             # As in 31.06.2025
@@ -13,6 +14,7 @@ ARDFfiles = ('.ARDF')                                           # As in 31.06.20
 # Default values for UFF (Universal File Format) files.
 UFF_code = '_1_2_3_4_5'                                         # Default UFF code for V.0.1.1
 UFF_version = '0'                                               # Default UFF version for V.0.1.1
+UFFZ_version = 2                                                # Version of the binary UFF container layout
 
 # Defaults values for JPK file headers.
 default_angle = 0                                               # in degrees
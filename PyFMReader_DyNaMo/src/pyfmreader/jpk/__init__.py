@@ -1,3 +1,4 @@
+from .jpkindex import *
 from .loadjpkcurve import *
 from .loadjpkfile import *
 from .loadjpkimg import *
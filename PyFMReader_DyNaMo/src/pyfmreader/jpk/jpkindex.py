@@ -0,0 +1,244 @@
+# File containing the JPKIndex class and the functions:
+# - buildJPKindex: Used to index the members of a JPK file.
+# - readJPKmember: Used to read a single member of a JPK file
+#   from its position in the zip archive.
+
+import contextlib
+import struct
+import zlib
+from collections import namedtuple
+from zipfile import ZIP_STORED, ZIP_DEFLATED
+
+import numpy as np
+
+# Channel code used to store the segment-header.properties members in the index.
+SEGMENT_HEADER = -1
+
+# Size and format of the local file header that precedes each member in the zip archive.
+_local_header_size = 30
+_local_header_struct = struct.Struct("<4s5H3L2H")
+
+# Size of the chunks read when only a part of a compressed member is needed.
+_read_chunk_size = 1 << 16
+
+index_dtype = np.dtype([
+    ('curve', np.int32),
+    ('segment', np.int16),
+    ('channel', np.int16),
+    ('offset', np.int64),
+    ('compress_size', np.int64),
+    ('file_size', np.int64),
+    ('compress_type', np.int16)
+])
+
+JPKMember = namedtuple('JPKMember', ['offset', 'compress_size', 'file_size', 'compress_type'])
+
+def getJPKchanneldtype(conversion_factors):
+    """
+    Function used to get the numpy dtype used to decode the raw data of a channel.
+
+            Parameters:
+                    conversion_factors (dict): Dictionary containing the channel properties.
+
+            Returns:
+                    dtype (np.dtype): Big endian dtype of the channel raw data.
+    """
+    encoder_type = conversion_factors.get("encoder_type")
+    if encoder_type is None or 'integer' in encoder_type:
+        return np.dtype('>i4')
+    elif 'short' in encoder_type:
+        return np.dtype('>i2')
+    elif 'float' in encoder_type:
+        return np.dtype('>f4')
+    raise ValueError(f"Unsupported encoder type: {encoder_type}")
+
+class JPKIndex:
+    """
+    Class used to relate each (curve, segment, channel) of a JPK file to
+    the position of its member inside the zip archive.
+
+    The index is stored as a numpy structured array sorted by curve, segment
+    and channel, so it stays compact and cheap to pickle on large QI maps.
+
+            Properties:
+                    members (np.array): Structured array containing the members info (see index_dtype).
+                    channels (list): Channel names, the channel code in members is the position in this list.
+                    dtypes (list): Dtypes used to decode the raw data of each channel.
+                    curve_starts (np.array): Position of the first member of each curve in members.
+
+            Methods:
+                    get_curve_segments
+                    get_member
+    """
+    def __init__(self, members, channels, dtypes, nb_curves):
+        self.members = members
+        self.channels = channels
+        self.dtypes = dtypes
+        self.curve_starts = np.searchsorted(members['curve'], np.arange(nb_curves + 1))
+
+    def get_curve_segments(self, curve_index, headers=False):
+        """
+        Get the members of all the segments of a curve.
+
+                Parameters:
+                        curve_index (int): Index of the curve.
+                        headers (bool): If True, return the segment-header members instead of the channels.
+
+                Returns:
+                        segments (dict): Dictionary relating each segment id to a dictionary {channel: JPKMember}
+                                         or, if headers is True, to the JPKMember of its segment-header.
+        """
+        start, end = self.curve_starts[curve_index], self.curve_starts[curve_index + 1]
+        segments = {}
+        for _, segment_id, channel, *member in self.members[start:end].tolist():
+            if headers:
+                if channel == SEGMENT_HEADER:
+                    segments[segment_id] = JPKMember(*member)
+            elif channel != SEGMENT_HEADER:
+                segments.setdefault(segment_id, {})[self.channels[channel]] = JPKMember(*member)
+        return segments
+
+    def get_member(self, curve_index, segment_id, channel_name):
+        """
+        Get the member of a single channel of a segment.
+
+                Parameters:
+                        curve_index (int): Index of the curve.
+                        segment_id (int): Position of the segment in the force curve.
+                        channel_name (str): Channel name or 'segment-header'.
+
+                Returns:
+                        member (JPKMember): Position of the member in the zip archive or None if not found.
+        """
+        if channel_name == 'segment-header':
+            channel = SEGMENT_HEADER
+        elif channel_name in self.channels:
+            channel = self.channels.index(channel_name)
+        else:
+            return None
+        start, end = self.curve_starts[curve_index], self.curve_starts[curve_index + 1]
+        rows = self.members[start:end]
+        found = rows[(rows['segment'] == segment_id) & (rows['channel'] == channel)]
+        if len(found) == 0:
+            return None
+        return JPKMember(*found[['offset', 'compress_size', 'file_size', 'compress_type']][0].tolist())
+
+def buildJPKindex(afm_file, file_metadata):
+    """
+    Function used to index the segment members of a JPK file. The zip
+    directory is walked only once, when the file is loaded.
+
+    Supported paths:
+        - segments/{segment}/... --> .jpk-force
+        - index/{curve}/segments/{segment}/... --> .jpk-force-map, .jpk-qi-data
+
+            Parameters:
+                    afm_file (ZipFile): ZipFile buffer containing the data of the JPK file.
+                    file_metadata (dict): Dictionary containing the file metadata.
+
+            Returns:
+                    index (JPKIndex): Index of the segment members of the JPK file.
+    """
+    channel_properties = file_metadata["channel_properties"]
+    channels = []
+    channel_codes = {}
+    rows = []
+    for info in afm_file.infolist():
+        parts = info.filename.split("/")
+        if parts[0] == "index" and len(parts) > 4 and parts[2] == "segments":
+            curve_id, segment_id, member_path = parts[1], parts[3], parts[4:]
+        elif parts[0] == "segments" and len(parts) > 2:
+            curve_id, segment_id, member_path = '0', parts[1], parts[2:]
+        else:
+            continue
+        data_type = member_path[-1].split(".")[0]
+        if data_type == '':
+            # Directory entry
+            continue
+        elif data_type == 'segment-header':
+            channel = SEGMENT_HEADER
+        else:
+            channel = channel_codes.get(data_type)
+            if channel is None:
+                channel = channel_codes[data_type] = len(channels)
+                channels.append(data_type)
+        rows.append((
+            int(curve_id), int(segment_id), channel, info.header_offset,
+            info.compress_size, info.file_size, info.compress_type
+        ))
+    members = np.array(rows, dtype=index_dtype)
+    members = members[np.lexsort((members['channel'], members['segment'], members['curve']))]
+    dtypes = [getJPKchanneldtype(channel_properties.get(channel, {})) for channel in channels]
+    return JPKIndex(members, channels, dtypes, file_metadata["Entry_tot_nb_curve"])
+
+def readJPKmember(afm_file, member, lock=None, tail=None, span=None):
+    """
+    Function used to read and decompress a single member of a JPK file,
+    using its position in the zip archive instead of the zip directory.
+
+    The file access is guarded by lock so the same file handle can be shared
+    by several threads, the decompression is done outside of the lock.
+
+    If tail is given only the last tail bytes of the member are returned. For
+    stored (uncompressed) members only those bytes are read from the file.
+
+    If span is given only the bytes from start to stop of the member are returned.
+    Compressed members are read and decompressed in chunks until stop, inside
+    the lock, keeping only the requested bytes.
+
+            Parameters:
+                    afm_file (file object): Opened binary JPK file.
+                    member (JPKMember): Position of the member in the zip archive.
+                    lock (threading.Lock): Lock guarding the access to afm_file (optional).
+                    tail (int): Number of bytes to return from the end of the member (optional).
+                    span (tuple): Start and stop positions of the bytes to return (optional).
+
+            Returns:
+                    contents (bytes): Uncompressed contents of the member.
+    """
+    with lock if lock is not None else contextlib.nullcontext():
+        afm_file.seek(member.offset)
+        local_header = _local_header_struct.unpack(afm_file.read(_local_header_size))
+        if local_header[0] != b"PK\003\004":
+            raise ValueError(f"Bad zip member header at offset {member.offset}")
+        name_length, extra_length = local_header[-2:]
+        if tail is not None and member.compress_type == ZIP_STORED:
+            afm_file.seek(name_length + extra_length + max(member.file_size - tail, 0), 1)
+            return afm_file.read(min(tail, member.file_size))
+        if span is not None:
+            return _readJPKmemberspan(afm_file, member, name_length + extra_length, *span)
+        afm_file.seek(name_length + extra_length, 1)
+        contents = afm_file.read(member.compress_size)
+    if member.compress_type == ZIP_DEFLATED:
+        contents = zlib.decompress(contents, -15)
+    elif member.compress_type != ZIP_STORED:
+        raise ValueError(f"Unsupported zip compression type: {member.compress_type}")
+    if tail is not None:
+        return contents[-tail:]
+    return contents
+
+def _readJPKmemberspan(afm_file, member, data_offset, start, stop):
+    """
+    Hidden function used to read the bytes from start to stop of a member, after its local header.
+    """
+    stop = min(stop, member.file_size)
+    if member.compress_type == ZIP_STORED:
+        afm_file.seek(data_offset + start, 1)
+        return afm_file.read(max(stop - start, 0))
+    elif member.compress_type != ZIP_DEFLATED:
+        raise ValueError(f"Unsupported zip compression type: {member.compress_type}")
+    afm_file.seek(data_offset, 1)
+    decompressor = zlib.decompressobj(-15)
+    remaining = member.compress_size
+    position = 0
+    parts = []
+    while position < stop and remaining > 0:
+        chunk = afm_file.read(min(_read_chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        data = decompressor.decompress(chunk)
+        if position + len(data) > start:
+            parts.append(data[max(start - position, 0):stop - position])
+        position += len(data)
+    return b"".join(parts)
@@ -1,23 +1,144 @@
 # File containing the loadJPKcurve function,
 # used to load single force curves from JPK files.
 
-from struct import unpack
-from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+from .jpkindex import readJPKmember
 from ..utils.forcecurve import ForceCurve
-from ..utils.segment import Segment
+from ..utils.segment import Segment, get_time_axis
 from ..constants import JPK_SETPOINT_MODE
 
-def loadJPKcurve(paths, afm_file, curve_index, file_metadata):
+def getJPKconversionfactors(channel_properties, channel_key):
+    """
+    Function used to fuse all the scaling steps of a channel into a single
+    multiplier and offset, so the data can be converted in one pass.
+
+    Height channels:
+        values = raw * encoder_multiplier + encoder_offset
+        if absolute defined: values = values * abs_mult + abs_offset
+        if nominal defined: values = values * nom_mult + nom_offset
+    vDeflection channel:
+        values = raw * encoder_multiplier + encoder_offset + deflection_distance_offset
+
+            Parameters:
+                    channel_properties (dict): Dictionary containing the properties of each channel.
+                    channel_key (str): Name of the channel.
+            
+            Returns:
+                    multiplier (float): Fused multiplier.
+                    offset (float): Fused offset.
+    """
+    conversion_factors = channel_properties[channel_key]
+    multiplier = conversion_factors["encoder_multiplier_key"]
+    offset = conversion_factors["encoder_offet_key"]
+    if channel_key == "vDeflection":
+        offset = offset + conversion_factors["deflection_distance_offset"]
+    else:
+        if conversion_factors["absolute_defined"]:
+            multiplier = multiplier * conversion_factors["capSensHeight_abs_mult"]
+            offset = offset * conversion_factors["capSensHeight_abs_mult"] + conversion_factors["capSensHeight_abs_offset"]
+        if conversion_factors["nominal_defined"]:
+            multiplier = multiplier * conversion_factors["capSensHeight_nom_mult"]
+            offset = offset * conversion_factors["capSensHeight_nom_mult"] + conversion_factors["capSensHeight_nom_offset"]
+    return multiplier, offset
+
+def decodeJPKchannel(raw_data, multiplier, offset, dtype=np.float64):
+    """
+    Function used to scale the raw data of a channel into a preallocated
+    output array, without creating intermediate arrays.
+
+            Parameters:
+                    raw_data (np.array): Raw channel data.
+                    multiplier (float): Fused multiplier (see getJPKconversionfactors).
+                    offset (float): Fused offset (see getJPKconversionfactors).
+                    dtype (np.dtype): Dtype of the scaled data.
+            
+            Returns:
+                    values (np.array): Scaled channel data.
+    """
+    values = np.empty(raw_data.shape, dtype=dtype)
+    np.multiply(raw_data, multiplier, out=values, casting='unsafe')
+    values += values.dtype.type(offset)
+    return values
+
+def readJPKsegments(jpkindex, afm_file, curve_indices, lock=None, max_workers=None):
+    """
+    Function used to read the raw data of every channel of every segment of
+    several curves, decompressing the members in parallel.
+
+    The members are read from the shared file handle under lock and decompressed
+    in a pool of threads, zlib releases the GIL so the decompression scales with
+    the number of cores.
+
+            Parameters:
+                    jpkindex (jpk.jpkindex.JPKIndex): Index of the segment members of the JPK file.
+                    afm_file (file object): Opened binary JPK file.
+                    curve_indices (list): Indices of the curves to read.
+                    lock (threading.Lock): Lock guarding the access to afm_file (optional).
+                    max_workers (int): Maximum number of threads used to decompress the members (optional).
+            
+            Returns:
+                    raw_data (dict): Dictionary relating each curve index to its segments raw data
+                                     {curve_index: {segment_id: {channel: np.array}}}.
+    """
+    channel_dtypes = dict(zip(jpkindex.channels, jpkindex.dtypes))
+    tasks = [
+        (curve_index, segment_idx, data_type, member)
+        for curve_index in curve_indices
+        for segment_idx, channel_members in jpkindex.get_curve_segments(curve_index).items()
+        for data_type, member in channel_members.items()
+    ]
+    read_member = lambda task: readJPKmember(afm_file, task[3], lock)
+    if max_workers == 1:
+        # No need to start a pool of threads, i.e: when loading a single curve.
+        contents = list(map(read_member, tasks))
+    else:
+        with ThreadPoolExecutor(max_workers) as executor:
+            contents = list(executor.map(read_member, tasks))
+    raw_data = {curve_index: {} for curve_index in curve_indices}
+    for (curve_index, segment_idx, data_type, _), filecontents in zip(tasks, contents):
+        # Zero-copy view of the big endian raw data.
+        raw_data[curve_index].setdefault(segment_idx, {})[data_type] = np.frombuffer(
+            filecontents, dtype=channel_dtypes[data_type]
+        )
+    return raw_data
+
+def loadJPKcurves(jpkindex, afm_file, curve_indices, file_metadata, lock=None, max_workers=None, dtype=None):
+    """
+    Function used to load the data of several force curves from a JPK file,
+    decompressing the segment members in parallel (see readJPKsegments).
+
+            Parameters:
+                    jpkindex (jpk.jpkindex.JPKIndex): Index of the segment members of the JPK file.
+                    afm_file (file object): Opened binary JPK file.
+                    curve_indices (list): Indices of the curves to load.
+                    file_metadata (dict): Dictionary containing the file metadata.
+                    lock (threading.Lock): Lock guarding the access to afm_file (optional).
+                    max_workers (int): Maximum number of threads used to decompress the members (optional).
+                    dtype (np.dtype): Dtype of the curves data, if None float64 is used (optional).
+            
+            Returns:
+                    force_curves (list): List of ForceCurve objects, in the same order as curve_indices.
+    """
+    raw_data = readJPKsegments(jpkindex, afm_file, curve_indices, lock, max_workers)
+    return [
+        loadJPKcurve(jpkindex, afm_file, curve_index, file_metadata, lock, raw_data[curve_index], dtype)
+        for curve_index in curve_indices
+    ]
+
+def loadJPKcurve(jpkindex, afm_file, curve_index, file_metadata, lock=None, raw_data=None, dtype=None):
     """
     Function used to load the data of a single force curve from a JPK file.
 
             Parameters:
-                    paths (list): list containing the paths of the files present int the JPK file.
-                    afm_file (ZipFile): ZipFile buffer containing the data of the JPK file.
+                    jpkindex (jpk.jpkindex.JPKIndex): Index of the segment members of the JPK file.
+                    afm_file (file object): Opened binary JPK file.
                     curve_index (int): Index of curve to load.
                     file_metadata (dict): Dictionary containing the file metadata.
+                    lock (threading.Lock): Lock guarding the access to afm_file (optional).
+                    raw_data (dict): Raw data of the curve segments already read with readJPKsegments (optional).
+                    dtype (np.dtype): Dtype of the curve data, if None float64 is used (optional).
             
             Returns:
                     force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
@@ -28,83 +149,49 @@ def loadJPKcurve(paths, afm_file, curve_index, file_metadata):
     found_vDeflection = file_metadata['found_vDeflection']
 
     force_curve = ForceCurve(curve_index, file_id)
+    # The raw data is decoded directly into dtype, i.e: float32.
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
 
-    curve_indices = file_metadata["Entry_tot_nb_curve"] - 1
+    if raw_data is None:
+        raw_data = readJPKsegments(jpkindex, afm_file, [curve_index], lock, max_workers=1)[curve_index]
 
-    index = 1 if curve_indices == 0 else 3
+    # Parse the segment headers of the curve if it is the first time it is loaded.
+    segment_properties = curve_properties.load(str(curve_index), afm_file, lock)
 
-    keyf = lambda text: text.split("/")[index]
-    groupded_paths = [list(items) for _, items in groupby(sorted(paths), key=keyf)][1:]
-
-    for segment_group in groupded_paths:
-        segment_id = segment_group[0].split("/")[index]
-        segment_raw_data = {}
+    for segment_idx, segment_raw_data in raw_data.items():
+        segment_id = str(segment_idx)
         segment_formated_data = {}
 
-        for path in segment_group:
-            data_type = path.split("/")[-1].split(".")[0]
-
-            if data_type not in ['', 'segment-header']:
-                conversion_factors = file_metadata["channel_properties"][data_type]
-                encoder_type = conversion_factors.get("encoder_type")
-                if encoder_type is None or 'integer' in encoder_type:
-                    divider = 4
-                    format_id = 'i'
-                elif 'short' in conversion_factors["encoder_type"]:
-                    divider = 2
-                    format_id = 'h'
-                elif 'float' in conversion_factors["encoder_type"]:
-                    divider = 4
-                    format_id = 'f'
-                nbr_points = afm_file.getinfo(path).file_size // divider
-                filecontents = afm_file.read(path)
-                data_raw = unpack(f">{str(nbr_points)}{format_id}", filecontents)
-                segment_raw_data[data_type] = data_raw
-        
         # If no data found, continue to next segment.
         if len(segment_raw_data) == 0:
             continue
 
-        height_channel_key = file_metadata['height_channel_key']
-        found_vDeflection = file_metadata['found_vDeflection']
-
         # Transform Height data
         if height_channel_key is not None:
-            raw_data = segment_raw_data[height_channel_key]
-            raw_data = np.asarray(raw_data)
-            conversion_factors = file_metadata["channel_properties"][height_channel_key]
-            values = raw_data * conversion_factors["encoder_multiplier_key"] + conversion_factors["encoder_offet_key"]
-
-            if conversion_factors["absolute_defined"]:
-                values = values * conversion_factors["capSensHeight_abs_mult"] +  conversion_factors["capSensHeight_abs_offset"]
-
-            if conversion_factors["nominal_defined"]:
-                values = values * conversion_factors["capSensHeight_nom_mult"] +  conversion_factors["capSensHeight_nom_offset"]
-
-            segment_formated_data[height_channel_key] = values
+            multiplier, offset = getJPKconversionfactors(file_metadata["channel_properties"], height_channel_key)
+            segment_formated_data[height_channel_key] = decodeJPKchannel(
+                segment_raw_data[height_channel_key], multiplier, offset, dtype
+            )
 
         else:
             print("[!] No valid height channel found!")
 
         # Transform vDeflection data
         if found_vDeflection:
-            raw_data = segment_raw_data["vDeflection"]
-            raw_data = np.asarray(raw_data)
-            conversion_factors = file_metadata["channel_properties"]["vDeflection"]
-            segment_formated_data["vDeflection"] = raw_data * \
-                conversion_factors["encoder_multiplier_key"] + \
-                conversion_factors["encoder_offet_key"] + \
-                conversion_factors["deflection_distance_offset"]
+            multiplier, offset = getJPKconversionfactors(file_metadata["channel_properties"], "vDeflection")
+            segment_formated_data["vDeflection"] = decodeJPKchannel(
+                segment_raw_data["vDeflection"], multiplier, offset, dtype
+            )
 
         else:
             print("[!] No valid vDeflection channel found!")
         
-        segment_type = curve_properties[str(curve_index)][segment_id]["style"]
-        segment_duration = curve_properties[str(curve_index)][segment_id]["duration"]
-        segment_num_points = curve_properties[str(curve_index)][segment_id]["num_points"]
+        segment_type = segment_properties[segment_id]["style"]
+        segment_duration = segment_properties[segment_id]["duration"]
+        segment_num_points = segment_properties[segment_id]["num_points"]
 
         # TO DO: Time can be exported, handle this situation.
-        segment_formated_data["time"] = np.linspace(0, segment_duration, segment_num_points, endpoint=False)
+        segment_formated_data["time"] = get_time_axis(segment_duration, segment_num_points, dtype)
 
         if segment_type=='extend': segment_type='Approach'
         elif segment_type == 'pause': segment_type = 'Pause'
@@ -114,7 +201,7 @@ def loadJPKcurve(paths, afm_file, curve_index, file_metadata):
         segment = Segment(file_id, segment_id, segment_type)
         segment.segment_formated_data = segment_formated_data
         segment.segment_raw_data = segment_raw_data
-        segment.segment_metadata = curve_properties[str(curve_index)][segment_id]
+        segment.segment_metadata = segment_properties[segment_id]
         segment.force_setpoint_mode = JPK_SETPOINT_MODE
         segment.nb_point = segment_num_points
         segment.nb_col = len(segment_formated_data.keys())
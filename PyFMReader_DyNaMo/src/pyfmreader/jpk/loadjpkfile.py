@@ -1,7 +1,7 @@
 import os
-from itertools import groupby
 from zipfile import ZipFile
-from .parsejpkheader import parseJPKheader, parseJPKsegmentheader
+from .jpkindex import buildJPKindex
+from .parsejpkheader import parseJPKheader, JPKCurveProperties
 from .loadjpkimg import loadJPKimg
 
 def loadJPKfile(filepath, UFF, filesuffix):
@@ -30,55 +30,18 @@ def loadJPKfile(filepath, UFF, filesuffix):
         UFF.filemetadata = parseJPKheader(filepath, header_properties, UFF._sharedataprops, filesuffix)
         UFF.isFV = bool(UFF.filemetadata['force_volume'])
 
-        paths = [name for name in afm_file.namelist() if "segments" in name]
+        # Index the members of each segment of each curve, the zip directory
+        # is only walked here and not on every curve load.
+        UFF._jpkindex = buildJPKindex(afm_file, UFF.filemetadata)
 
         if filesuffix in ("jpk-force-map", "jpk-qi-data"):
-            # Function to group paths by index
-            group_keyf = lambda text: int(text.split("/")[1])
-            # Function to sort lists of paths by the index
-            list_keyf = lambda list: int(list[0].split("/")[1])
-            # Group all the paths of the same index
-            grouped_paths = [list(items) for _, items in groupby(paths, key=group_keyf)]
-            # Sort the path groups based on index
-            grouped_paths = sorted(grouped_paths, key=list_keyf)
             # Load image data if scan
-            UFF.imagedata = loadJPKimg(UFF)
+            UFF.imagedata = loadJPKimg(UFF, afm_file, UFF.dtype)
 
-        else:
-            # If not a map, all paths correspond to the same curve.
-            grouped_paths = [paths]
-        
-        UFF._groupedpaths = grouped_paths
-
-        curve_properties = {}
-
-        curve_indices = UFF.filemetadata["Entry_tot_nb_curve"] - 1
-
-        index = 1 if curve_indices == 0 else 3
+        # Segment headers are parsed on first access to each curve.
+        curve_properties = JPKCurveProperties(filepath, filesuffix, UFF._jpkindex, UFF._sharedataprops)
 
-        keyf = lambda text: text.split("/")[index]
-        groupded_paths = [list(items) for _, items in groupby(sorted(paths), key=keyf)][1:]
-
-        for segment_group in groupded_paths:
-            if index == 3:
-                curve_id = segment_group[0].split("/")[1]
-            else:
-                curve_id = '0'
-            segment_id = segment_group[0].split("/")[index]
-            if not curve_id in curve_properties.keys():
-                curve_properties.update({curve_id:{}})
-
-            for path in segment_group:
-                data_type = path.split("/")[-1].split(".")[0]
-
-                if data_type == 'segment-header':
-                    metadatacontents = afm_file.read(path)
-                    metadata_raw = bytes(metadatacontents).decode().splitlines()
-                    # segment_metadata = jprops.load_properties(metadata_raw)
-                    segment_metadata = {item.split("=")[0]:item.split("=")[1] for item in metadata_raw if not item.startswith("#")}
-                    curve_properties = parseJPKsegmentheader(curve_properties, curve_id, filesuffix, segment_metadata, UFF._sharedataprops, segment_id)
-        
-        channels = curve_properties['0']['0']['channels']
+        channels = curve_properties.load('0', file)['0']['channels']
 
         # Deflection channels
         found_vDeflection = "vDeflection"  in channels
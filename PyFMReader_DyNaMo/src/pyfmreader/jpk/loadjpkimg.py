@@ -1,10 +1,13 @@
-from audioop import mul
-from cmath import inf
 import contextlib
 import io
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import tifffile
-from zipfile import ZipFile
+
+from .jpkindex import JPKMember, readJPKmember
+from .loadjpkcurve import getJPKconversionfactors
+from .parsejpkheader import parseJPKsharedsegmentheader
 
 # As for 20/07/2022 these are the accepted channels for
 # JPK files. This routine has a lot of hard coded values
@@ -69,7 +72,107 @@ def get_channel_conversion_factors(tif_tags_list, channel_name):
     # print(mult, offset)
     return mult, offset
 
-def loadJPKimg(UFF):
+class JPKImageData(Mapping):
+    """
+    Lazy dictionary containing the image channels of a JPK force map or QI data file.
+
+    Only the channel names, their conversion factors and the position of their data
+    in the data-image member are known when the file is loaded. Each channel is decoded
+    the first time it is accessed and kept in memory. Only the bytes of the member up to
+    the channel data are decompressed and only the channel data is kept.
+    The decoded channels are not pickled (i.e: when sending the UFF object to a process pool).
+
+            Properties:
+                    filepath (str): Path to the JPK file.
+                    member (jpk.jpkindex.JPKMember): Position of the data-image file in the zip archive.
+                    channels (dict): Dictionary relating each channel to its page, multiplier and offset.
+                    layouts (dict): Dictionary relating each channel to the position, size, shape and dtype
+                                    of its raw data in the data-image file. Channels whose data is not
+                                    stored contiguously are not included and are decoded with tifffile.
+                    dtype (np.dtype): Dtype of the decoded channels (float64 by default).
+            
+            Methods:
+                    get_channel
+    """
+    def __init__(self, filepath, member, channels, layouts=None, dtype=None):
+        self.filepath = filepath
+        self.member = member
+        self.channels = channels
+        self.layouts = layouts or {}
+        self.dtype = np.dtype(np.float64 if dtype is None else dtype)
+        self._cache = {}
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+    def __getitem__(self, channel_name):
+        return self.get_channel(channel_name)
+    
+    def __iter__(self):
+        return iter(self.channels)
+    
+    def __len__(self):
+        return len(self.channels)
+    
+    def _readrawchannel(self, channel_name):
+        """
+        Hidden function used to read the raw data of a channel from the data-image member.
+        """
+        page_index = self.channels[channel_name][0]
+        layout = self.layouts.get(channel_name)
+        with open(self.filepath, 'rb') as afm_file:
+            if layout is not None:
+                data_offset, nbytes, shape, raw_dtype = layout
+                contents = readJPKmember(afm_file, self.member, span=(data_offset, data_offset + nbytes))
+                return np.frombuffer(contents, dtype=raw_dtype).reshape(shape)
+            contents = readJPKmember(afm_file, self.member)
+        with tifffile.TiffFile(io.BytesIO(contents)) as tif:
+            return tif.pages[page_index].asarray()
+
+    def get_channel(self, channel_name, dtype=None):
+        """
+        Decode a single image channel. The data is scaled as follows: raw_data * mult + offset
+
+                Parameters:
+                        channel_name (str): Name of the channel.
+                        dtype (np.dtype): Dtype of the returned data, if None self.dtype is used.
+                
+                Returns:
+                        image (np.array): 2D array containing the channel data.
+        """
+        if channel_name not in self.channels:
+            raise KeyError(channel_name)
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        image = self._cache.get((channel_name, dtype))
+        if image is not None:
+            return image
+        _, mult, offset = self.channels[channel_name]
+        raw_image = self._readrawchannel(channel_name)
+        image = np.empty(raw_image.shape, dtype=dtype)
+        np.multiply(raw_image, mult, out=image)
+        image += dtype.type(offset)
+        self._cache[(channel_name, dtype)] = image
+        return image
+
+def getJPKimglayout(tif, page):
+    """
+    Function used to get the position of the raw data of a tiff page.
+
+            Parameters:
+                    tif (tifffile.TiffFile): Opened data-image file.
+                    page (tifffile.TiffPage): Page containing the channel data.
+            
+            Returns:
+                    layout (tuple): Position, size, shape and dtype of the raw data, or None
+                                    if the data is compressed or not stored contiguously.
+    """
+    if page.compression != 1 or page.predictor != 1 or page.fillorder != 1 or not page.is_contiguous:
+        return None
+    return (page.dataoffsets[0], page.nbytes, page.shape, page.dtype.newbyteorder(tif.byteorder))
+
+def loadJPKimg(UFF, afm_file, dtype=None):
     """
     Returns the contents of the data-image file inside the JPK file.
     This file is structured in a tiff like strucure, with each channel
@@ -77,49 +180,80 @@ def loadJPKimg(UFF):
     On the metadata the factors to scale the data into the right units
     can be found.
     The data is scaled as follows: raw_data * mult + offset
+
+    Only the page tags are read here, walking the data-image member as a stream
+    so its decompressed contents are not kept in memory. The channels are decoded
+    on first access.
     
             Parameters:
                     UFF (uff.UFF): UFF object containing the JPK file metadata.
+                    afm_file (ZipFile): ZipFile buffer containing the data of the JPK file.
+                    dtype (np.dtype): Dtype of the decoded channels, if None float64 is used.
             
             Returns:
-                    imagedata (dict): dictionary containing all the channels data.
+                    imagedata (JPKImageData): lazy dictionary containing all the channels data.
     """
     file_type = UFF.filemetadata['file_type']
     if file_type == "jpk-force-map": path = 'data-image.force'
     elif file_type == "jpk-qi-data": path = 'data-image.jpk-qi-image'
     else: return
-    with open(UFF.filemetadata['file_path'], 'rb') as file:
-        afm_file = ZipFile(file)
-        bytes_io = io.BytesIO(afm_file.read(path))
-        with tifffile.TiffFile(bytes_io) as tif:
-            data = {}
-            channel_name = None
-            for page in tif.pages[1:]:
-                tif_tags = [tag.value for tag in page.tags.values()]
-                # print(tif_tags)
-                for tag in tif_tags:
-                    # print(tag)
-                    with contextlib.suppress(TypeError):
-                        if 'algorithm.object-name.base-object-name.fancy-name' in tag:
-                            channel_name = tag.split('\n')[0].split(':')[1].replace(' ', '')
-                if channel_name not in  valid_channels:
-                    continue
-                # Try to fetch the multiplier and offset.
-                mult, offset = get_channel_conversion_factors(tif_tags, channel_name)
-                # Check if the multiplier and the offset have been extracted properly.
-                # In the test files it works correctly. But weird things may happen with
-                # other files.
-                if isinstance(mult, float) and isinstance(offset, float):
-                    image = page.asarray()
-                    data[channel_name] = image.astype(np.int64) * mult + offset
-    return data
-
-def computeJPKPiezoImg(UFF):
+    info = afm_file.getinfo(path)
+    member = JPKMember(info.header_offset, info.compress_size, info.file_size, info.compress_type)
+    with afm_file.open(info) as member_file, tifffile.TiffFile(member_file) as tif:
+        channels = {}
+        layouts = {}
+        channel_name = None
+        for page_index, page in enumerate(tif.pages[1:], start=1):
+            tif_tags = [tag.value for tag in page.tags.values()]
+            # print(tif_tags)
+            for tag in tif_tags:
+                # print(tag)
+                with contextlib.suppress(TypeError):
+                    if 'algorithm.object-name.base-object-name.fancy-name' in tag:
+                        channel_name = tag.split('\n')[0].split(':')[1].replace(' ', '')
+            if channel_name not in  valid_channels:
+                continue
+            # Try to fetch the multiplier and offset.
+            mult, offset = get_channel_conversion_factors(tif_tags, channel_name)
+            # Check if the multiplier and the offset have been extracted properly.
+            # In the test files it works correctly. But weird things may happen with
+            # other files.
+            if isinstance(mult, float) and isinstance(offset, float):
+                channels[channel_name] = (page_index, mult, offset)
+                layout = getJPKimglayout(tif, page)
+                if layout is not None:
+                    layouts[channel_name] = layout
+    return JPKImageData(UFF.filemetadata['file_path'], member, channels, layouts, dtype)
+
+def readJPKlastheight(UFF, afm_file, member, dtype, multiplier, offset):
+    """
+    Function used to get the last height value of a segment, reading
+    only the tail of the height channel when the encoding allows it.
+
+            Parameters:
+                    UFF (uff.UFF): UFF object containing the JPK file metadata.
+                    afm_file (file object): Opened binary JPK file.
+                    member (jpk.jpkindex.JPKMember): Position of the height channel in the zip archive.
+                    dtype (np.dtype): Dtype of the height channel raw data.
+                    multiplier (float): Fused multiplier (see getJPKconversionfactors).
+                    offset (float): Fused offset (see getJPKconversionfactors).
+            
+            Returns:
+                    height (float): Last height value of the segment.
+    """
+    contents = readJPKmember(afm_file, member, UFF._sessionlock, tail=dtype.itemsize)
+    return np.frombuffer(contents, dtype=dtype)[-1] * multiplier + offset
+
+def computeJPKPiezoImg(UFF, max_workers=None):
     """
     Function used to compute the piezo image of a JPK file.
 
+    Only the height channel of the first extend segment of each curve is read
+    and decoded. The curves are read in parallel using a pool of threads.
+
             Parameters:
                     UFF (uff.UFF): UFF object containing the JPK file metadata.
+                    max_workers (int): Maximum number of threads used to read the curves (optional).
             
             Returns:
                     piezoimg (np.array): 2D array containing the piezo image of the JPK file.
@@ -127,15 +261,34 @@ def computeJPKPiezoImg(UFF):
     file_type = UFF.filemetadata['file_type']
     height_channel_key = UFF.filemetadata["height_channel_key"]
     if file_type in ("jpk-force-map", "jpk-qi-data"):
-        # Get height key
+        jpkindex = UFF._jpkindex
+        nb_curves = UFF.filemetadata['Entry_tot_nb_curve']
+        members = jpkindex.members
+        # In force maps the segment style is shared by all the curves.
+        segment_ids = np.unique(members['segment'])
+        extend_ids = [
+            segment_id for segment_id in segment_ids
+            if parseJPKsharedsegmentheader(UFF._sharedataprops, str(segment_id))["style"] == "extend"
+        ]
+        # Get the height channel of the first approach segment of each curve.
+        height_rows = members[
+            (members['channel'] == jpkindex.channels.index(height_channel_key)) &
+            np.isin(members['segment'], extend_ids)
+        ]
+        curve_ids, first_rows = np.unique(height_rows['curve'], return_index=True)
+        height_rows = height_rows[first_rows]
+        dtype = jpkindex.dtypes[jpkindex.channels.index(height_channel_key)]
+        multiplier, offset = getJPKconversionfactors(UFF.filemetadata["channel_properties"], height_channel_key)
         # Get the last value of the first approach segment.
-        with open(UFF.filemetadata['file_path'], 'rb') as file:
-            afm_file = ZipFile(file)
-            tempiezoimg = np.array(
-                [UFF._loadcurve(idx, afm_file, file_type).extend_segments[0][1].segment_formated_data[height_channel_key][-1] for idx in range(UFF.filemetadata['Entry_tot_nb_curve'])]
+        tempiezoimg = np.full(nb_curves, np.nan)
+        with UFF, ThreadPoolExecutor(max_workers) as executor:
+            last_heights = executor.map(
+                lambda row: readJPKlastheight(UFF, UFF._filehandle, JPKMember(*row), dtype, multiplier, offset),
+                height_rows[['offset', 'compress_size', 'file_size', 'compress_type']].tolist()
             )
+            tempiezoimg[curve_ids] = list(last_heights)
         # Rescale piezo image (0 - maxval)
-        piezoimg = tempiezoimg - np.min(tempiezoimg)
+        piezoimg = tempiezoimg - np.nanmin(tempiezoimg)
         # Reshape piezo image
         piezoimg = piezoimg.reshape((UFF.filemetadata["num_y_pixels"], UFF.filemetadata["num_x_pixels"]))
         if file_type == "jpk-force-map":
@@ -1,10 +1,19 @@
 # File containing the following functions:
 # - parseJPKheader: Used to load the metadata from a JPK file.
+# - parseJPKsharedsegmentheader: Used to load the metadata of each segment
+#   shared by all the force curves in JPK force maps and QI data.
 # - parseJPKsegmentheader: Used to load the metadata of each segment
 #   for each force curve in a JPK file.
+# And the JPKCurveProperties class, used to load the segment metadata
+# of each force curve on first access.
 
 import os
 import re
+from collections.abc import Mapping
+
+import numpy as np
+
+from .jpkindex import readJPKmember
 
 from ..constants import *
 
@@ -191,7 +200,38 @@ def parseJPKheader(filepath, header_properties, shared_data_properties, filesuff
     
     return file_metadata
 
-def parseJPKsegmentheader(curve_properties, curve_index, file_type, segment_header, shared_data_properties, segment_id):
+def parseJPKsharedsegmentheader(shared_data_properties, segment_id):
+    """
+    Function used to load the metadata of a segment that, in JPK force maps and QI data,
+    is shared by all the force curves and stored in shared-data/header.properties.
+
+            Parameters:
+                    shared_data_properties (dict): Dictionary containing metadata from shared-data/header.properties
+                    segment_id (str): Position of the segment in the force curve.
+            
+            Returns:
+                    segment_metadata (dict): Dictionary containing the shared metadata of the segment.
+    """
+    segment_metadata = {}
+
+    prefix = f"force-segment-header-info.{segment_id}"
+    segment_metadata["approach_id"] = shared_data_properties.get(f"{prefix}.approach-id")
+    segment_metadata["style"] = shared_data_properties.get(f"{prefix}.settings.style")
+
+    if segment_metadata["style"] == "extend":
+        segment_metadata["setpoint"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.setpoint", multiplier_default))
+
+    elif segment_metadata["style"] == "modulation":
+        segment_metadata["amplitude"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.amplitude", offset_default))
+        segment_metadata["frequency"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.frequency", offset_default))
+        segment_metadata["start-phase"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.start-phase", offset_default))
+    
+    segment_metadata["z_start"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.z-start", offset_default)) * scaling_factor
+    segment_metadata["z_end"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.z-end", offset_default)) * scaling_factor
+
+    return segment_metadata
+
+def parseJPKsegmentheader(curve_properties, curve_index, file_type, segment_header, shared_data_properties, segment_id, shared_segment_metadata=None):
     """
     Function used to load the metadata of each segment for each force curve of a JPK file.
 
@@ -202,6 +242,7 @@ def parseJPKsegmentheader(curve_properties, curve_index, file_type, segment_head
                     segment_header (dict): Dictionary containing metadata from segment-header
                     shared_data_properties (str): Dictionary containing metadata from shared-data/header.properties
                     segment_id (str): Position of the segment in the force curve.
+                    shared_segment_metadata (dict): Already parsed output of parseJPKsharedsegmentheader for this segment (optional).
             
             Returns:
                     curve_properties (dict): Dictionary containing all the metadata for each force curve in the file.
@@ -238,20 +279,9 @@ def parseJPKsegmentheader(curve_properties, curve_index, file_type, segment_head
         segment_metadata["z_end"] = float(segment_header.get("force-segment-header.settings.segment-settings.z-end", offset_default)) * scaling_factor
     
     elif file_type in ("jpk-force-map", "jpk-qi-data"):
-        prefix = f"force-segment-header-info.{segment_id}"
-        segment_metadata["approach_id"] = shared_data_properties.get(f"{prefix}.approach-id")
-        segment_metadata["style"] = shared_data_properties.get(f"{prefix}.settings.style")
-
-        if segment_metadata["style"] == "extend":
-            segment_metadata["setpoint"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.setpoint", multiplier_default))
-
-        elif segment_metadata["style"] == "modulation":
-            segment_metadata["amplitude"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.amplitude", offset_default))
-            segment_metadata["frequency"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.frequency", offset_default))
-            segment_metadata["start-phase"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.start-phase", offset_default))
-        
-        segment_metadata["z_start"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.z-start", offset_default)) * scaling_factor
-        segment_metadata["z_end"] = float(shared_data_properties.get(f"{prefix}.settings.segment-settings.z-end", offset_default)) * scaling_factor
+        if shared_segment_metadata is None:
+            shared_segment_metadata = parseJPKsharedsegmentheader(shared_data_properties, segment_id)
+        segment_metadata.update(shared_segment_metadata)
     
     # Compute ramp size
     segment_metadata["ramp_size"] = segment_metadata["z_end"] - segment_metadata["z_start"]
@@ -260,4 +290,80 @@ def parseJPKsegmentheader(curve_properties, curve_index, file_type, segment_head
 
     curve_properties[str(curve_index)].update({segment_id: segment_metadata})
     
-    return curve_properties
\ No newline at end of file
+    return curve_properties
+
+class JPKCurveProperties(Mapping):
+    """
+    Lazy dictionary containing the metadata of each segment for each force curve of a JPK file.
+
+    The segment-header members of a force curve are only read and parsed the first time
+    the curve is accessed. In force maps and QI data the values stored in
+    shared-data/header.properties are parsed once per segment and shared by all the curves.
+
+            Properties:
+                    filepath (str): Path to the JPK file.
+                    file_type (str): File extension of JPK file.
+            
+            Methods:
+                    load
+    """
+    def __init__(self, filepath, file_type, jpkindex, shared_data_properties):
+        self.filepath = filepath
+        self.file_type = file_type
+        self._jpkindex = jpkindex
+        self._shared_data_properties = shared_data_properties
+        self._shared_segment_metadata = {}
+        self._curves = {}
+        curve_sizes = np.diff(jpkindex.curve_starts)
+        self._curve_ids = [str(curve_idx) for curve_idx in np.flatnonzero(curve_sizes)]
+    
+    def __getitem__(self, curve_id):
+        curve_properties = self._curves.get(curve_id)
+        if curve_properties is None:
+            if curve_id not in self._curve_ids:
+                raise KeyError(curve_id)
+            with open(self.filepath, 'rb') as afm_file:
+                curve_properties = self.load(curve_id, afm_file)
+        return curve_properties
+    
+    def __iter__(self):
+        return iter(self._curve_ids)
+    
+    def __len__(self):
+        return len(self._curve_ids)
+    
+    def load(self, curve_id, afm_file, lock=None):
+        """
+        Get the metadata of each segment of a force curve, reading the segment headers
+        from an already opened file if they have not been parsed yet.
+
+                Parameters:
+                        curve_id (str): Index of the force curve.
+                        afm_file (file object): Opened binary JPK file.
+                        lock (threading.Lock): Lock guarding the access to afm_file (optional).
+                
+                Returns:
+                        curve_properties (dict): Dictionary containing the metadata of each segment of the force curve.
+        """
+        curve_properties = self._curves.get(curve_id)
+        if curve_properties is not None:
+            return curve_properties
+        curve_properties = {curve_id:{}}
+        segment_headers = self._jpkindex.get_curve_segments(int(curve_id), headers=True)
+        for segment_idx, member in segment_headers.items():
+            segment_id = str(segment_idx)
+            metadatacontents = readJPKmember(afm_file, member, lock)
+            metadata_raw = bytes(metadatacontents).decode().splitlines()
+            segment_metadata = {item.split("=")[0]:item.split("=")[1] for item in metadata_raw if not item.startswith("#")}
+            shared_segment_metadata = None
+            if self.file_type in ("jpk-force-map", "jpk-qi-data"):
+                shared_segment_metadata = self._shared_segment_metadata.get(segment_id)
+                if shared_segment_metadata is None:
+                    shared_segment_metadata = parseJPKsharedsegmentheader(self._shared_data_properties, segment_id)
+                    self._shared_segment_metadata[segment_id] = shared_segment_metadata
+            curve_properties = parseJPKsegmentheader(
+                curve_properties, curve_id, self.file_type, segment_metadata,
+                self._shared_data_properties, segment_id, shared_segment_metadata
+            )
+        self._curves[curve_id] = curve_properties[curve_id]
+        return self._curves[curve_id]
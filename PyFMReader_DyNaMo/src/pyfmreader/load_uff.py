@@ -3,16 +3,110 @@
 # Reference: N/A
 
 import os
+import re
+import json
+import pathlib
+import struct
+import zipfile
 from .utils.forcecurve import ForceCurve
 from .utils.segment import Segment
+from .constants import UFFZ_version
 import numpy as np
 
-def loadUFFheader(uffpath):
+segment_type_key = re.compile(r'Recording_segment_(\d+)_type')
+
+# Codes of the segments in the data lines, used when the header does not define them.
+uff_segment_codes = ('AP', 'RE', 'PA', 'MO')
+
+# Size and format of the local file header that precedes each member in the zip archive.
+_local_header_struct = struct.Struct("<4s5H3L2H")
+
+# Tables stored in the binary UFF container (.uffz), see save_uff.saveUFFZ.
+uffz_curve_dtype = np.dtype([
+    ('curve', np.int64),
+    ('curve_index', np.int64),
+    ('first_segment', np.int64),
+    ('nb_segments', np.int32),
+    ('z_at_setpoint', np.float64)
+])
+
+uffz_segment_dtype = np.dtype([
+    ('curve', np.int64),
+    ('segment', np.int32),
+    ('type', np.int16),
+    ('group', np.int8),
+    ('chunk', np.int32),
+    ('nb_point', np.int64),
+    ('force_setpoint_mode', np.int16),
+    ('force_setpoint', np.float64),
+    ('velocity', np.float64),
+    ('sampling_rate', np.float64),
+    ('z_displacement', np.float64),
+    ('str_key', np.bool_),
+    ('str_segment_id', np.bool_)
+])
+
+# Key of the tagged objects used to store the metadata types that JSON does not have.
+uffz_tag = '__uffz__'
+
+def fromUFFZjson(value):
+    """
+    Decode a metadata value stored in a binary UFF container (see save_uff.toUFFZjson).
+
+            Parameters:
+                    value (object): Decoded JSON value.
+            
+            Returns:
+                    decoded (object): Metadata value, with its original type.
+    """
+    if isinstance(value, list):
+        return [fromUFFZjson(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    tag = value.get(uffz_tag)
+    if tag is None:
+        return {key: fromUFFZjson(item) for key, item in value.items()}
+    if tag == 'dict':
+        return {fromUFFZjson(key): fromUFFZjson(item) for key, item in value['items']}
+    if tag == 'tuple':
+        return tuple(fromUFFZjson(item) for item in value['items'])
+    if tag == 'scalar':
+        return np.dtype(value['dtype']).type(fromUFFZjson(value['value']))
+    if tag == 'ndarray':
+        return np.array(fromUFFZjson(value['items']), dtype=value['dtype']).reshape(value['shape'])
+    if tag == 'path':
+        return pathlib.Path(value['value'])
+    if tag == 'complex':
+        return complex(*value['value'])
+    if tag == 'bytes':
+        return bytes.fromhex(value['value'])
+    raise ValueError(f"Unknown UFFZ metadata type: {tag}")
+
+def readUFFtxt(uffpath):
+    """
+    Read a txt UFF AFM file in a single pass and split the header
+    lines (starting with HE) from the data lines.
+
+            Parameters:
+                    uffpath (str): Path to the file.
+            
+            Returns:
+                    header_lines (list): Lines containing the header information.
+                    data_lines (list): Lines containing the segments data.
+    """
+    with open(uffpath, 'r') as file:
+        lines = file.read().splitlines()
+    header_lines = [line for line in lines if line.startswith('HE')]
+    data_lines = [line for line in lines if line.strip() and not line.startswith('HE')]
+    return header_lines, data_lines
+
+def loadUFFheader(uffpath, header_lines=None):
     """
     Load the header of an UFF AFM file.
 
             Parameters:
                     uffpath (str): Path to the file.
+                    header_lines (list): Header lines already read with readUFFtxt, if None the file is read.
             
             Returns:
                     header (dict): Dictionary containing the header information.
@@ -22,38 +116,102 @@ def loadUFFheader(uffpath):
         "file_size_bytes": os.path.getsize(uffpath)
     }
     header["file_type"] = os.path.splitext(uffpath)[-1]
-    with open(uffpath, 'r') as file:
-        for line in file.readlines():
-            if 'HE' in line:
-                splitline = line.split(' ', 1)[-1].split(':', 1)
-                field = splitline[0]
-                val = splitline[-1].lstrip().strip(' \n"')
-                try: val = float(val)
-                except ValueError: val = val
-                header[field] = val
+    if header_lines is None:
+        header_lines, _ = readUFFtxt(uffpath)
+    for line in header_lines:
+        splitline = line.split(' ', 1)[-1].split(':', 1)
+        field = splitline[0]
+        val = splitline[-1].lstrip().strip(' \n"')
+        try: val = float(val)
+        except ValueError: val = val
+        header[field] = val
     return header
 
-def loadUFFcurve(header):
+def getUFFsegmentids(header):
+    """
+    Get the ids of the segments described in the header of an UFF AFM file.
+
+            Parameters:
+                    header (dict): Dictionary containing the UFF header information.
+            
+            Returns:
+                    segment_ids (list): Sorted segment ids.
+    """
+    segment_ids = []
+    for key in header:
+        match = segment_type_key.fullmatch(key)
+        if match is not None:
+            segment_ids.append(int(match.group(1)))
+    return sorted(segment_ids)
+
+def getUFFdata(header, data_lines):
+    """
+    Parse the data lines of an UFF AFM file.
+
+    Each data line contains the segment code, the segment id and the
+    value of each column. The numeric block is parsed at once with
+    np.loadtxt and grouped by segment id. The lines that do not start
+    with a segment code, i.e: the **** terminator, are skipped.
+
+            Parameters:
+                    header (dict): Dictionary containing the UFF header information.
+                    data_lines (list): Data lines read with readUFFtxt.
+            
+            Returns:
+                    uffdata (dict): Dictionary relating each segment id to its data (nb_point, nb_col).
+    """
+    segment_ids = getUFFsegmentids(header)
+    if not segment_ids:
+        return {}
+    ncols = {
+        segid: int(header[f'Recording_segment_{segid}_nb_col']) for segid in segment_ids
+    }
+    segment_codes = {
+        str(header.get(f'Recording_segment_{segid}_code', '')) for segid in segment_ids
+    }.union(uff_segment_codes)
+    data_lines = [line for line in data_lines if line.split(None, 1)[0] in segment_codes]
+    if len(set(ncols.values())) <= 1:
+        # All the segments have the same columns, parse the whole block at once.
+        block = np.loadtxt(data_lines, usecols=range(1, 2 + max(ncols.values())), ndmin=2)
+        line_segids = block[:, 0].astype(int)
+        block = block[:, 1:]
+        return {segid: block[line_segids == segid] for segid in segment_ids}
+    # Group the lines by segment id before parsing each block.
+    grouped_lines = {segid: [] for segid in segment_ids}
+    for line in data_lines:
+        grouped_lines[int(line.split(None, 2)[1])].append(line)
+    return {
+        segid: np.loadtxt(grouped_lines[segid], usecols=range(2, 2 + ncols[segid]), ndmin=2)
+        for segid in segment_ids
+    }
+
+def loadUFFcurve(header, uffdata=None):
     """
     Load the data of an UFF AFM file.
 
             Parameters:
                     header (dict): Dictionary containing the UFF header information.
+                    uffdata (dict): Segments data already parsed with getUFFdata, if None the file is read.
             
             Returns:
                     fdc (utils.forcecurve.ForceCurve): Force Distance Curve data stored in UFF.
     """
-    uffpath = header['file_path']
+    if uffdata is None:
+        _, data_lines = readUFFtxt(header['file_path'])
+        uffdata = getUFFdata(header, data_lines)
     idx = int(header['Recording_curve_id'])
     filename = header['Entry_filename']
     fdc = ForceCurve(idx, filename)
-    for segid in range(int(header['Recording_number_segment'])):
+    for segid in getUFFsegmentids(header):
         segtype = header[f'Recording_segment_{segid}_type']
-        segcode = header[f'Recording_segment_{segid}_code']
         npoints = int(header[f'Recording_segment_{segid}_nb_point'])
         ncols = int(header[f'Recording_segment_{segid}_nb_col'])
 
-        segdata = np.zeros((npoints, ncols))
+        segdata = uffdata[segid]
+        if segdata.shape != (npoints, ncols):
+            raise ValueError(
+                f"Segment {segid} data shape {segdata.shape} does not match the header ({npoints}, {ncols})"
+            )
         segment = Segment(filename, str(segid), segtype)
         segment.nb_point = npoints
         segment.nb_col = ncols
@@ -63,19 +221,10 @@ def loadUFFcurve(header):
         segment.sampling_rate = header[f'Recording_segment_{segid}_sampling_rate(Hz)']
         segment.z_displacement = header[f'Recording_segment_{segid}_z_displacement(m)']
 
-        with open(uffpath, 'r') as file:
-            i = 0
-            for line in file.readlines():
-                linedata = line.split()
-                if linedata[0] != segcode: continue
-                for j, value in enumerate(linedata[2:]): segdata[i,j] = value
-                i+=1
-        for colidx in range(ncols):
-            colkey = header[f'Recording_segment_{segid}_col_{colidx}_title']
-            if segment.segment_formated_data is None:
-                segment.segment_formated_data = {colkey:segdata[:, colidx]}
-            else:
-                segment.segment_formated_data.update({colkey:segdata[:, colidx]})
+        segment.segment_formated_data = {
+            header[f'Recording_segment_{segid}_col_{colidx}_title']: segdata[:, colidx]
+            for colidx in range(ncols)
+        }
         if segtype == 'Approach': fdc.extend_segments.append((segid, segment))
         elif segtype == 'Retract': fdc.retract_segments.append((segid, segment))
         elif segtype == 'Pause': fdc.pause_segments.append((segid, segment))
@@ -93,5 +242,204 @@ def loadUFFtxt(uffpath, UFF):
             Returns:
                     UFF (uff.UFF): Universal File Format object containing loaded data.
     """
-    UFF.filemetadata = loadUFFheader(uffpath)
-    return UFF
\ No newline at end of file
+    # The file is read only once, the parsed segments data is
+    # kept in the UFF object and used by getcurve.
+    header_lines, data_lines = readUFFtxt(uffpath)
+    UFF.filemetadata = loadUFFheader(uffpath, header_lines)
+    UFF.isFV = False
+    UFF._uffdata = getUFFdata(UFF.filemetadata, data_lines)
+    return UFF
+class UFFZData:
+    """
+    Class used to access the data stored in a binary UFF container (.uffz),
+    see save_uff.saveUFFZ for a description of the layout.
+
+    The curve and segment tables are loaded in memory, the channel data is
+    memory-mapped the first time a chunk is accessed. Memory maps are not
+    pickled (i.e: when sending the UFF object to a process pool).
+
+            Properties:
+                    filepath (str): Path to the binary UFF container.
+                    header (dict): Contents of header.json.
+                    members (dict): Relates each member of the zip archive to its header offset.
+                    curves (np.array): Structured array containing the curves info (see uffz_curve_dtype).
+                    segments (np.array): Structured array containing the segments info (see uffz_segment_dtype).
+                    segment_metadata (list): Metadata of each segment, decoded the first time a curve is accessed.
+                    offsets (np.array): Position of each segment channel in its chunk.
+                    lengths (np.array): Length of each segment channel, -1 if missing.
+            
+            Methods:
+                    get_array
+                    get_curve
+                    get_images
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with zipfile.ZipFile(filepath) as zfile:
+            self.header = json.loads(zfile.read('header.json'))
+            self.members = {info.filename: info.header_offset for info in zfile.infolist()}
+        if self.header.get('UFFZ_version') != UFFZ_version:
+            raise ValueError(f"Unsupported binary UFF container version in {filepath}")
+        self._arrays = {}
+        self._segment_metadata = None
+        self.curves = np.array(self.get_array('curves.npy'))
+        self.segments = np.array(self.get_array('segments.npy'))
+        self.offsets = np.array(self.get_array('offsets.npy'))
+        self.lengths = np.array(self.get_array('lengths.npy'))
+        self._arrays = {}
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = {}
+        return state
+
+    @property
+    def segment_metadata(self):
+        """
+        Metadata of each segment, in the order of the segments table.
+        """
+        if self._segment_metadata is None:
+            with zipfile.ZipFile(self.filepath) as zfile:
+                self._segment_metadata = json.loads(zfile.read('segment_metadata.json'))
+        return self._segment_metadata
+
+    def get_array(self, name):
+        """
+        Memory-map an array stored in the container.
+
+                Parameters:
+                        name (str): Name of the npy member in the zip archive.
+                
+                Returns:
+                        array (np.memmap): Read-only array, or None if the member is not found.
+        """
+        array = self._arrays.get(name)
+        if array is not None or name not in self.members:
+            return array
+        with open(self.filepath, 'rb') as file:
+            file.seek(self.members[name])
+            local_header = _local_header_struct.unpack(file.read(_local_header_struct.size))
+            if local_header[0] != b"PK\003\004":
+                raise ValueError(f"Bad zip member header for {name}")
+            name_length, extra_length = local_header[-2:]
+            file.seek(name_length + extra_length, 1)
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            data_offset = file.tell()
+        if np.prod(shape) == 0:
+            array = np.empty(shape, dtype=dtype)
+        else:
+            array = np.memmap(
+                self.filepath, dtype=dtype, mode='r', offset=data_offset,
+                shape=shape, order='F' if fortran_order else 'C'
+            )
+        self._arrays[name] = array
+        return array
+
+    def get_curve(self, curve_index, dtype=None):
+        """
+        Get a force curve from the container. The channel data of
+        the segments are read-only views of the memory-mapped chunks,
+        unless they are cast to dtype.
+
+                Parameters:
+                        curve_index (int): Index of the curve.
+                        dtype (np.dtype): Dtype of the channel data, if None the stored dtype is kept (optional).
+                
+                Returns:
+                        force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the curve data.
+        """
+        position = np.searchsorted(self.curves['curve'], curve_index)
+        if position == len(self.curves) or self.curves['curve'][position] != curve_index:
+            raise IndexError(f"Curve {curve_index} not found in {self.filepath}")
+        _, fdc_index, first_segment, nb_segments, z_at_setpoint = self.curves[position].tolist()
+        filename = self.header['filemetadata'].get('Entry_filename')
+        channels = self.header['channels']
+        fdc = ForceCurve(fdc_index, filename)
+        fdc.z_at_setpoint = z_at_setpoint
+        segment_groups = (fdc.extend_segments, fdc.retract_segments, fdc.pause_segments, fdc.modulation_segments)
+        for row in range(first_segment, first_segment + nb_segments):
+            (_, segid, segtype, group, chunk, nb_point, setpoint_mode, force_setpoint, velocity,
+             sampling_rate, z_displacement, str_key, str_segment_id) = self.segments[row].tolist()
+            segtype = self.header['segment_types'][segtype]
+            # Restore the segment ids with the type used by the original loader.
+            segment = Segment(filename, str(segid) if str_segment_id else segid, segtype)
+            segment.nb_point = nb_point if nb_point >= 0 else None
+            segment.force_setpoint_mode = self.header['force_setpoint_modes'][setpoint_mode]
+            segment.force_setpoint = force_setpoint
+            segment.velocity = velocity
+            segment.sampling_rate = sampling_rate
+            segment.z_displacement = z_displacement
+            segment.segment_metadata = fromUFFZjson(self.segment_metadata[row])
+            segment.segment_formated_data = {}
+            for channel_index, channel in enumerate(channels):
+                length = self.lengths[row, channel_index]
+                if length < 0:
+                    continue
+                offset = self.offsets[row, channel_index]
+                channel_data = self.get_array(f'data/{chunk}/{channel_index}.npy')
+                segment.segment_formated_data[channel] = channel_data[offset:offset + length]
+                if dtype is not None:
+                    # Only the data of the curve is cast.
+                    segment.segment_formated_data[channel] = segment.segment_formated_data[channel].astype(dtype, copy=False)
+            segment.nb_col = len(segment.segment_formated_data)
+            segment_groups[group].append((str(segid) if str_key else segid, segment))
+        return fdc
+
+    def get_images(self):
+        """
+        Get the additional image data stored in the container.
+
+                Parameters: None
+                
+                Returns:
+                        imagedata (dict): Dictionary relating each image name to its memory-mapped data.
+        """
+        return {
+            image_name: self.get_array(f'images/{image_idx}.npy')
+            for image_idx, image_name in enumerate(self.header['images'])
+        }
+
+def loadUFFZcurve(uffzdata, curve_index=0, dtype=None):
+    """
+    Load the data of a single force curve from a binary UFF container.
+
+            Parameters:
+                    uffzdata (UFFZData): Binary UFF container.
+                    curve_index (int): Index of the curve.
+                    dtype (np.dtype): Dtype of the channel data, if None the stored dtype is kept (optional).
+            
+            Returns:
+                    fdc (utils.forcecurve.ForceCurve): Force Distance Curve data stored in the container.
+    """
+    return uffzdata.get_curve(curve_index, dtype)
+
+def loadUFFZfile(uffzpath, UFF, uffzdata=None):
+    """
+    Load the metadata of a binary UFF container (.uffz).
+
+    The metadata of the original file is restored, including its file type, so the
+    curves are processed as the ones loaded from the original file. The curves are
+    read from the container (see UFFZData).
+
+            Parameters:
+                    uffzpath (str): Path to the file.
+                    UFF (uff.UFF): Universal File Format object to store loaded data.
+                    uffzdata (UFFZData): Binary UFF container already opened, if None the file is opened.
+            
+            Returns:
+                    UFF (uff.UFF): Universal File Format object containing loaded data.
+    """
+    if uffzdata is None:
+        uffzdata = UFFZData(uffzpath)
+    UFF.filemetadata = fromUFFZjson(uffzdata.header['filemetadata'])
+    UFF.filemetadata['source_file_path'] = UFF.filemetadata.get('file_path')
+    UFF.filemetadata['file_path'] = uffzpath
+    UFF.filemetadata['file_size_bytes'] = os.path.getsize(uffzpath)
+    UFF.isFV = uffzdata.header['isFV']
+    UFF.imagedata = uffzdata.get_images() or None
+    UFF._uffzdata = uffzdata
+    return UFF
@@ -2,148 +2,233 @@
 # used to load the data of force curves from NANOSCOPE files.
 
 import numpy as np
-from struct import unpack
 
 from ..utils.forcecurve import ForceCurve
-from ..utils.segment import Segment
+from ..utils.segment import Segment, get_time_axis
 
-def loadNANOSCcurve(idx, header):
+def getNANOSCFDCdtype(header):
     """
-    Function used to load the data of a single force curve from a JPK file.
+    Function used to get the dtype of the force curves raw data.
 
             Parameters:
-                    idx (int): Index of the force curve.
                     header (dict): Dictionary containing all NANOSCOPE file metadata.
             
             Returns:
-                    force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
+                    dtype (np.dtype): Little endian dtype of the force curves raw data.
     """
-    
-    file_name = header['Entry_filename']
-    filepath = header['file_path']
-    force_curve = ForceCurve(idx, file_name)
-    # Only simple curves with trace/retrace are supported
-    appsegment = Segment(file_name, '0', 'Approach')
-    retsegment = Segment(file_name, '1', 'Retract')
-    
-    with open(filepath, 'rb') as afmfile:
-        # Get variables needed for loading data from header
-        isFV = bool(header['force_volume'])
-        isPFC = bool(header['peakforce'])
-        FDC_data_length = header['FDC_data_length']
-        FDC_nb_sampsline = header['FDC_nb_sampsline']
-        nb_point_approach = header['nb_point_approach']
-        nb_point_retract = header['nb_point_retract']
-        data_offset = header['data_offset']
-        zstep_approach_nm = header['zstep_approach_nm']
-        zstep_retract_nm = header['zstep_retract_nm']
-        defl_sens_Vbybyte = header['defl_sens_Vbybyte']
-        
-        forward_duration = header['ramp_duration_forward']
-        reverse_duration = header['ramp_duration_reverse']
-
-        app_x =  np.arange(nb_point_approach) * zstep_approach_nm
-        ret_x =  np.arange(nb_point_retract) * zstep_retract_nm
-
-        tempapp = np.zeros((nb_point_approach))
-        tempret = np.zeros((nb_point_retract))
-
-        if isFV:
-            FDC_bytes = FDC_data_length // (2 * nb_point_approach * FDC_nb_sampsline ** 2)
-        else:
-            FDC_bytes = FDC_data_length // (2 * nb_point_approach)
-
-        if FDC_bytes == 2: fmt = 'h' # Short Int
-        elif FDC_bytes == 4: fmt = 'i' # Int
-
-        offset = int(data_offset + (idx * (nb_point_approach + nb_point_retract) * FDC_bytes))
+    FDC_data_length = header['FDC_data_length']
+    nb_point_approach = header['nb_point_approach']
+    if header['force_volume']:
+        FDC_bytes = FDC_data_length // (2 * nb_point_approach * header['FDC_nb_sampsline'] ** 2)
+    else:
+        FDC_bytes = FDC_data_length // (2 * nb_point_approach)
+    if FDC_bytes == 2: return np.dtype('<i2') # Short Int
+    elif FDC_bytes == 4: return np.dtype('<i4') # Int
+    raise ValueError(f"Unsupported number of bytes per point: {FDC_bytes}")
+
+def loadNANOSCvolume(header):
+    """
+    Function used to memory map the force curves block of a NANOSCOPE file.
+    Each row of the returned array contains the raw approach and retract
+    data of a curve, so single curves are zero-copy slices of it.
 
-        afmfile.seek(offset, 0)
+            Parameters:
+                    header (dict): Dictionary containing all NANOSCOPE file metadata.
+            
+            Returns:
+                    volume (np.memmap): Array of shape (nb_curves, nb_point_approach + nb_point_retract)
+                                        containing the raw data of all the curves.
+    """
+    shape = (header['Entry_tot_nb_curve'], header['nb_point_approach'] + header['nb_point_retract'])
+    return np.memmap(
+        header['file_path'], dtype=getNANOSCFDCdtype(header), mode='r',
+        offset=header['data_offset'], shape=shape
+    )
 
-        tempapp[:] = unpack(f"<{str(nb_point_approach)}{fmt}", afmfile.read(FDC_bytes * nb_point_approach))
+def getNANOSCstartpos(app_defl_V):
+    """
+    Function used to find the first valid point of the approach segments.
+    The first points are skipped while they are more than 10 times bigger
+    than the following point.
 
-        tempret[:] = unpack(f"<{str(nb_point_retract)}{fmt}", afmfile.read(FDC_bytes * nb_point_retract))
+            Parameters:
+                    app_defl_V (np.array): Approach deflection of one curve (1D) or several curves (2D).
+            
+            Returns:
+                    start_pos (int or np.array): Position of the first valid point of each curve.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valid = ~(np.abs(app_defl_V[..., :-1] / app_defl_V[..., 1:]) > 10)
+    return np.argmax(valid, axis=-1)
 
-        if isPFC:
+def scaleNANOSCvolume(volume, header, dtype=None):
+    """
+    Function used to convert the raw data of several curves into volts.
+    The raw data is scaled directly into dtype, i.e: float32.
 
-            PFC_freq = header['PFC_freq'] * 1000 # KHZ --> Hz
-            PFC_amp = header['PFC_amp']
-            PFC_nb_samppoints = header['PFC_nb_samppoints']
-            QNM_sync_dist = header['QNM_sync_dist']
-            f_samples = nb_point_approach
+            Parameters:
+                    volume (np.array): Raw data of the curves (see loadNANOSCvolume).
+                    header (dict): Dictionary containing all NANOSCOPE file metadata.
+                    dtype (np.dtype): Dtype of the scaled data, if None float64 is used.
+            
+            Returns:
+                    app_defl_V (np.array): 2D array containing the approach deflection of each curve.
+                    ret_defl_V (np.array): 2D array containing the retract deflection of each curve.
+                    start_pos (np.array): Position of the first valid approach point of each curve.
+    """
+    nb_point_approach = header['nb_point_approach']
+    defl_V = np.multiply(volume, header['defl_sens_Vbybyte'], dtype=np.float64 if dtype is None else dtype)
+    app_defl_V, ret_defl_V = defl_V[:, :nb_point_approach], defl_V[:, nb_point_approach:]
+    return app_defl_V, ret_defl_V, getNANOSCstartpos(app_defl_V)
 
-            if f_samples != PFC_nb_samppoints:
-                pft_factor = PFC_nb_samppoints / (2 * f_samples)
-                QNM_sync_dist = QNM_sync_dist / pft_factor
+def loadNANOSCcurves(curve_indices, header, volume=None, dtype=None):
+    """
+    Function used to load the data of several force curves from a NANOSCOPE file.
 
-            curve_pft = np.zeros([2 * f_samples])
-            curve_pft = np.concatenate((tempapp[::-1], tempret))
-            max_force_index = np.argmax(curve_pft)
-            sd = QNM_sync_dist / (PFC_freq * 2 * nb_point_approach)
-            deltat = sd - 1 / (PFC_freq * 4)
-            curve_t = np.arange(2 * nb_point_approach) * ((0.5 / PFC_freq) / nb_point_approach)
-            curve_x = PFC_amp * np.sin(2 * np.pi * PFC_freq * (curve_t - deltat))
+    The rows of the curves are read from the volume at once, and their deflection
+    is scaled and their first valid point found for all the curves at once
+    (see scaleNANOSCvolume). Peak force curves are realigned one by one.
 
-            app_x = curve_x[:max_force_index]
-            tempapp = curve_pft[:max_force_index]
+            Parameters:
+                    curve_indices (list): Indices of the force curves.
+                    header (dict): Dictionary containing all NANOSCOPE file metadata.
+                    volume (np.memmap): Raw data of all the curves, if None the file is mapped (see loadNANOSCvolume).
+                    dtype (np.dtype): Dtype of the curves data, if None float64 is used (optional).
             
-            ret_x = curve_x[(max_force_index):(max_force_index + f_samples)]
-            tempret = curve_pft[(max_force_index):(max_force_index + f_samples)]
-
-        app_defl_V = defl_sens_Vbybyte * tempapp
-        ret_defl_V = defl_sens_Vbybyte * tempret
-
-        start_pos = 0
-        for i in range(len(app_defl_V)):
-            if np.abs(app_defl_V[i] / app_defl_V[i+1]) > 10:
-                continue
-            else:
-                start_pos = i
-                break
+            Returns:
+                    force_curves (list): List of ForceCurve objects, in the same order as curve_indices.
+    """
+    if volume is None:
+        volume = loadNANOSCvolume(header)
+    if header['peakforce']:
+        return [loadNANOSCcurve(idx, header, volume, dtype=dtype) for idx in curve_indices]
+    app_defl_V, ret_defl_V, start_pos = scaleNANOSCvolume(volume[np.asarray(curve_indices, dtype=int)], header, dtype)
+    return [
+        loadNANOSCcurve(idx, header, volume, (app_defl_V[row], ret_defl_V[row], start_pos[row]), dtype)
+        for row, idx in enumerate(curve_indices)
+    ]
+
+def loadNANOSCcurve(idx, header, volume=None, scaled_data=None, dtype=None):
+    """
+    Function used to load the data of a single force curve from a NANOSCOPE file.
+
+            Parameters:
+                    idx (int): Index of the force curve.
+                    header (dict): Dictionary containing all NANOSCOPE file metadata.
+                    volume (np.memmap): Raw data of all the curves, if None the file is mapped (see loadNANOSCvolume).
+                    scaled_data (tuple): Approach and retract deflection (V) and first valid point of the curve,
+                                         already computed by loadNANOSCcurves (optional).
+                    dtype (np.dtype): Dtype of the curve data, if None float64 is used (optional).
             
-        app_x = app_x[start_pos:]
-        app_defl_V = app_defl_V[start_pos:] - ret_defl_V[-1]
-        ret_defl_V = ret_defl_V - ret_defl_V[-1]
-
-        if not isPFC:
-            app_defl_V = app_defl_V[::-1]
-            ret_defl_V = ret_defl_V[::-1]
-            #for .spm files the retract arrays have be to be flipped.
-            ret_x = np.flip(ret_x)
-            ret_defl_V = np.flip(ret_defl_V)
-
-        # Assign data and metadata for Approach segment.
-        appsegment.segment_formated_data = {
-                'height': app_x * 1e-9, 
-                'vDeflection': app_defl_V,
-                'time': np.linspace(0, forward_duration, len(app_x), endpoint=False)
-            }
-        appsegment.nb_point = len(app_x)
-        appsegment.force_setpoint_mode = header['trigger_mode']
-        appsegment.nb_col = len(list(appsegment.segment_formated_data.keys()))
-        appsegment.force_setpoint = 0
-        appsegment.velocity = header['speed_forward_nmbys']
-        appsegment.sampling_rate = header['scan_rate_Hz']
-        appsegment.z_displacement = header['ramp_size_nm']
-
-        # Assing data and metadata for Retract segment.
-        retsegment.segment_formated_data = {
-            'height': ret_x * 1e-9,
-            'vDeflection': ret_defl_V,
-            'time': np.linspace(0, reverse_duration, len(ret_x), endpoint=False)
+            Returns:
+                    force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
+    """
+    if volume is None:
+        volume = loadNANOSCvolume(header)
+    # The raw data is scaled directly into dtype, i.e: float32.
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    
+    file_name = header['Entry_filename']
+    force_curve = ForceCurve(idx, file_name)
+    # Only simple curves with trace/retrace are supported
+    appsegment = Segment(file_name, '0', 'Approach')
+    retsegment = Segment(file_name, '1', 'Retract')
+    
+    # Get variables needed for loading data from header
+    isPFC = bool(header['peakforce'])
+    nb_point_approach = header['nb_point_approach']
+    nb_point_retract = header['nb_point_retract']
+    zstep_approach_nm = header['zstep_approach_nm']
+    zstep_retract_nm = header['zstep_retract_nm']
+    defl_sens_Vbybyte = header['defl_sens_Vbybyte']
+    
+    forward_duration = header['ramp_duration_forward']
+    reverse_duration = header['ramp_duration_reverse']
+
+    app_x =  np.arange(nb_point_approach, dtype=dtype) * dtype.type(zstep_approach_nm)
+    ret_x =  np.arange(nb_point_retract, dtype=dtype) * dtype.type(zstep_retract_nm)
+
+    # Zero-copy views of the raw data.
+    tempapp = volume[idx, :nb_point_approach]
+    tempret = volume[idx, nb_point_approach:]
+
+    if isPFC:
+
+        PFC_freq = header['PFC_freq'] * 1000 # KHZ --> Hz
+        PFC_amp = header['PFC_amp']
+        PFC_nb_samppoints = header['PFC_nb_samppoints']
+        QNM_sync_dist = header['QNM_sync_dist']
+        f_samples = nb_point_approach
+
+        if f_samples != PFC_nb_samppoints:
+            pft_factor = PFC_nb_samppoints / (2 * f_samples)
+            QNM_sync_dist = QNM_sync_dist / pft_factor
+
+        curve_pft = np.zeros([2 * f_samples])
+        curve_pft = np.concatenate((tempapp[::-1], tempret))
+        max_force_index = np.argmax(curve_pft)
+        sd = QNM_sync_dist / (PFC_freq * 2 * nb_point_approach)
+        deltat = sd - 1 / (PFC_freq * 4)
+        curve_t = np.arange(2 * nb_point_approach) * ((0.5 / PFC_freq) / nb_point_approach)
+        curve_x = (PFC_amp * np.sin(2 * np.pi * PFC_freq * (curve_t - deltat))).astype(dtype, copy=False)
+
+        app_x = curve_x[:max_force_index]
+        tempapp = curve_pft[:max_force_index]
+        
+        ret_x = curve_x[(max_force_index):(max_force_index + f_samples)]
+        tempret = curve_pft[(max_force_index):(max_force_index + f_samples)]
+
+    if scaled_data is not None and not isPFC:
+        app_defl_V, ret_defl_V, start_pos = scaled_data
+    else:
+        app_defl_V = np.multiply(tempapp, defl_sens_Vbybyte, dtype=dtype)
+        ret_defl_V = np.multiply(tempret, defl_sens_Vbybyte, dtype=dtype)
+
+        start_pos = getNANOSCstartpos(app_defl_V)
+
+    app_x = app_x[start_pos:]
+    app_defl_V = app_defl_V[start_pos:] - ret_defl_V[-1]
+    ret_defl_V = ret_defl_V - ret_defl_V[-1]
+
+    if not isPFC:
+        app_defl_V = app_defl_V[::-1]
+        ret_defl_V = ret_defl_V[::-1]
+        #for .spm files the retract arrays have be to be flipped.
+        ret_x = np.flip(ret_x)
+        ret_defl_V = np.flip(ret_defl_V)
+
+    # Assign data and metadata for Approach segment.
+    appsegment.segment_formated_data = {
+            'height': app_x * dtype.type(1e-9), 
+            'vDeflection': app_defl_V,
+            'time': get_time_axis(forward_duration, len(app_x), dtype)
         }
-        retsegment.nb_point = len(ret_x)
-        retsegment.force_setpoint_mode = header['FDC_data_length']
-        retsegment.nb_col = len(list(retsegment.segment_formated_data.keys()))
-        retsegment.force_setpoint = 0
-        retsegment.velocity = header['speed_reverse_nmbys']
-        retsegment.sampling_rate = header['scan_rate_Hz']
-        retsegment.z_displacement = header['ramp_size_nm']
-
-        force_curve.extend_segments.append(('0', appsegment))
-        force_curve.retract_segments.append(('1', retsegment))
-
-        #TODO check this for a nanoscope file 
-        force_curve.z_at_setpoint = appsegment.segment_formated_data['height'][-1]
-
-        return force_curve
+    appsegment.nb_point = len(app_x)
+    appsegment.force_setpoint_mode = header['trigger_mode']
+    appsegment.nb_col = len(list(appsegment.segment_formated_data.keys()))
+    appsegment.force_setpoint = 0
+    appsegment.velocity = header['speed_forward_nmbys']
+    appsegment.sampling_rate = header['scan_rate_Hz']
+    appsegment.z_displacement = header['ramp_size_nm']
+
+    # Assing data and metadata for Retract segment.
+    retsegment.segment_formated_data = {
+        'height': ret_x * dtype.type(1e-9),
+        'vDeflection': ret_defl_V,
+        'time': get_time_axis(reverse_duration, len(ret_x), dtype)
+    }
+    retsegment.nb_point = len(ret_x)
+    retsegment.force_setpoint_mode = header['FDC_data_length']
+    retsegment.nb_col = len(list(retsegment.segment_formated_data.keys()))
+    retsegment.force_setpoint = 0
+    retsegment.velocity = header['speed_reverse_nmbys']
+    retsegment.sampling_rate = header['scan_rate_Hz']
+    retsegment.z_displacement = header['ramp_size_nm']
+
+    force_curve.extend_segments.append(('0', appsegment))
+    force_curve.retract_segments.append(('1', retsegment))
+
+    #TODO check this for a nanoscope file 
+    force_curve.z_at_setpoint = appsegment.segment_formated_data['height'][-1]
+
+    return force_curve
@@ -1,37 +1,38 @@
 # File containing the function loadNANOSCimg,
 # used to load the piezo image from NANOSCOPE files.
 
-import itertools
-from struct import unpack
 import numpy as np
 
 def loadNANOSCimg(header):
     """
     Function used to load the piezo image from a NANOSCOPE file.
 
+    The image is read in a single pass, memory mapping the image data
+    and expressing the bytes to skip between pixels as a stride.
+
             Parameters:
                     header (dict): Dictionary containing the file metadata.
             
             Returns:
                     piezoimg (np.array): 2D array containing the piezo image.
     """
-    filepath = header['file_path']
-    with open(filepath, 'rb') as afmfile:
-        fvimgoffset = header['FV_ima_offset']
-        shape = [header['FV_nb_sampsline'], header['FV_nb_lines'], 1]
-        temppiezoimg = np.zeros(shape, np.float64)
-        skip = ((header['FV_nb_sampsline'] / header['FDC_nb_sampsline']) - 1) * 2
-        if fvimgoffset != 0:
-            afmfile.seek(fvimgoffset, 0)
-            image_bytes = header['FV_data_length'] // (header['FV_nb_sampsline'] * header['FV_nb_lines'])
-            if image_bytes == 2: fmt = '<h' # short int
-            elif image_bytes == 4: fmt = '<i' # int
-            mult = header['FV_Zsens'] * header['zscan_sens_nmbyV'] / (2. ** (header['byte_per_pixel'] * 8))
-
-            for i, j in itertools.product(range(header['FV_nb_lines']), range(header['FV_nb_sampsline'])):
-                data = unpack(fmt, afmfile.read(image_bytes))
-                temppiezoimg[i, j] = data[0] * mult
-                if skip!=0:
-                    afmfile.seek(skip, 1)
-
-        return temppiezoimg - temppiezoimg.min()
\ No newline at end of file
+    fvimgoffset = header['FV_ima_offset']
+    nb_lines, nb_sampsline = header['FV_nb_lines'], header['FV_nb_sampsline']
+    shape = (nb_lines, nb_sampsline, 1)
+    if fvimgoffset == 0:
+        return np.zeros(shape, np.float64)
+    skip = int(((nb_sampsline / header['FDC_nb_sampsline']) - 1) * 2)
+    image_bytes = header['FV_data_length'] // (nb_sampsline * nb_lines)
+    if image_bytes == 2: dtype = np.dtype('<i2') # short int
+    elif image_bytes == 4: dtype = np.dtype('<i4') # int
+    mult = header['FV_Zsens'] * header['zscan_sens_nmbyV'] / (2. ** (header['byte_per_pixel'] * 8))
+    nb_pixels = nb_lines * nb_sampsline
+    pixel_stride = image_bytes + skip
+    # Map only the bytes that are read, the skip after the last pixel may be past the end of the file.
+    image_buffer = np.memmap(
+        header['file_path'], dtype=np.uint8, mode='r', offset=fvimgoffset,
+        shape=((nb_pixels - 1) * pixel_stride + image_bytes,)
+    )
+    rawimg = np.ndarray((nb_pixels,), dtype=dtype, buffer=image_buffer, strides=(pixel_stride,))
+    temppiezoimg = np.multiply(rawimg, mult, dtype=np.float64).reshape(shape)
+    return temppiezoimg - temppiezoimg.min()
@@ -3,12 +3,19 @@
 # - getstring: Helper function to get string values from header lines.
 # - getfloat: Helper function to get float values from header lines.
 # - getint: Helper function to get int values from header lines.
+# - getbracketstring: Helper function to get the string between brackets from header lines.
 
 import os
 import re
 
 from ..constants import UFF_code, UFF_version
 
+# Precompiled patterns used to extract the values from the header lines.
+_float_pattern = re.compile(r'[-+]?\d*\.\d+|\d+')
+_number_pattern = re.compile(r'([0-9][.][0-9]+|[0-9]+)')
+_units_pattern = re.compile(r'([a-z\~]+)')
+_bracket_pattern = re.compile(r'\[(.*?)\]')
+
 def getstring(line):
     """
     Function used to get string values from NANOSCOPE header lines.
@@ -32,7 +39,7 @@ def getfloat(line, idx=0):
                     value (str): Extracted float value.
     """
     _, nf = line.strip('\r\n').split(': ', 1)
-    return float(re.findall(r'[-+]?\d*\.\d+|\d+', nf)[idx])
+    return float(_float_pattern.findall(nf)[idx])
 
 def getint(line):
     """
@@ -48,11 +55,158 @@ def getint(line):
 
 def getbracketstring(line):
     _, nf = line.strip('\r\n').split(': ', 1)
-    return re.findall(r'\[(.*?)\]', nf)[0]
+    return _bracket_pattern.findall(nf)[0]
+
+def _field(*names, getter=getfloat):
+    """
+    Function used to build the handler of a header line that sets one or more fields.
+
+            Parameters:
+                    names (str): Names of the header fields to set.
+                    getter (function): Function used to get the value from the line.
+            
+            Returns:
+                    handler (function): Function (header, line) setting the fields.
+    """
+    def handler(header, line):
+        value = getter(line)
+        for name in names:
+            header[name] = value
+    return handler
+
+def _zsens(header, line):
+    header['zscan_sens_nmbyV'] = getfloat(line)
+
+def _zscan(header, line):
+    # Zscan is only used if no Zsens line has been found before.
+    if 'zscan_sens_nmbyV' not in header:
+        header['zscan_sens_nmbyV'] = getfloat(line)
+
+def _operating_mode(header, line):
+    header['force_volume'] = 1 if getstring(line) in ('Force Volume', 'Image') else 0
+
+def _peakforce_capture(header, line):
+    header['peakforce'] = 1 if getstring(line) == 'Allow' else 0
+
+def _peakforce_amplitude(header, line):
+    header['PFC_amp'] = getfloat(line)
+    header['ramp_size_V'] = header['PFC_amp'] * 2
+
+def _force_samps_line(header, line):
+    _, nf = line.strip('\r\n').split(': ', 1)
+    nbptret, nbptapp = _number_pattern.findall(nf)
+    header['nb_point_approach'] = int(nbptapp)
+    header['nb_point_retract'] = int(nbptret)
+
+def _data_offset(header, line):
+    # Only the offset of the first force image is used.
+    if 'data_offset' not in header:
+        header['data_offset'] = getint(line)
+
+def _z_scale(header, line):
+    if '\\@4:Z scale: V [Sens. DeflSens]' in line:
+        header['z_scale_Vbybyte'] = getfloat(line)
+
+def _fv_scale(header, line):
+    if '\\@4:FV scale: V [Sens. ZsensSens]' in line:
+        header['z_scale_Vbybyte'] = getfloat(line, -1)
+
+def _ramp_size(header, line):
+    header['ramp_size_V'] = getfloat(line, -1)
+
+def _ramp_size_nopeakforce(header, line):
+    # In PeakForce files the ramp size is computed from the amplitude.
+    if not bool(header['peakforce']):
+        header['ramp_size_V'] = getfloat(line, -1)
+
+def _scan_size(header, line):
+    _, nf = line.strip('\r\n').split(': ', 1)
+    units = _units_pattern.findall(nf)[0]
+    x, y = _number_pattern.findall(nf)
+    if units == 'nm': mult = 1E-9
+    elif units == '~m': mult = 1E-6
+    header['FV_ima_scanX'] = float(x) * mult
+    header['FV_ima_scanY'] = float(y) * mult
+
+    header['scan_size_x'] = round(float(x) * mult,10)
+    header['scan_size_y'] = round(float(y) * mult,10)
+
+# Header lines starting a new list, and the list position they set.
+header_positions = {
+    '\\*Ciao scan list': 'ScanList',
+    '\\*Ciao force list': 'ForceList',
+    '\\*Ciao force image list': 'ForceÍmageList',
+    '\\*Ciao image list': 'ImageList'
+}
+
+# Handlers of the header lines found in any position, by key.
+global_handlers = {
+    '\\Version': _field('version', getter=getstring),
+    '\\@Sens. Zsens': _zsens,
+    '\\@Sens. Zscan': _zscan,
+    '\\Microscope': _field('instru', getter=getstring),
+    '\\Scanner file': _field('scanner', getter=getstring)
+}
+
+# Handlers of the header lines of each list position, by key.
+position_handlers = {
+    'ScanList': {
+        '\\Operating mode': _operating_mode,
+        '\\X Offset': _field('xoffset_nm'),
+        '\\Y Offset': _field('yoffset_nm'),
+        '\\@Sens. DeflSens': _field('defl_sens_nmbyV'),
+        '\\@Sens. Deflection': _field('defl_sens_nmbyV'),
+        '\\XY Closed Loop': _field('xy_closed_loop', getter=getstring),
+        '\\Z Closed Loop': _field('z_closed_loop', getter=getstring),
+        '\\PeakForce Capture': _peakforce_capture,
+        '\\Peak Force Amplitude': _peakforce_amplitude,
+        '\\PFT Freq': _field('PFC_freq'),
+        '\\Sample Points': _field('PFC_nb_samppoints', getter=getint),
+        '\\Sync Distance New': _field('NEW_sync_dist', getter=getint),
+        '\\Sync Distance QNM': _field('QNM_sync_dist', getter=getint),
+        '\\Samps/line': _field('piezo_nb_sampsline', getter=getint),
+        '\\@Sens. ZsensSens': _field('sens_z_sensor')
+    },
+    'ForceList': {
+        '\\Trigger mode': _field('trigger_mode', getter=getstring),
+        '\\force/line': _field('FDC_nb_sampsline', getter=getint),
+        '\\Scan rate': _field('scan_rate_Hz'),
+        '\\Forward vel.': _field('speed_forward_Vbys'),
+        '\\Reverse vel.': _field('speed_reverse_Vbys'),
+        '\\@4:Trig threshold Deflection': _field('defl_sens_Vbybyte'),
+        '\\@4:Trig Threshold Deflection': _field('defl_sens_Vbybyte'),
+        '\\Deflection Sensitivity Correction': _field('defl_sens_corr'),
+        '\\Samps/line': _force_samps_line
+    },
+    'ForceÍmageList': {
+        '\\Spring Constant': _field('spring_const_Nbym'),
+        '\\Spring constant': _field('spring_const_Nbym'),
+        '\\Data length': _field('FDC_data_length', getter=getint),
+        '\\Data offset': _data_offset,
+        '\\Bytes/pixel': _field('byte_per_pixel', getter=getint),
+        '\\@4:Z scale': _z_scale,
+        '\\@4:FV scale': _fv_scale,
+        '\\@4:Ramp size': _ramp_size,
+        '\\@4:Ramp Size': _ramp_size_nopeakforce
+    },
+    'ImageList': {
+        '\\Data length': _field('FV_data_length', getter=getint),
+        '\\Samps/line': _field('FV_nb_sampsline', 'num_x_pixels', getter=getint),
+        '\\Number of lines': _field('FV_nb_lines', 'num_y_pixels', getter=getint),
+        '\\Data offset': _field('FV_ima_offset', getter=getint),
+        '\\Scan Size': _scan_size,
+        '\\@2:Z scale': _field('FV_Zsens'),
+        '\\Bytes/pixel': _field('bytes_per_pxl', getter=getint)
+    }
+}
 
 def parseNANOSCheader(filepath):
     """
-    Function used to load the data of a single force curve from a JPK file.
+    Function used to load the metadata of a NANOSCOPE file.
+
+    The file is read line by line until the end of the header, so the
+    force curves and images data is never loaded. Each line is dispatched
+    by its key (the text before ': ') using the handlers tables.
 
             Parameters:
                     filepath (str): Path to the NANOSCOPE file.
@@ -61,9 +215,7 @@ def parseNANOSCheader(filepath):
                     header (dict): Dictionary containing the NANOSCOPE file metadata.
     """
     header = {}
-    position = None
-    data_offset_found_flag = False
-    zscan_sens_nmbyV_found_flag = False
+    handlers = {}
     header["file_path"] = filepath
     header["Entry_filename"] = os.path.basename(filepath)
     header["file_size_bytes"] = os.path.getsize(filepath)
@@ -72,152 +224,22 @@ def parseNANOSCheader(filepath):
     header['Entry_UFF_version'] = UFF_version
     
     with open(filepath, 'rb') as afmfile:
-        headerlines = afmfile.readlines()
-        for rawline in headerlines:
+        for rawline in afmfile:
             line = rawline.decode('latin_1')
+            key = line.rstrip('\r\n').split(': ', 1)[0]
 
             # End of header flag
-            if '\\*File list end' in line:
+            if key == '\\*File list end':
                 break
 
             # Header positions
-            elif '*Ciao scan list' in line:
-                position = 'ScanList'
-            elif '*Ciao force list' in line:
-                position = 'ForceList'
-            elif '*Ciao force image list' in line:
-                position = 'ForceÍmageList'
-            elif '*Ciao image list' in line:
-                position = 'ImageList'
-            elif '\\Version:' in line:
-                header['version'] = getstring(line)
-            elif '\\@Sens. Zsens:' in line or '\\@Sens. Zscan:' in line and not zscan_sens_nmbyV_found_flag:
-                header['zscan_sens_nmbyV'] = getfloat(line)
-                zscan_sens_nmbyV_found_flag = True
-            elif '\\Microscope:' in line:
-                header['instru'] = getstring(line)
-            elif '\\Scanner file:' in line:
-                header['scanner'] = getstring(line)
-            
-            # ScanList position fields
-            if position == 'ScanList':
-                if '\\Operating mode:' in line:
-                    if getstring(line) in ('Force Volume', 'Image'):
-                        header['force_volume'] = 1
-                    else:
-                        header['force_volume'] = 0
-                elif '\\X Offset:' in line:
-                    header['xoffset_nm'] = getfloat(line)
-                elif '\\Y Offset:' in line:
-                    header['yoffset_nm'] = getfloat(line)
-                elif '\\@Sens. DeflSens:' in line or '\\@Sens. Deflection:' in line:
-                    header['defl_sens_nmbyV'] = getfloat(line)
-                elif '\\XY Closed Loop:' in line:
-                    header['xy_closed_loop'] = getstring(line)
-                elif '\\Z Closed Loop:' in line:
-                    header['z_closed_loop'] = getstring(line)
-                elif '\\PeakForce Capture:' in line:
-                    if getstring(line) == 'Allow':
-                        header['peakforce'] = 1
-                    else:
-                        header['peakforce'] = 0
-                elif '\\Peak Force Amplitude:' in line:
-                    header['PFC_amp'] = getfloat(line)
-                    header['ramp_size_V'] = header['PFC_amp'] * 2
-                elif '\\PFT Freq:' in line:
-                    header['PFC_freq'] = getfloat(line)
-                elif '\\Sample Points:' in line:
-                    header['PFC_nb_samppoints'] = getint(line)
-                elif '\\Sync Distance New:' in line:
-                    header['NEW_sync_dist'] = getint(line)
-                elif '\\Sync Distance QNM:' in line:
-                    header['QNM_sync_dist'] = getint(line)
-                elif '\\Samps/line:' in line:
-                    header['piezo_nb_sampsline'] = getint(line)
-                elif '\\@Sens. ZsensSens:' in line:
-                    header['sens_z_sensor'] = getfloat(line)
-            
-            # ForceList position fields
-            elif position == 'ForceList':
-                if '\\Trigger mode:' in line:
-                    header['trigger_mode'] = getstring(line)
-                elif '\\force/line' in line:
-                    header['FDC_nb_sampsline'] = getint(line)
-                elif '\\Scan rate:' in line:
-                    header['scan_rate_Hz'] = getfloat(line)
-                elif '\\Forward vel.:' in line:
-                    header['speed_forward_Vbys'] = getfloat(line)
-                elif '\\Reverse vel.:' in line:
-                    header['speed_reverse_Vbys'] = getfloat(line)
-                elif '\\@4:Trig threshold Deflection:' in line or\
-                     '\\@4:Trig Threshold Deflection:' in line:
-                    header['defl_sens_Vbybyte'] = getfloat(line)
-                elif '\\Deflection Sensitivity Correction:' in line:
-                    header['defl_sens_corr'] = getfloat(line)
-                elif '\\Samps/line:' in line:
-                    _, nf = line.strip('\r\n').split(': ', 1)
-                    nbptret, nbptapp = re.findall(r'([0-9][.][0-9]+|[0-9]+)', nf)
-                    header['nb_point_approach'] = int(nbptapp)
-                    header['nb_point_retract'] = int(nbptret)
-            
-            #  ForceÍmageList position fields
-            elif position == 'ForceÍmageList':
-                if '\\Spring Constant:' in line or\
-                   '\\Spring constant:' in line:
-                   header['spring_const_Nbym'] = getfloat(line)
-                elif '\\Data length:' in line:
-                    header['FDC_data_length'] = getint(line)
-                elif '\\Data offset:' in line and not data_offset_found_flag:
-                    header['data_offset'] = getint(line)
-                    data_offset_found_flag = True
-                elif '\\Bytes/pixel:' in line:
-                    header['byte_per_pixel'] = getint(line)
-                elif '\\@4:Z scale: V [Sens. DeflSens]' in line:
-                    header['z_scale_Vbybyte'] = getfloat(line)
-                elif '\\@4:FV scale: V [Sens. ZsensSens]' in line:
-                    header['z_scale_Vbybyte'] = getfloat(line, -1)
-                elif '\\@4:Ramp size:' in line or\
-                     '\\@4:Ramp Size:' in line and\
-                     not bool(header['peakforce']):
-                     header['ramp_size_V'] = getfloat(line, -1)
-                elif "\\@4:Image Data" in line:
-                    channel = getbracketstring(line)
-                elif '\\@4:Z Display' in line or\
-                     '\\@4:Z display:' in line or\
-                     '\\@4:Ramp End:' in line:
-                     if channel == "ZSensor":
-                         pass
-                     if channel == "DeflectionError":
-                         pass
-            
-            # ImageList position fields
-            elif position == 'ImageList':
-                if '\\Data length' in line:
-                    header['FV_data_length'] = getint(line)
-                elif '\\Samps/line:' in line:
-                    header['FV_nb_sampsline'] = getint(line)
-                    header['num_x_pixels'] = getint(line)
-                elif '\\Number of lines:' in line:
-                    header['FV_nb_lines'] = getint(line)
-                    header['num_y_pixels'] = getint(line)
-                elif '\\Data offset:' in line:
-                    header['FV_ima_offset'] = getint(line)
-                elif '\\Scan Size:' in line:
-                    _, nf = line.strip('\r\n').split(': ', 1)
-                    units = re.findall(r'([a-z\~]+)', nf)[0]
-                    x, y = re.findall(r'([0-9][.][0-9]+|[0-9]+)', nf)
-                    if units == 'nm': mult = 1E-9
-                    elif units == '~m': mult = 1E-6
-                    header['FV_ima_scanX'] = float(x) * mult
-                    header['FV_ima_scanY'] = float(y) * mult
-
-                    header['scan_size_x'] = round(float(x) * mult,10)
-                    header['scan_size_y'] = round(float(y) * mult,10)
-                    
-                elif '\\@2:Z scale:' in line:
-                    header['FV_Zsens'] = getfloat(line)
-                elif '\\Bytes/pixel' in line:
-                    header['bytes_per_pxl'] = getint(line)
+            if key in header_positions:
+                handlers = position_handlers[header_positions[key]]
+                continue
+
+            handler = global_handlers.get(key) or handlers.get(key)
+            if handler is not None:
+                handler(header, line)
         
         # Compute parameters not stored in header
         if header['force_volume'] == 1:
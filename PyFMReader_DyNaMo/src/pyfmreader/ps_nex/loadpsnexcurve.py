@@ -6,58 +6,96 @@ Created on Thu Apr  4 18:07:32 2024
 @author: yogehs
 """
 # File containing the loadPSNEXcurve function,
-# used to load single force curves from JPK files.
+# used to load single force curves from PSNEX files.
 
-from struct import unpack
-from itertools import groupby
 import numpy as np
 from nptdms import TdmsFile
 
 from ..utils.forcecurve import ForceCurve
-from ..utils.segment import Segment
+from ..utils.segment import Segment, get_time_axis
 
  
 #from pyfmreader.utils.forcecurve import ForceCurve
 #from pyfmreader.utils.segment import Segment
 
-def loadPSNEXcurve(file_metadata,curve_index = 0):
+def getPSNEXsegmentoffsets(file_metadata):
+    """
+    Function used to compute the position of each segment in the PSNEX data channels.
+    The curves are stored one after the other and their segments are consecutive.
+
+            Parameters:
+                    file_metadata (dict): Dictionary containing the file metadata.
+            
+            Returns:
+                    segment_offsets (dict): Dictionary relating each curve id to the list of
+                                            positions where its segments start and end.
+    """
+    curve_properties = file_metadata['curve_properties']
+    num_segment = file_metadata['num_segments']
+    segment_offsets = {}
+    curve_start = 0
+    for curve_id in sorted(curve_properties, key=int):
+        seg_nb_points = [
+            curve_properties[curve_id][i][f"segment_{i}_nb_points_cal"] for i in range(num_segment)
+        ]
+        seg_pos_array = curve_start + np.cumsum([0] + seg_nb_points)
+        segment_offsets[curve_id] = seg_pos_array.tolist()
+        curve_start = seg_pos_array[-1]
+    return segment_offsets
+
+def openPSNEXfile(file_metadata):
+    """
+    Function used to open a PSNEX file to read the curves data,
+    only the metadata is read when the file is opened.
+
+            Parameters:
+                    file_metadata (dict): Dictionary containing the file metadata.
+            
+            Returns:
+                    tdms_file (TdmsFile): Opened TDMS file.
+    """
+    return TdmsFile.open(file_metadata['file_path'])
+
+def loadPSNEXcurve(file_metadata, curve_index=0, tdms_file=None, dtype=None):
     """
     Function used to load the data of a single force curve from a PSNEX file.
 
+    Only the range of each segment is read from the data channels.
+
             Parameters:
                     file_metadata (dict): Dictionary containing the file metadata.
 
                     curve_index (int): Index of curve to load.
+
+                    tdms_file (TdmsFile): TDMS file opened with TdmsFile.open, if None the file
+                                          is opened and closed once the curve is read.
+
+                    dtype (np.dtype): Dtype of the curve data, if None the dtype of the file is kept.
             
             Returns:
                     force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the loaded data.
     """
+    if tdms_file is None:
+        with TdmsFile.open(file_metadata['file_path']) as tdms_file:  # alternative TdmsFile.read(path1+fname[ibead])
+            return loadPSNEXcurve(file_metadata, curve_index, tdms_file, dtype)
     file_id = file_metadata['Entry_filename']
     curve_properties = file_metadata['curve_properties']
     height_channel_key = file_metadata['height_channel_key']
     deflection_chanel_key = file_metadata['deflection_chanel_key']
-    tdms_file_ps_nex_file = TdmsFile.open(file_metadata['file_path'])  # alternative TdmsFile.read(path1+fname[ibead])
     tick_time_s = file_metadata['instrument_tick_time_(s)']
     force_curve = ForceCurve(curve_index, file_id)
 
-    curve_indices = file_metadata["Entry_tot_nb_curve"] 
     num_segment = file_metadata['num_segments']
-    index = 1 if curve_indices == 0 else 3
     
-    tdms_groups = tdms_file_ps_nex_file.groups()  ;    tdms_psnex_fc = tdms_groups[0]
+    tdms_groups = tdms_file.groups()  ;    tdms_psnex_fc = tdms_groups[0]
  
-    deflection = tdms_psnex_fc[deflection_chanel_key][:]
-    height = tdms_psnex_fc[height_channel_key][:]
-
-    seg_pos_array =[0]
+    deflection = tdms_psnex_fc[deflection_chanel_key]
+    height = tdms_psnex_fc[height_channel_key]
 
-    for i in range(num_segment):
-        temp_seg_dict = curve_properties[str(curve_index)][i]
-        seg_i_pt_cal = temp_seg_dict[f"segment_{i}_nb_points_cal"]
-        temp_pt = sum(seg_pos_array)+seg_i_pt_cal
-        seg_pos_array.append(temp_pt)
-
-        
+    segment_offsets = file_metadata.get('segment_offsets')
+    if segment_offsets is None:
+        segment_offsets = getPSNEXsegmentoffsets(file_metadata)
+    seg_pos_array = segment_offsets[str(curve_index)]
 
     for segment_id in range(num_segment):
         start_pos,end_pos = seg_pos_array[segment_id],seg_pos_array[segment_id+1]
@@ -69,9 +107,14 @@ def loadPSNEXcurve(file_metadata,curve_index = 0):
         segment_num_points = curve_properties[str(curve_index)][segment_id][f"segment_{segment_id}_nb_points_cal"]
 
         # TO DO: Time can be exported, handle this situation.
-        segment_formated_data["time"] = np.linspace(0, segment_duration, segment_num_points, endpoint=False)
+        segment_formated_data["time"] = get_time_axis(segment_duration, segment_num_points, dtype)
+        # Partial reads, only the data of the segment is read from the file.
         segment_formated_data[height_channel_key] = height[start_pos:end_pos]
         segment_formated_data['vDeflection'] = deflection[start_pos:end_pos]
+        if dtype is not None:
+            # Only the segment data is cast.
+            for channel in (height_channel_key, 'vDeflection'):
+                segment_formated_data[channel] = segment_formated_data[channel].astype(dtype, copy=False)
 
 
         segment = Segment(file_id, segment_id, segment_type)
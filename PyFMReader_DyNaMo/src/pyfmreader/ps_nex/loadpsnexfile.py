@@ -5,20 +5,32 @@ Created on Thu Apr  4 18:07:01 2024
 
 @author: yogehs
 """
+from nptdms import TdmsFile
+
 from .parsepsnexheader import parsePSNEXheader, parsePSNEXsegmentheader
+from .loadpsnexcurve import getPSNEXsegmentoffsets
 
-def loadPSNEXfile(filepath, UFF):
+def loadPSNEXfile(filepath, UFF, tdms_file=None):
     """
     Function used to load the metadata of a PS_nex file.
 
+    The TDMS metadata is read only once and shared by the file and segment
+    headers. The curves data is read from the file opened by the UFF reader
+    session (see uff.UFF.open).
+
             Parameters:
                     filepath (str): Path to the PS_nex file.
                     UFF (uff.UFF): UFF object to load the metadata into.
+                    tdms_file (TdmsFile): TDMS file opened with TdmsFile.open, if None the file
+                                          is opened and closed once the metadata is read.
             
             Returns:
                     UFF (uff.UFF): UFF object containing the loaded metadata.
     """
-    UFF.filemetadata = parsePSNEXheader(filepath)
+    if tdms_file is None:
+        with TdmsFile.open(filepath) as tdms_file:
+            return loadPSNEXfile(filepath, UFF, tdms_file)
+    UFF.filemetadata = parsePSNEXheader(filepath, tdms_file)
     #UFF.isFV = UFF.filemetadata["mapping_bool"]
     #key for the channel of ht and defleciton
 
@@ -41,13 +53,37 @@ def loadPSNEXfile(filepath, UFF):
         if not curve_id in curve_properties.keys():
             curve_properties.update({curve_id:{}})
 
-        curve_properties = parsePSNEXsegmentheader(filepath,curve_properties, segment_id,curve_id )
+        curve_properties = parsePSNEXsegmentheader(filepath,curve_properties, segment_id,curve_id, tdms_file)
 
     UFF.filemetadata['curve_properties'] = curve_properties
+    UFF.filemetadata['segment_offsets'] = getPSNEXsegmentoffsets(UFF.filemetadata)
     UFF.filemetadata['isFV'] = False
     UFF.filemetadata['file_type'] = 'PSNEX.tdms'
 
     return UFF
 
 
-    
\ No newline at end of file
+    
+
+def loadTDMSfile(filepath, UFF):
+    """
+    Function used to load a TDMS file. Only the files saved by PS_nex
+    devices are supported.
+
+    The metadata is read only once, when the file is opened, and the
+    file is closed once the PS_nex reader has read the metadata.
+
+            Parameters:
+                    filepath (str): Path to the TDMS file.
+                    UFF (uff.UFF): UFF object to load the metadata into.
+            
+            Returns:
+                    UFF (uff.UFF): UFF object containing the loaded metadata, None if it is not a PS_nex file.
+    """
+    with TdmsFile.open(filepath) as tdms_file:
+        if 'PSnex' in tdms_file['Force Curve'].properties.get("instrument"):
+            print("PSnex is the best")
+
+            return loadPSNEXfile(filepath, UFF, tdms_file)
+        else:
+            print('here you can you use any tdms file reading ')
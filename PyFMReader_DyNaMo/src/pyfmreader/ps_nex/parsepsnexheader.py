@@ -15,17 +15,18 @@ from ..constants import *
 #from .constants import *
 from nptdms import TdmsFile #from nptdms import tdms  # pip install nptdms
 
-def parsePSNEXheader(filepath):
+def parsePSNEXheader(filepath, tdms_file=None):
     """
     Function used to load the metadata of a PSNEX file.
 
             Parameters:
                     filepath (str): UFF object containing the PSNEX file metadata.
+                    tdms_file (TdmsFile): TDMS file with the metadata already read, if None the metadata is read.
             Returns:
                     file_metadata (dict): Dictionary containing all the file metadata
     """
 
-    tdms_file_ps_nex = TdmsFile.read_metadata(filepath)  
+    tdms_file_ps_nex = tdms_file if tdms_file is not None else TdmsFile.read_metadata(filepath)
 
     for group in tdms_file_ps_nex.groups():
         ps_nex_meta = (group.properties)
@@ -121,20 +122,21 @@ def parsePSNEXheader(filepath):
     file_metadata["cantilever_quality_factor"] = float(ps_nex_meta.get("cantilever_quality_factor"))
     return file_metadata
 
-def parsePSNEXsegmentheader(filepath,curve_properties,segment_id,curve_index=0):
+def parsePSNEXsegmentheader(filepath,curve_properties,segment_id,curve_index=0,tdms_file=None):
     """
-    Function used to load the metadata of each segment for each force curve of a JPK file.
+    Function used to load the metadata of each segment for each force curve of a PSNEX file.
 
             Parameters:
                     curve_properties (dict): Dictionary containing all the metadata for each force curve in the file.
                     curve_index (int): Dictionary containing metadata from header.properties
                     file_path (str): File extension of psnex file.
                     segment_id (str): Position of the segment in the force curve.
+                    tdms_file (TdmsFile): TDMS file with the metadata already read, if None the metadata is read.
             
             Returns:
                     segment metadata (dict): Dictionary containing all the metadata for each force curve in the file.
     """
-    tdms_file_ps_nex = TdmsFile.read_metadata(filepath)  
+    tdms_file_ps_nex = tdms_file if tdms_file is not None else TdmsFile.read_metadata(filepath)
 
     for group in tdms_file_ps_nex.groups():
         ps_nex_meta = (group.properties)
@@ -4,16 +4,12 @@
 
 import os
 from .constants import *
-from .jpk.loadjpkfile import loadJPKfile
-from .jpk.loadjpkthermalfile import loadJPKThermalFile
-from .nanosc.loadnanoscfile import loadNANOSCfile
-from .ps_nex.loadpsnexfile import loadPSNEXfile
-from .ardf.loadARDFfile import loadARDFfile
-from .ardf.loadibwfile import loadIBWfile
-from .load_uff import loadUFFtxt
+from .backends import getbackend
+from .load_uff import loadUFFtxt, loadUFFZfile
 from .uff import UFF
-from nptdms import TdmsFile
-def loadfile(filepath):
+from .uffcache import loadUFFcache, saveUFFcache
+
+def loadfile(filepath, cache=None, dtype=None):
     """
     Load AFM file. 
     
@@ -22,12 +18,24 @@ def loadfile(filepath):
         - JPK Thermal --> .tnd
         - NANOSCOPE --> .spm, .pfc, .00X
         - UFF --> .uff
+        - Binary UFF --> .uffz
         - PS-NEX --> .tdms
         - IBW --> .ibw (Asylum files)
         - ARDF --> .ARDF (Asylum force maps)
 
+    If cache is enabled, the first time a file is loaded all its curves are
+    converted into a binary UFF container (see uffcache). The next times, if the
+    path, size and modification time of the file did not change, the file is
+    loaded from the container and the curves are read from its memory maps.
+
+    If dtype is given, i.e: np.float32, the curves and the piezo image are loaded with
+    that dtype (see uff.UFF.dtype). Cached files store the data with dtype too.
+
             Parameters:
                     filepath (str): Path to the file.
+                    cache (bool or str): If True, cache the file next to it, if it is a path
+                                         cache the file in that directory (optional).
+                    dtype (np.dtype): Dtype of the loaded curves and piezo image data (optional).
             
             Returns:
                     If JPK, NANOSCOPE OR UFF:
@@ -39,6 +47,34 @@ def loadfile(filepath):
                         Parameters (dict)
 
 
+    """
+    if not cache:
+        return _loadfile(filepath, dtype)
+    uffobj = loadUFFcache(filepath, cache, _newUFF(dtype))
+    if uffobj is not None:
+        return uffobj
+    afmfile = _loadfile(filepath, dtype)
+    if not isinstance(afmfile, UFF) or afmfile._uffzdata is not None or afmfile.filemetadata['file_type'] in ufffiles:
+        # Only the vendor AFM files containing curves are cached.
+        return afmfile
+    cachepath = saveUFFcache(filepath, cache, afmfile)
+    if cachepath is None:
+        return afmfile
+    return loadUFFcache(filepath, cache, _newUFF(dtype))
+
+def _newUFF(dtype=None):
+    """
+    Hidden function used to create an empty UFF object loading its data with dtype.
+    """
+    uffobj = UFF()
+    uffobj.dtype = dtype
+    return uffobj
+
+def _loadfile(filepath, dtype=None):
+    """
+    Hidden function used to load an AFM file without cache, see loadfile.
+
+    The format backends are imported the first time a file of that format is loaded (see backends).
     """
     split_path = filepath.split(os.extsep)
     # Depending on the configuration of the OS, JPK files have the following
@@ -46,36 +82,32 @@ def loadfile(filepath):
     if split_path[-1] == 'zip': filesuffix = split_path[-2]
     else: filesuffix = split_path[-1]
 
-    uffobj = UFF()
+    uffobj = _newUFF(dtype)
 
     if filesuffix[1:].isdigit() or filesuffix in nanoscfiles:
-        return loadNANOSCfile(filepath, uffobj)
+        return getbackend('loadNANOSCfile')(filepath, uffobj)
 
     elif filesuffix in jpkfiles:
-        return loadJPKfile(filepath, uffobj, filesuffix)
+        return getbackend('loadJPKfile')(filepath, uffobj, filesuffix)
     
     elif filesuffix in ufffiles:
         return loadUFFtxt(filepath, uffobj)
     
+    elif filesuffix in uffzfiles:
+        return loadUFFZfile(filepath, uffobj)
+    
     elif filesuffix in jpkthermalfiles:
-        return loadJPKThermalFile(filepath)
+        return getbackend('loadJPKThermalFile')(filepath)
     
     elif filesuffix in psnexfiles:
-
-        tdms_file = TdmsFile.read_metadata(filepath)
-        if 'PSnex' in tdms_file['Force Curve'].properties.get("instrument"):
-            print("PSnex is the best")
-
-            return loadPSNEXfile(filepath, uffobj)
-        else:
-            print('here you can you use any tdms file reading ')
+        return getbackend('loadTDMSfile')(filepath, uffobj)
     
     elif filesuffix in ibwfiles:
-        return loadIBWfile(filepath, uffobj)
+        return getbackend('loadIBWfile')(filepath, uffobj)
     
     elif filesuffix in ARDFfiles:
         print("is the best of the best")
-        return loadARDFfile(filepath, uffobj)
+        return getbackend('loadARDFfile')(filepath, uffobj)
     
     else:
         Exception(f"Can not load file: {filepath}")
\ No newline at end of file
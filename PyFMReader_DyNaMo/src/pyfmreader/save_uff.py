@@ -1,4 +1,15 @@
 import os
+import json
+import pathlib
+import zipfile
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from .constants import UFF_code, UFFZ_version
+from .load_uff import uffz_curve_dtype, uffz_segment_dtype, uffz_tag
 
 def saveUFFtxt(savefile, UFF, savedir, curveidx=0):
     """
@@ -94,19 +105,244 @@ def writeUFFsegment(f, FDC):
         f.write("HE Recording_segment_%d_nb:        %d \n" % (int(segid), int(segid)))
         f.write("HE Recording_segment_%d_nb_point:  %d \n" % (int(segid), segment.nb_point))
         f.write("HE Recording_segment_%d_nb_col:    %d \n" % (int(segid), segment.nb_col))
+        col_titles = list(segment.segment_formated_data.keys())
         for colidx in range(segment.nb_col):
-            f.write("HE Recording_segment_%d_col_%d_title: %s \n" % (int(segid), colidx, list(segment.segment_formated_data.keys())[colidx]))
-            f.write("HE Recording_segment_%d_col_%d_unit:  %s \n" % (int(segid), colidx, list(segment.segment_formated_data.keys())[colidx]))
+            f.write("HE Recording_segment_%d_col_%d_title: %s \n" % (int(segid), colidx, col_titles[colidx]))
+            f.write("HE Recording_segment_%d_col_%d_unit:  %s \n" % (int(segid), colidx, col_titles[colidx]))
         f.write("HE Recording_segment_%d_sampling_rate(Hz): %E \n" % (int(segid), segment.sampling_rate))
         f.write("HE Recording_segment_%d_velocity(m/s): %E \n" % (int(segid), segment.velocity))
         f.write("HE Recording_segment_%d_force_setpoint(N): %E \n" % (int(segid), segment.force_setpoint))
         f.write("HE Recording_segment_%d_z_displacement(m): %E \n" % (int(segid), segment.z_displacement))
-        # Write segment data
-        for j in range(segment.nb_point):
-            ndat = "%s %5d " % (segment.segment_code, int(segid))
-            for k in range(segment.nb_col):
-                ndat = ndat + "%15E " % (list(segment.segment_formated_data.values())[k][j])
-            f.write(ndat + "\n")
-
-def saveUFFhdf5():
-    pass
\ No newline at end of file
+        # Write segment data, the whole block is formatted at once.
+        # Each row: segment code, segment id and the value of each column.
+        segdata = np.column_stack([
+            np.asarray(values)[:segment.nb_point] for values in segment.segment_formated_data.values()
+        ][:segment.nb_col])
+        rowfmt = ("%s %5d " % (segment.segment_code, int(segid))).replace('%', '%%') + "%15E " * segment.nb_col + "\n"
+        f.write((rowfmt * len(segdata)) % tuple(segdata.ravel().tolist()))
+
+def _initUFFworker(UFF):
+    """
+    Hidden function used to keep a copy of the UFF object in each
+    process of the pool used by saveUFFtxtmap.
+    """
+    global _worker_uff
+    _worker_uff = UFF
+
+def _saveUFFtxtworker(savedir, curveidx):
+    """
+    Hidden function used to save a single force curve from a process of the pool.
+    """
+    saveUFFtxt(None, _worker_uff, savedir, curveidx)
+    return curveidx
+
+def saveUFFtxtmap(UFF, savedir, curveidxs=None, max_workers=None):
+    """
+    Save every force curve of a Force Volume file into individual txt UFF files,
+    using a pool of processes.
+
+    The UFF object is sent only once to each process of the pool.
+
+            Parameters:
+                    UFF (uff.UFF): UFF object containing the data to save.
+                    savedir (str): Path to the folder to save the txt UFF files.
+                    curveidxs (list): Indices of the force curves to save, if None all the curves are saved.
+                    max_workers (int): Maximum number of processes used to save the curves (optional).
+            
+            Returns: None
+    """
+    if curveidxs is None:
+        curveidxs = range(UFF.filemetadata['Entry_tot_nb_curve'])
+    with ProcessPoolExecutor(max_workers, initializer=_initUFFworker, initargs=(UFF,)) as executor:
+        for _ in executor.map(partial(_saveUFFtxtworker, savedir), curveidxs, chunksize=16):
+            pass
+
+def getUFFZjsonfields(filemetadata):
+    """
+    Get the metadata fields that can be stored in the header of a binary UFF container.
+
+    The values are encoded with toUFFZjson, so they are restored with the same
+    types when the container is loaded. Lazy mappings (i.e: JPK curve properties)
+    are stored as dictionaries. The fields that can not be encoded are skipped.
+
+            Parameters:
+                    filemetadata (dict): Dictionary containing the file metadata.
+            
+            Returns:
+                    fields (dict): Dictionary containing the encoded metadata.
+                    skipped_fields (list): Keys of the fields that could not be encoded.
+    """
+    fields, skipped_fields = {}, []
+    for key, value in filemetadata.items():
+        try:
+            fields[key] = toUFFZjson(value)
+        except (TypeError, ValueError):
+            skipped_fields.append(key)
+    return fields, skipped_fields
+
+def toUFFZjson(value):
+    """
+    Encode a metadata value into JSON serializable objects, keeping the types
+    that JSON does not have as tagged objects (see load_uff.fromUFFZjson):
+    tuples, dictionaries with non string keys, numpy scalars and arrays and paths.
+
+            Parameters:
+                    value (object): Metadata value.
+            
+            Returns:
+                    encoded (object): JSON serializable value.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)) and not isinstance(value, np.generic):
+        return value
+    if isinstance(value, Mapping):
+        if all(isinstance(key, str) for key in value) and uffz_tag not in value:
+            return {key: toUFFZjson(item) for key, item in value.items()}
+        return {uffz_tag: 'dict', 'items': [[toUFFZjson(key), toUFFZjson(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [toUFFZjson(item) for item in value]
+    if isinstance(value, tuple):
+        return {uffz_tag: 'tuple', 'items': [toUFFZjson(item) for item in value]}
+    if isinstance(value, np.generic):
+        return {uffz_tag: 'scalar', 'dtype': value.dtype.str, 'value': toUFFZjson(value.item())}
+    if isinstance(value, np.ndarray) and value.dtype.kind in 'biufcUS':
+        return {uffz_tag: 'ndarray', 'dtype': value.dtype.str, 'shape': list(value.shape), 'items': toUFFZjson(value.tolist())}
+    if isinstance(value, pathlib.PurePath):
+        return {uffz_tag: 'path', 'value': str(value)}
+    if isinstance(value, complex):
+        return {uffz_tag: 'complex', 'value': [value.real, value.imag]}
+    if isinstance(value, bytes):
+        return {uffz_tag: 'bytes', 'value': value.hex()}
+    raise TypeError(f"Object of type {type(value).__name__} can not be stored in a binary UFF container")
+
+def _tofloat(value):
+    """
+    Hidden function used to store missing segment properties as NaN.
+    """
+    return np.nan if value is None else float(value)
+
+def _writeUFFZarray(zfile, name, array):
+    """
+    Hidden function used to write an array as an npy member of the binary UFF container.
+    """
+    with zfile.open(name, 'w', force_zip64=True) as member:
+        np.lib.format.write_array(member, np.ascontiguousarray(array))
+
+def saveUFFZ(UFF, savefile, chunk_size=256, max_workers=None, cache_key=None, strict=False):
+    """
+    Save data and metadata into a binary UFF container (.uffz).
+
+    The container is an uncompressed zip archive of npy files, so every
+    array can be memory-mapped when the file is loaded (see load_uff.UFFZData):
+
+        header.json --> UFF header fields, channel names and segment types.
+        curves.npy --> One row per curve (see uffz_curve_dtype).
+        segments.npy --> One row per segment (see uffz_segment_dtype), group is the ForceCurve
+                         list of the segment: extend, retract, pause or modulation.
+        segment_metadata.json --> Metadata of each segment, in the order of segments.npy.
+        offsets.npy, lengths.npy --> Position of each segment channel in its chunk, -1 if missing.
+        data/{chunk}/{channel}.npy --> Flat array containing a channel of every segment in the chunk.
+        piezoimg.npy, images/{image}.npy --> Piezo image and additional image data (optional).
+
+    The curves are loaded and written in chunks of chunk_size curves,
+    so the whole map is never kept in memory.
+
+    The metadata is encoded with toUFFZjson. The keys of the metadata that
+    can not be encoded are listed in the skipped_fields of the header, or if
+    strict is True a ValueError is raised.
+
+            Parameters:
+                    UFF (uff.UFF): UFF object containing the data to save.
+                    savefile (str): Path to the save file.
+                    chunk_size (int): Number of curves stored in each data chunk.
+                    max_workers (int): Maximum number of threads used to load the curves (see uff.UFF.getcurves).
+                    cache_key (list): Key of the original file, used when the container is a cache (see uffcache).
+                    strict (bool): If True, raise a ValueError if some metadata can not be stored.
+            
+            Returns: None
+    """
+    filemetadata = UFF.filemetadata
+    if UFF.isFV:
+        curveidxs = list(range(filemetadata['Entry_tot_nb_curve']))
+    else:
+        curveidxs = [0]
+    channels, segment_types, setpoint_modes = [], [], []
+    curves, segments, offsets, lengths, segment_metadata = [], [], [], [], []
+    skipped_fields = set()
+    with zipfile.ZipFile(savefile, 'w', zipfile.ZIP_STORED, allowZip64=True) as zfile:
+        for chunk, start in enumerate(range(0, len(curveidxs), chunk_size)):
+            chunkdata, chunkcursor = {}, {}
+            chunkidxs = curveidxs[start:start + chunk_size]
+            for curveidx, FDC in zip(chunkidxs, UFF.getcurves(chunkidxs, max_workers)):
+                fdc_segments = FDC.get_segments()
+                groups = {
+                    id(segment): group for group, group_segments in enumerate(
+                        (FDC.extend_segments, FDC.retract_segments, FDC.pause_segments, FDC.modulation_segments)
+                    ) for _, segment in group_segments
+                }
+                curves.append((curveidx, FDC.curve_index, len(segments), len(fdc_segments), FDC.z_at_setpoint))
+                for segid, segment in fdc_segments:
+                    if segment.segment_type not in segment_types:
+                        segment_types.append(segment.segment_type)
+                    if segment.force_setpoint_mode not in setpoint_modes:
+                        setpoint_modes.append(segment.force_setpoint_mode)
+                    try:
+                        segment_metadata.append(toUFFZjson(segment.segment_metadata))
+                    except (TypeError, ValueError):
+                        segment_metadata.append(None)
+                        skipped_fields.add('segment_metadata')
+                    segments.append((
+                        curveidx, int(segid), segment_types.index(segment.segment_type), groups[id(segment)], chunk,
+                        -1 if segment.nb_point is None else segment.nb_point, setpoint_modes.index(segment.force_setpoint_mode),
+                        _tofloat(segment.force_setpoint), _tofloat(segment.velocity),
+                        _tofloat(segment.sampling_rate), _tofloat(segment.z_displacement),
+                        isinstance(segid, str), isinstance(segment.segment_id, str)
+                    ))
+                    segment_offsets, segment_lengths = {}, {}
+                    for channel, values in segment.segment_formated_data.items():
+                        if channel not in channels:
+                            channels.append(channel)
+                        values = np.asarray(values).ravel()
+                        segment_offsets[channel] = chunkcursor.get(channel, 0)
+                        segment_lengths[channel] = len(values)
+                        chunkcursor[channel] = segment_offsets[channel] + len(values)
+                        chunkdata.setdefault(channel, []).append(values)
+                    offsets.append(segment_offsets)
+                    lengths.append(segment_lengths)
+            for channel, channel_data in chunkdata.items():
+                _writeUFFZarray(zfile, f'data/{chunk}/{channels.index(channel)}.npy', np.concatenate(channel_data))
+        _writeUFFZarray(zfile, 'curves.npy', np.array(curves, dtype=uffz_curve_dtype))
+        _writeUFFZarray(zfile, 'segments.npy', np.array(segments, dtype=uffz_segment_dtype))
+        _writeUFFZarray(zfile, 'offsets.npy', np.array(
+            [[row.get(channel, -1) for channel in channels] for row in offsets], dtype=np.int64
+        ).reshape(len(offsets), len(channels)))
+        _writeUFFZarray(zfile, 'lengths.npy', np.array(
+            [[row.get(channel, -1) for channel in channels] for row in lengths], dtype=np.int64
+        ).reshape(len(lengths), len(channels)))
+        images = []
+        if UFF.isFV:
+            piezoimg = UFF.piezoimg if UFF.piezoimg is not None else UFF.getpiezoimg()
+            if piezoimg is not None:
+                _writeUFFZarray(zfile, 'piezoimg.npy', piezoimg)
+        if isinstance(UFF.imagedata, Mapping):
+            for image_name, image in UFF.imagedata.items():
+                _writeUFFZarray(zfile, f'images/{len(images)}.npy', image)
+                images.append(image_name)
+        zfile.writestr('segment_metadata.json', json.dumps(segment_metadata))
+        fields, skipped_filemetadata = getUFFZjsonfields(filemetadata)
+        skipped_fields.update(skipped_filemetadata)
+        if strict and skipped_fields:
+            raise ValueError(f"Metadata fields can not be stored in {savefile}: {sorted(skipped_fields)}")
+        header = {
+            'UFF_code': filemetadata.get('UFF_code', UFF_code),
+            'UFFZ_version': UFFZ_version,
+            'isFV': bool(UFF.isFV),
+            'channels': channels,
+            'segment_types': segment_types,
+            'force_setpoint_modes': setpoint_modes,
+            'images': images,
+            'filemetadata': fields,
+            'skipped_fields': sorted(skipped_fields)
+        }
+        if cache_key is not None:
+            header['cache_key'] = cache_key
+        zfile.writestr('header.json', json.dumps(header, indent=1))
\ No newline at end of file
@@ -1,19 +1,14 @@
 # File containing the UFF class.
 # Used to store data and metadata.
 
-from zipfile import ZipFile
+import threading
+import numpy as np
 
 from .constants import *
-from .jpk.loadjpkcurve import loadJPKcurve
-from .jpk.loadjpkimg import computeJPKPiezoImg
-from .nanosc.loadnanosccurve import loadNANOSCcurve
-from .nanosc.loadnanoscimg import loadNANOSCimg
-from .ps_nex.loadpsnexcurve import loadPSNEXcurve
-from .ardf.loadARDFcurve import loadARDFcurve
-from .ardf.loadARDFimg import loadARDFimg
-from .ardf.loadibwcurve import loadIBWcurve
-from .load_uff import loadUFFcurve
-from .save_uff import saveUFFtxt
+from .backends import getbackend
+from .load_uff import loadUFFcurve, loadUFFZcurve
+from .save_uff import saveUFFtxt, saveUFFtxtmap, saveUFFZ
+from .utils.forcemap import ForceMap
 
 class UFF:
     """
@@ -24,26 +19,124 @@ class UFF:
                     isFV (bool): Flag indicating if the file is a Force Volume or not.
                     piezoimg (np.array): 2D np.array containing the piezo image of the file.
                     imagedata (dict): dictionary containing additional image data.
+                    dtype (np.dtype): Dtype of the curves and piezo image data, if None
+                                      the curves are loaded as float64.
             
             Methods:
+                    open
+                    close
                     getcurve
+                    getcurves
+                    iter_curves
+                    getforcemap
                     getpiezoimg
                     to_txt
+                    to_uffz
+
+    The UFF object can be used as a context manager to keep the file open
+    while loading several curves:
+
+        with uffobj:
+            curves = [uffobj.getcurve(idx) for idx in range(nb_curves)]
 
     """
     def __init__(self):
         self.filemetadata=None
         # JPK Specific Atributes
         self._sharedataprops=None
-        self._groupedpaths=None
+        self._jpkindex=None
+        # NANOSCOPE Specific Atributes
+        self._nanoscvolume=None
+        # ARDF Specific Atributes
+        self._ardfindex=None
+        # IBW Specific Atributes
+        self._ibwdata=None
+        # UFF Specific Atributes
+        self._uffdata=None
+        # Binary UFF container, used instead of
+        # the original file to load the curves.
+        self._uffzdata=None
+        # PSNEX Specific Atributes
+        self._tdmsfile=None
         # FV Specific Atribtues
         self.isFV=None
         self.piezoimg=None
         # In files like JPK scans you may
         # have additional image data.
         self.imagedata=None
+        # Dtype of the loaded data, i.e: float32
+        # to halve the memory used by large maps.
+        self.dtype=None
+        # Reader session attributes, used to keep
+        # the file open across getcurve calls.
+        self._filehandle=None
+        self._sessioncount=0
+        self._sessionlock=threading.RLock()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        # Open file handles and locks can not be pickled (i.e: when
+        # sending the object to a process pool), drop the session.
+        state = self.__dict__.copy()
+        state['_filehandle'] = None
+        state['_sessioncount'] = 0
+        state['_sessionlock'] = None
+        state['_tdmsfile'] = None
+        # The memory mapped data is mapped again when needed.
+        state['_nanoscvolume'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._sessionlock = threading.RLock()
+
+    def open(self):
+        """
+        Function used to open a reader session on the file.
+
+        While the session is open the file handle is kept alive and
+        shared by all the getcurve calls. Sessions can be nested and are safe to use from
+        several threads, the file is closed when the last session is closed.
+        For PS-NEX files the TDMS file is opened instead.
+
+                Parameters: None
+
+                Returns:
+                        UFF (uff.UFF): The UFF object itself.
+        """
+        with self._sessionlock:
+            if self._sessioncount == 0 and self._uffzdata is None and self.filemetadata['file_type'] in psnexfiles:
+                self._tdmsfile = getbackend('openPSNEXfile')(self.filemetadata)
+            elif self._sessioncount == 0:
+                self._filehandle = open(self.filemetadata['file_path'], 'rb')
+            self._sessioncount += 1
+        return self
+
+    def close(self):
+        """
+        Function used to close a reader session opened with open.
+
+                Parameters: None
+
+                Returns: None
+        """
+        with self._sessionlock:
+            if self._sessioncount == 0:
+                return
+            self._sessioncount -= 1
+            if self._sessioncount == 0 and self._tdmsfile is not None:
+                self._tdmsfile.close()
+                self._tdmsfile = None
+            elif self._sessioncount == 0:
+                self._filehandle.close()
+                self._filehandle = None
     
-    def _loadcurve(self, curveidx, afmfile, file_type):
+    def _loadcurve(self, curveidx, afmfile, file_type, dtype=None):
         """
         Hidden function used to load a single curve from a file.
         
@@ -57,30 +150,42 @@ class UFF:
 
                 Parameters:
                         curveidx (int): Index of curve to load.
-                        afmfile (ZipFile): Buffer containing the data of the AFM file. Only used for JPK files.
+                        afmfile (file object): Opened AFM file. Only used for JPK and ARDF files.
                         file_type (str): File extension.
+                        dtype (np.dtype): Dtype used to decode the data, if None float64 is used (optional).
                 
                 Returns:
                         FC (utils.forcecurve.ForceCurve): ForceCurve object containing the force curve data.
         """
         if file_type in jpkfiles:
-            curvepaths = self._groupedpaths[curveidx]
-            FC = loadJPKcurve(
-                curvepaths, afmfile, curveidx, self.filemetadata
+            FC = getbackend('loadJPKcurve')(
+                self._jpkindex, afmfile, curveidx, self.filemetadata, self._sessionlock, dtype=dtype
             )
         elif file_type[1:].isdigit() or file_type in nanoscfiles:
-            FC = loadNANOSCcurve(curveidx, self.filemetadata)
+            if self._nanoscvolume is None:
+                self._nanoscvolume = getbackend('loadNANOSCvolume')(self.filemetadata)
+            FC = getbackend('loadNANOSCcurve')(curveidx, self.filemetadata, self._nanoscvolume, dtype=dtype)
         elif file_type in ufffiles:
-            FC = loadUFFcurve(self.filemetadata)
+            FC = loadUFFcurve(self.filemetadata, self._uffdata)
         elif file_type in psnexfiles:
-            FC = loadPSNEXcurve(self.filemetadata,curveidx)
+            # The TDMS file is opened by the reader session.
+            FC = getbackend('loadPSNEXcurve')(self.filemetadata, curveidx, self._tdmsfile, dtype)
         elif file_type in ibwfiles:
-            FC = loadIBWcurve(self.filemetadata, curveidx)
+            FC = getbackend('loadIBWcurve')(self.filemetadata, curveidx, self._ibwdata, dtype)
         elif file_type in ARDFfiles:
-            FC = loadARDFcurve(self.filemetadata, curveidx)    
+            FC = getbackend('loadARDFcurve')(
+                self.filemetadata, curveidx, self._ardfindex, afmfile, self._sessionlock, dtype=dtype
+            )
         return FC
 
-    def getcurve(self, curveidx):
+    def _getdtype(self, dtype):
+        """
+        Hidden function used to get the dtype of the loaded data, dtype if given, otherwise self.dtype.
+        """
+        dtype = self.dtype if dtype is None else dtype
+        return None if dtype is None else np.dtype(dtype)
+
+    def getcurve(self, curveidx, dtype=None):
         """
         Function used to load a single curve from a file.
         
@@ -88,6 +193,7 @@ class UFF:
             - JPK --> .jpk-force, .jpk-force-map, .jpk-qi-data
             - NANOSCOPE --> .spm, .pfc
             - UFF --> .uff
+            - Binary UFF --> .uffz
             - PS-NEX --> .tdms
             - IBW --> .ibw
             - ARDF --> .ARDF
@@ -95,28 +201,132 @@ class UFF:
 
                 Parameters:
                         curveidx (int): Index of curve to load.
+                        dtype (np.dtype): Dtype of the curve data, i.e: np.float32. If None self.dtype is used (optional).
                 
                 Returns:
                         FC (utils.forcecurve.ForceCurve): ForceCurve object containing the force curve data.
         """
         file_type = self.filemetadata['file_type']
-        if file_type in jpkfiles:
-            with open(self.filemetadata['file_path'], 'rb') as file:
-                afmfile = ZipFile(file)
-                FC = self._loadcurve(curveidx, afmfile, file_type)
+        dtype = self._getdtype(dtype)
+        if self._uffzdata is not None:
+            FC = loadUFFZcurve(self._uffzdata, curveidx, dtype)
+        elif file_type in jpkfiles:
+            # Reuse the open session if there is one.
+            with self:
+                FC = self._loadcurve(curveidx, self._filehandle, file_type, dtype)
         elif file_type[1:].isdigit() or file_type in nanoscfiles:
-            FC = self._loadcurve(curveidx, None, file_type)
+            FC = self._loadcurve(curveidx, None, file_type, dtype)
         elif file_type in ufffiles:
             FC = self._loadcurve(None, None, file_type)
         elif file_type in psnexfiles:
-            FC = self._loadcurve(curveidx, None, file_type)
+            # Reuse the open session if there is one.
+            with self:
+                FC = self._loadcurve(curveidx, None, file_type, dtype)
         elif file_type in ibwfiles:
-            FC = self._loadcurve(curveidx, None, file_type)
+            FC = self._loadcurve(curveidx, None, file_type, dtype)
         elif file_type in ARDFfiles:
-            FC = self._loadcurve(curveidx, None, file_type)
+            # Reuse the open session if there is one.
+            with self:
+                FC = self._loadcurve(curveidx, self._filehandle, file_type, dtype)
+        if dtype is not None:
+            FC.astype(dtype)
         return FC
     
-    def getpiezoimg(self):
+    def getcurves(self, curveidxs, max_workers=None, dtype=None):
+        """
+        Function used to load several curves from a file.
+
+        For JPK files the segment members of all the curves are decompressed
+        in parallel using a pool of threads. For NANOSCOPE files the curves are
+        scaled at once from the memory-mapped volume. For ARDF files the lines containing
+        the curves are read in a single pass. For the rest of formats the curves
+        are loaded one by one with getcurve.
+
+                Parameters:
+                        curveidxs (list): Indices of the curves to load.
+                        max_workers (int): Maximum number of threads used to decompress JPK members (optional).
+                        dtype (np.dtype): Dtype of the curves data, if None self.dtype is used (optional).
+                
+                Returns:
+                        FCs (list): List of ForceCurve objects, in the same order as curveidxs.
+        """
+        file_type = self.filemetadata['file_type']
+        dtype = self._getdtype(dtype)
+        if file_type in jpkfiles and self._uffzdata is None:
+            with self:
+                FCs = getbackend('loadJPKcurves')(
+                    self._jpkindex, self._filehandle, list(curveidxs),
+                    self.filemetadata, self._sessionlock, max_workers, dtype
+                )
+        elif (file_type[1:].isdigit() or file_type in nanoscfiles) and self._uffzdata is None:
+            if self._nanoscvolume is None:
+                self._nanoscvolume = getbackend('loadNANOSCvolume')(self.filemetadata)
+            FCs = getbackend('loadNANOSCcurves')(list(curveidxs), self.filemetadata, self._nanoscvolume, dtype)
+        elif file_type in ARDFfiles and self._uffzdata is None:
+            with self:
+                FCs = getbackend('loadARDFcurves')(
+                    self.filemetadata, list(curveidxs), self._ardfindex,
+                    self._filehandle, self._sessionlock, dtype
+                )
+        else:
+            with self:
+                return [self.getcurve(curveidx, dtype) for curveidx in curveidxs]
+        if dtype is not None:
+            for FC in FCs:
+                FC.astype(dtype)
+        return FCs
+    
+    def iter_curves(self, indices=None, chunk=64, max_workers=None, dtype=None):
+        """
+        Generator used to load the curves of a file one after the other.
+
+        The curves are loaded in chunks with getcurves, keeping the file open
+        until the iteration ends. Iterating over the curves in order reads the
+        file sequentially:
+            - JPK: the members of each chunk are decompressed in parallel from one file handle.
+            - NANOSCOPE: the curves of each chunk are scaled at once from one memory-mapped volume.
+            - ARDF: the lines of each chunk are read in a single forward pass.
+            - PS-NEX: the curves are read from one TDMS file handle.
+
+                Parameters:
+                        indices (list): Indices of the curves to load, if None all the curves are loaded.
+                        chunk (int): Number of curves loaded at once.
+                        max_workers (int): Maximum number of threads used to decompress JPK members (optional).
+                        dtype (np.dtype): Dtype of the curves data, if None self.dtype is used (optional).
+                
+                Yields:
+                        FC (utils.forcecurve.ForceCurve): ForceCurve object containing the force curve data.
+        """
+        if indices is None:
+            indices = range(self.filemetadata['Entry_tot_nb_curve']) if self.isFV else [0]
+        indices = list(indices)
+        with self:
+            for start in range(0, len(indices), chunk):
+                yield from self.getcurves(indices[start:start + chunk], max_workers, dtype)
+
+    def getforcemap(self, indices=None, chunk=64, max_workers=None, dtype=None):
+        """
+        Function used to load the curves of a file into a ForceMap, where each channel
+        of each segment is stored in a single array (see utils.forcemap.ForceMap).
+
+                Parameters:
+                        indices (list): Indices of the curves to load, if None all the curves are loaded.
+                        chunk (int): Number of curves loaded at once (see iter_curves).
+                        max_workers (int): Maximum number of threads used to decompress JPK members (optional).
+                        dtype (np.dtype): Dtype of the curves data, if None self.dtype is used (optional).
+                
+                Returns:
+                        forcemap (utils.forcemap.ForceMap): ForceMap object containing the curves data.
+        """
+        num_x = self.filemetadata.get('num_x_pixels') or self.filemetadata.get('ardf_nb_points')
+        num_y = self.filemetadata.get('num_y_pixels') or self.filemetadata.get('ardf_nb_lines')
+        shape = (int(num_y), int(num_x)) if self.isFV and num_x and num_y else None
+        return ForceMap(
+            self.filemetadata['Entry_filename'], list(self.iter_curves(indices, chunk, max_workers, dtype)),
+            shape, serpentine=self.filemetadata['file_type'] == "jpk-force-map"
+        )
+
+    def getpiezoimg(self, dtype=None):
         """
         Function used to compute the piezo image of a file.
 
@@ -126,33 +336,64 @@ class UFF:
             - JPK --> .jpk-force-map, .jpk-qi-data
             - NANOSCOPE --> .spm, .pfc
             - Asylum Research --> .ARDF
+            - Binary UFF --> .uffz
 
-                Parameters: None
+                Parameters:
+                        dtype (np.dtype): Dtype of the piezo image, if None self.dtype is used (optional).
                 
                 Returns:
                         piezoimg (np.array): 2D array containing the piezo image of the file.
         """
+        dtype = self._getdtype(dtype)
         file_type = self.filemetadata['file_type']
-        if file_type in jpkfiles:
-            self.piezoimg = computeJPKPiezoImg(self)
+        if self._uffzdata is not None:
+            self.piezoimg = self._uffzdata.get_array('piezoimg.npy')
+        elif file_type in jpkfiles:
+            self.piezoimg = getbackend('computeJPKPiezoImg')(self)
         elif file_type[1:].isdigit() or file_type in nanoscfiles:
-            self.piezoimg = loadNANOSCimg(self.filemetadata)
+            self.piezoimg = getbackend('loadNANOSCimg')(self.filemetadata)
         elif file_type in ARDFfiles:
-            self.piezoimg = loadARDFimg(self.filemetadata)
+            self.piezoimg = getbackend('loadARDFimg')(self.imagedata)
+        if dtype is not None and self.piezoimg is not None:
+            # The image is computed in float64 and cast once.
+            self.piezoimg = np.asarray(self.piezoimg).astype(dtype, copy=False)
         return self.piezoimg
     
-    def to_txt(self, savedir):
+    def to_txt(self, savedir, max_workers=1):
         """
         Function used to save the loaded data into a txt file following the UFF.
 
+        The curves of a Force Volume file can be saved in parallel, using a pool of processes.
+
                 Parameters:
                         savedir (str): Path to save the txt UFF file.
+                        max_workers (int): Maximum number of processes used to save the curves
+                                           of a Force Volume file, if None the number of CPUs is used.
                 
                 Returns: None
         """
-        if self.isFV:
-            for curveidx in range(self.filemetadata['Entry_tot_nb_curve']):
-                saveUFFtxt(self, self, savedir, curveidx)
+        if self.isFV and max_workers != 1:
+            saveUFFtxtmap(self, savedir, max_workers=max_workers)
+        elif self.isFV:
+            # Reuse the same session to load all the curves.
+            with self:
+                for curveidx in range(self.filemetadata['Entry_tot_nb_curve']):
+                    saveUFFtxt(self, self, savedir, curveidx)
         else:
             saveUFFtxt(self, self, savedir)
-        
+
+    def to_uffz(self, savefile, chunk_size=256, max_workers=None):
+        """
+        Function used to save the loaded data into a binary UFF container (.uffz).
+
+        The container can be loaded with pyfmreader.loadfile, giving memory-mapped
+        access to any curve (see save_uff.saveUFFZ).
+
+                Parameters:
+                        savefile (str): Path to the save file.
+                        chunk_size (int): Number of curves stored in each data chunk.
+                        max_workers (int): Maximum number of threads used to load the curves (optional).
+                
+                Returns: None
+        """
+        saveUFFZ(self, savefile, chunk_size, max_workers)
@@ -0,0 +1,120 @@
+# File containing the functions used to keep an on-disk cache
+# of the loaded AFM files, stored as binary UFF containers (.uffz).
+# Used by pyfmreader.loadfile when the cache is enabled.
+
+import os
+import hashlib
+import numpy as np
+
+from .load_uff import UFFZData, loadUFFZfile
+from .save_uff import saveUFFZ
+
+# Suffix added to the cached files.
+cache_suffix = '.cache.uffz'
+
+def getUFFcachekey(filepath, dtype=None):
+    """
+    Get the key used to check if a cached file is up to date,
+    built from the path, size and modification time of the file.
+    If the data is loaded with a given dtype, it is added to the key.
+
+            Parameters:
+                    filepath (str): Path to the AFM file.
+                    dtype (np.dtype): Dtype of the cached data (optional).
+            
+            Returns:
+                    cache_key (list): [absolute path, size in bytes, modification time in ns(, dtype)]
+    """
+    filestat = os.stat(filepath)
+    cache_key = [os.path.abspath(filepath), filestat.st_size, filestat.st_mtime_ns]
+    if dtype is not None:
+        cache_key.append(np.dtype(dtype).str)
+    return cache_key
+
+def getUFFcachepath(filepath, cache, dtype=None):
+    """
+    Get the path of the cached file.
+
+    If cache is True the cached file is a sidecar next to the AFM file, if
+    it is a directory the cached file is stored in it. The name of the cached
+    files stored in a directory includes a hash of the AFM file path, so files
+    with the same name in different folders do not collide. The files cached
+    with a given dtype include its name, i.e: file.float32.cache.uffz.
+
+            Parameters:
+                    filepath (str): Path to the AFM file.
+                    cache (bool or str): True or path to the cache directory.
+                    dtype (np.dtype): Dtype of the cached data (optional).
+            
+            Returns:
+                    cachepath (str): Path to the cached file.
+    """
+    suffix = cache_suffix if dtype is None else f".{np.dtype(dtype).name}{cache_suffix}"
+    if cache is True:
+        return filepath + suffix
+    path_hash = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache, f"{os.path.basename(filepath)}.{path_hash}{suffix}")
+
+def loadUFFcache(filepath, cache, UFF):
+    """
+    Load an AFM file from the cache if the cached file is up to date.
+
+            Parameters:
+                    filepath (str): Path to the AFM file.
+                    cache (bool or str): True or path to the cache directory.
+                    UFF (uff.UFF): UFF object to load the cached data into.
+            
+            Returns:
+                    UFF (uff.UFF): UFF object containing the cached data, or None if not cached.
+    """
+    cachepath = getUFFcachepath(filepath, cache, UFF.dtype)
+    if not os.path.isfile(cachepath):
+        return None
+    try:
+        uffzdata = UFFZData(cachepath)
+    except (OSError, ValueError, KeyError):
+        # Unreadable cache file, i.e: interrupted write.
+        return None
+    if uffzdata.header.get('cache_key') != getUFFcachekey(filepath, UFF.dtype):
+        return None
+    if uffzdata.header.get('skipped_fields', True):
+        # Some metadata of the original file is missing, the cache is not transparent.
+        return None
+    UFF = loadUFFZfile(cachepath, UFF, uffzdata)
+    # The cache is transparent, keep the metadata of the original file.
+    for key in ('file_path', 'file_size_bytes'):
+        UFF.filemetadata[key] = uffzdata.header['filemetadata'].get(key)
+    del UFF.filemetadata['source_file_path']
+    UFF.filemetadata['cache_path'] = cachepath
+    return UFF
+
+def saveUFFcache(filepath, cache, UFF):
+    """
+    Save a loaded AFM file into the cache. The cached file is written under a
+    temporary name and renamed, so an interrupted write never leaves a valid
+    looking cached file.
+
+    The file is not cached if some of its metadata can not be stored in the
+    binary UFF container, so the cached curves are the same as the loaded ones.
+
+            Parameters:
+                    filepath (str): Path to the AFM file.
+                    cache (bool or str): True or path to the cache directory.
+                    UFF (uff.UFF): UFF object containing the loaded data.
+            
+            Returns:
+                    cachepath (str): Path to the cached file, or None if it could not be written.
+    """
+    cachepath = getUFFcachepath(filepath, cache, UFF.dtype)
+    temppath = f"{cachepath}.{os.getpid()}.tmp"
+    try:
+        if cache is not True:
+            os.makedirs(cache, exist_ok=True)
+        saveUFFZ(UFF, temppath, cache_key=getUFFcachekey(filepath, UFF.dtype), strict=True)
+        os.replace(temppath, cachepath)
+    except (OSError, ValueError) as error:
+        print(f"[!] Could not write the cache file {cachepath}: {error}")
+        if os.path.exists(temppath):
+            os.remove(temppath)
+        return None
+    return cachepath
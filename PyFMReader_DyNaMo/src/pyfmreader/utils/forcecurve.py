@@ -6,6 +6,7 @@
 # get_segments()
 # preprocess_force_curve()
 # get_force_vs_indentation()
+# astype()
 
 
 class ForceCurve:
@@ -13,6 +14,8 @@ class ForceCurve:
     Class used to store the data of the different force curves
     within a file.
 
+    The attributes are stored in slots to keep the force curves small.
+
             Properties:
                     file_id (str): AFM File identifier
                     curve_index (str): Curve position in the AFM File (0, 1, 2, etc.)
@@ -23,7 +26,13 @@ class ForceCurve:
             
             Methods:
                     get_segments
+                    astype
     """
+    __slots__ = (
+        'file_id', 'curve_index', 'z_at_setpoint', 'extend_segments', 'retract_segments',
+        'pause_segments', 'modulation_segments'
+    )
+
     def __init__(self, curve_index, file_id):
         self.file_id = file_id
         self.curve_index = curve_index
@@ -123,4 +132,17 @@ class ForceCurve:
         """
 
         for _, segment in self.get_segments():
-            segment.get_force_vs_indentation_precal(spring_constant)
\ No newline at end of file
+            segment.get_force_vs_indentation_precal(spring_constant)
+
+    def astype(self, dtype):
+        """
+        Casts the floating point channels of each segment in the force curve to dtype,
+        i.e: float32 to halve the memory used by the data.
+
+                Parameters:
+                        dtype (np.dtype): Dtype of the channels data.
+                
+                Returns: None
+        """
+        for _, segment in self.get_segments():
+            segment.astype(dtype)
@@ -0,0 +1,284 @@
+# File containing the following classes:
+# SegmentStack --------------------------------------------------
+# Class used to store the same segment of all the force curves
+# of a force map, each channel in a single flat array.
+# Includes the following methods:
+# get_channel()
+# get_padded()
+# preprocess_segments()
+# ForceMap --------------------------------------------------
+# Class used to store all the force curves of a force map.
+# Includes the following methods:
+# get_curve()
+# get_pixel()
+
+
+import numpy as np
+
+from .forcecurve import ForceCurve
+from .segment import Segment
+
+class SegmentStack:
+    """
+    Class used to store the same segment of all the force curves of a force map.
+
+    Each channel is stored in a single flat array, the data of curve i is
+    channels[channel][offsets[channel][i]:offsets[channel][i+1]]. The channels of
+    a segment can have different lengths (i.e: ARDF curves), so each channel has
+    its own offsets and lengths. Operations on all the curves at once can be done
+    directly on the flat arrays, i.e: using np.add.reduceat with offsets[channel][:-1]
+    or np.repeat(values, lengths[channel]) to broadcast per curve values.
+
+            Properties:
+                    segment_id (str): Segment position in the ForceCurve (0, 1, 2, etc.)
+                    segment_type (str): Type of segment (Approach, Retract, Pause, Modulation)
+                    group (str): ForceCurve list of the segment (extend, retract, pause, modulation)
+                    present (np.array): Flag indicating if each curve has the segment.
+                    keys (list): Key of the segment in the segment list of each curve, None if the curve has no such segment.
+                    segment_ids (list): segment_id of the segment of each curve, None if the curve has no such segment.
+                    channel_present (dict): Dictionary relating each channel name to a flag indicating if each curve has the channel.
+                    offsets (dict): Dictionary relating each channel name to the position of the data of each curve
+                                    in its flat array, of length nb_curves + 1.
+                    lengths (dict): Dictionary relating each channel name to the number of data points of each curve,
+                                    0 if the curve has no such segment.
+                    channels (dict): Dictionary relating each channel name to its flat array.
+                    nb_point (np.array): Number of data points of each segment (metadata), -1 if unknown.
+                    force_setpoint (np.array): Force setpoint (N) of each segment.
+                    velocity (np.array): Ramp speed (m/s) of each segment.
+                    sampling_rate (np.array): Sampling rate (Hz) of each segment.
+                    z_displacement (np.array): Displacement in z axis (m) of each segment.
+                    force_setpoint_mode (list): Type of force setpoint of each segment.
+                    segment_metadata (list): Additional metadata of each segment.
+                    zheight (np.array): Piezo height (m), flat array with the offsets of the height channel (see preprocess_segments).
+                    vdeflection (np.array): Vertical deflection (m), flat array with the offsets of vDeflection (see preprocess_segments).
+
+            Methods:
+                    get_channel
+                    get_padded
+                    preprocess_segments
+    """
+    def __init__(self, segment_id, segment_type, group, segments, keys=None):
+        self.segment_id = segment_id
+        self.segment_type = segment_type
+        self.group = group
+        self.present = np.array([segment is not None for segment in segments], dtype=bool)
+        # The keys and segment ids keep their type (i.e: '0' or 0), as in the original curves.
+        self.keys = list(keys) if keys is not None else [
+            None if segment is None else segment_id for segment in segments
+        ]
+        self.segment_ids = [None if segment is None else segment.segment_id for segment in segments]
+        channel_names = list(dict.fromkeys(
+            channel for segment in segments if segment is not None for channel in segment.segment_formated_data
+        ))
+        # Curves without a channel are filled with NaN, as long as the longest channel of the segment.
+        segment_lengths = [
+            0 if segment is None else max(
+                (len(values) for values in segment.segment_formated_data.values()), default=0
+            ) for segment in segments
+        ]
+        self.channels, self.offsets, self.lengths, self.channel_present = {}, {}, {}, {}
+        for channel in channel_names:
+            self.channel_present[channel] = np.array([
+                segment is not None and channel in segment.segment_formated_data for segment in segments
+            ], dtype=bool)
+            self.lengths[channel] = np.array([
+                length if segment is None or channel not in segment.segment_formated_data
+                else len(segment.segment_formated_data[channel])
+                for segment, length in zip(segments, segment_lengths)
+            ], dtype=np.int64)
+            self.offsets[channel] = np.zeros(len(segments) + 1, dtype=np.int64)
+            np.cumsum(self.lengths[channel], out=self.offsets[channel][1:])
+            # Curves without the channel are filled with NaN, keeping the dtype of the data (i.e: float32).
+            dtype = np.result_type(np.float16, *(
+                np.asarray(segment.segment_formated_data[channel]).dtype
+                for segment in segments if segment is not None and channel in segment.segment_formated_data
+            ))
+            self.channels[channel] = np.concatenate([
+                np.full(length, np.nan, dtype=dtype) if segment is None or channel not in segment.segment_formated_data
+                else np.asarray(segment.segment_formated_data[channel])
+                for segment, length in zip(segments, self.lengths[channel])
+            ]) if len(segments) else np.empty(0)
+        column = lambda attribute: np.array([
+            np.nan if segment is None or getattr(segment, attribute) is None else getattr(segment, attribute)
+            for segment in segments
+        ], dtype=np.float64)
+        self.nb_point = np.array([
+            -1 if segment is None or segment.nb_point is None else segment.nb_point for segment in segments
+        ], dtype=np.int64)
+        self.force_setpoint = column('force_setpoint')
+        self.velocity = column('velocity')
+        self.sampling_rate = column('sampling_rate')
+        self.z_displacement = column('z_displacement')
+        self.force_setpoint_mode = [None if segment is None else segment.force_setpoint_mode for segment in segments]
+        self.segment_metadata = [None if segment is None else segment.segment_metadata for segment in segments]
+        self.zheight = None
+        self.vdeflection = None
+
+    def get_channel(self, channel_name, curve_position):
+        """
+        Get the data of a channel for a single curve, as a view of the flat array.
+
+                Parameters:
+                        channel_name (str): Name of the channel.
+                        curve_position (int): Position of the curve in the force map.
+
+                Returns:
+                        values (np.array): View of the channel data of the curve.
+        """
+        offsets = self.offsets[channel_name]
+        return self.channels[channel_name][offsets[curve_position]:offsets[curve_position + 1]]
+
+    def get_padded(self, channel_name, fill_value=np.nan):
+        """
+        Get a channel as a 2D array of shape (nb_curves, max length), padded with fill_value.
+
+                Parameters:
+                        channel_name (str): Name of the channel.
+                        fill_value (float): Value used to pad the shorter curves.
+
+                Returns:
+                        values (np.array): 2D array containing the channel data of every curve.
+        """
+        values, lengths = self.channels[channel_name], self.lengths[channel_name]
+        padded = np.full((len(lengths), lengths.max(initial=0)), fill_value, dtype=values.dtype)
+        mask = np.arange(padded.shape[1]) < lengths[:, None]
+        padded[mask] = values
+        return padded
+
+    def preprocess_segments(self, deflection_sens, height_channel_key, y0=None):
+        """
+        Computes Vertical Deflection in m and populates the vdeflection and zheight
+        flat arrays of all the curves at once, as Segment.preprocess_segment does.
+
+        vDeflection(m) = (vDeflection(V) - baseline(V)) * deflection_sens(m/V)
+
+        if y0 is not None:
+            vDeflection(m) = (vDeflection(V) - y0(V)) * deflection_sens(m/V)
+
+                Parameters:
+                        deflection_sens (float): In m/V
+                        height_channel_key (str): Name of the piezo height channel.
+                        y0 (float): Manual offset for the vertical deflection, in Volts.
+
+                Returns: None
+        """
+        deflection_v = self.channels["vDeflection"]
+        if y0 is not None:
+            deflection_v = deflection_v - y0
+        else:
+            baselines = np.array([
+                metadata["baseline"] if metadata is not None and metadata["baseline_measured"] else 0
+                for metadata in self.segment_metadata
+            ], dtype=np.float64)
+            if baselines.any():
+                deflection_v = deflection_v - np.repeat(baselines, self.lengths["vDeflection"])
+        self.vdeflection = deflection_v * deflection_sens
+        self.zheight = self.channels[height_channel_key]
+
+class ForceMap:
+    """
+    Class used to store all the force curves of a force map, each segment
+    in a SegmentStack, so numpy operations can be run over the whole map.
+
+    The ForceCurve objects returned by get_curve are views of the stacks,
+    their segments data is not copied.
+
+            Properties:
+                    file_id (str): AFM File identifier
+                    curve_indices (np.array): Index of each curve in the AFM File.
+                    rows (np.array): Row of each curve in the map, following the scan direction.
+                    cols (np.array): Column of each curve in the map, following the scan direction.
+                    shape (tuple): Shape (rows, cols) of the map, None if unknown.
+                    z_at_setpoint (np.array): Z at setpoint (m) of each curve.
+                    segments (dict): Dictionary relating each segment id to its SegmentStack.
+
+            Methods:
+                    get_curve
+                    get_pixel
+    """
+    def __init__(self, file_id, force_curves, shape=None, serpentine=False):
+        self.file_id = file_id
+        self.curve_indices = np.array([int(fc.curve_index) for fc in force_curves], dtype=np.int64)
+        self.shape = shape
+        if shape is not None:
+            self.rows, self.cols = np.divmod(self.curve_indices, shape[1])
+            if serpentine:
+                # Odd rows are scanned in the opposite direction.
+                odd = self.rows % 2 == 1
+                self.cols[odd] = shape[1] - 1 - self.cols[odd]
+        else:
+            self.rows = np.zeros_like(self.curve_indices)
+            self.cols = self.curve_indices.copy()
+        self.z_at_setpoint = np.array([fc.z_at_setpoint for fc in force_curves], dtype=np.float64)
+        groups = ('extend', 'retract', 'pause', 'modulation')
+        segment_info, segment_tables = {}, []
+        for fc in force_curves:
+            table = {}
+            for group, group_segments in zip(groups, (
+                fc.extend_segments, fc.retract_segments, fc.pause_segments, fc.modulation_segments
+            )):
+                for segment_id, segment in group_segments:
+                    segment_info.setdefault(str(segment_id), (segment.segment_type, group))
+                    table[str(segment_id)] = (segment_id, segment)
+            segment_tables.append(table)
+        self.segments = {
+            segment_id: SegmentStack(
+                segment_id, segment_type, group,
+                [table.get(segment_id, (None, None))[1] for table in segment_tables],
+                [table.get(segment_id, (None, None))[0] for table in segment_tables]
+            ) for segment_id, (segment_type, group) in sorted(segment_info.items(), key=lambda item: int(item[0]))
+        }
+
+    def __len__(self):
+        return len(self.curve_indices)
+
+    def __iter__(self):
+        return (self.get_curve(position) for position in range(len(self)))
+
+    def get_curve(self, curve_position):
+        """
+        Get a force curve of the map. The segments data are views of the stacks.
+
+                Parameters:
+                        curve_position (int): Position of the curve in the force map.
+
+                Returns:
+                        force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the curve data.
+        """
+        force_curve = ForceCurve(int(self.curve_indices[curve_position]), self.file_id)
+        force_curve.z_at_setpoint = self.z_at_setpoint[curve_position]
+        for segment_id, stack in self.segments.items():
+            if not stack.present[curve_position]:
+                continue
+            segment = Segment(self.file_id, stack.segment_ids[curve_position], stack.segment_type)
+            segment.segment_formated_data = {
+                channel: stack.get_channel(channel, curve_position) for channel in stack.channels
+                if stack.channel_present[channel][curve_position]
+            }
+            nb_point = int(stack.nb_point[curve_position])
+            segment.nb_point = nb_point if nb_point >= 0 else None
+            segment.nb_col = len(segment.segment_formated_data)
+            segment.force_setpoint_mode = stack.force_setpoint_mode[curve_position]
+            segment.force_setpoint = stack.force_setpoint[curve_position]
+            segment.velocity = stack.velocity[curve_position]
+            segment.sampling_rate = stack.sampling_rate[curve_position]
+            segment.z_displacement = stack.z_displacement[curve_position]
+            segment.segment_metadata = stack.segment_metadata[curve_position]
+            getattr(force_curve, f"{stack.group}_segments").append((stack.keys[curve_position], segment))
+        return force_curve
+
+    def get_pixel(self, row, col):
+        """
+        Get the force curve measured at a pixel of the map.
+
+                Parameters:
+                        row (int): Row of the pixel.
+                        col (int): Column of the pixel.
+
+                Returns:
+                        force_curve (utils.forcecurve.ForceCurve): ForceCurve object containing the curve data.
+        """
+        positions = np.flatnonzero((self.rows == row) & (self.cols == col))
+        if len(positions) == 0:
+            raise IndexError(f"No curve found at pixel ({row}, {col})")
+        return self.get_curve(positions[0])
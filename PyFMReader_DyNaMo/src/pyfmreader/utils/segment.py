@@ -5,15 +5,51 @@
 # Includes the following methods:
 # preprocess_segment()
 # get_force_vs_indentation_curve()
+# astype()
+# And the function get_time_axis, used to share the
+# time axes of the segments.
 
 
+from functools import lru_cache
 import numpy as np
 
+@lru_cache(maxsize=128)
+def get_time_axis(duration, nb_point, dtype=None):
+    """
+    Get the time axis of a segment. The axis is read-only and shared by all
+    the segments with the same duration and number of points, i.e: the
+    segments of the curves of a force map.
+
+            Parameters:
+                    duration (float): Duration of the segment (s).
+                    nb_point (int): Number of data points in the segment.
+                    dtype (np.dtype): Dtype of the time axis, if None float64 is used.
+            
+            Returns:
+                    time (np.array): Read-only time axis (s).
+    """
+    time = np.linspace(0, duration, nb_point, endpoint=False, dtype=dtype)
+    time.flags.writeable = False
+    return time
+
+def _asdtype(value, values):
+    """
+    Hidden function used to cast a scalar to the floating dtype of values,
+    so float32 data is not upcast to float64 when operated with it.
+    """
+    dtype = np.asarray(values).dtype
+    if np.issubdtype(dtype, np.floating):
+        return dtype.type(value)
+    return value
+
 class Segment:
     """
     Class used to store the data and metadata of the different
     segments that form an AFM force curve.
 
+    The attributes are stored in slots to keep the segments small,
+    i.e: when sending force curves to a process pool.
+
             Properties:
                     file_id (str): AFM File identifier
                     segment_id (str): Segment position in the ForceCurve (0, 1, 2, etc.)
@@ -40,8 +76,16 @@ class Segment:
             Methods:
                     preprocess_segment
                     get_force_vs_indentation_curve
+                    astype
 
     """
+    __slots__ = (
+        'file_id', 'segment_id', 'segment_type', 'segment_code', 'description', 'nb_point',
+        'force_setpoint_mode', 'nb_col', 'force_setpoint', 'velocity', 'sampling_rate',
+        'z_displacement', 'segment_metadata', 'segment_raw_data', 'segment_formated_data',
+        'height_channel_key', 'zheight', 'vdeflection', 'time', 'indentation', 'force'
+    )
+
     def __init__(self, file_id, segment_id, segment_type):
         self.file_id = file_id                  
         self.segment_id = segment_id            
@@ -87,19 +131,20 @@ class Segment:
                 
                 Returns: None
         """
+        # The scalars are cast to the dtype of the data, so float32 data stays float32.
         deflection_v = self.segment_formated_data["vDeflection"]
         if y0 is not None: # This condition needs to be first to allow user to overwrite metadata based processing
-            deflection_v = deflection_v - y0
+            deflection_v = deflection_v - _asdtype(y0, deflection_v)
         elif self.segment_metadata is not None and\
             self.segment_metadata["baseline_measured"]:
-            deflection_v = deflection_v - self.segment_metadata["baseline"]
-        self.vdeflection = deflection_v * deflection_sens
+            deflection_v = deflection_v - _asdtype(self.segment_metadata["baseline"], deflection_v)
+        self.vdeflection = deflection_v * _asdtype(deflection_sens, deflection_v)
         self.zheight = self.segment_formated_data[height_channel_key]
         if "time" in self.segment_formated_data:
             self.time = self.segment_formated_data["time"]
         elif self.sampling_rate is not None:
             segment_duration = self.nb_point * self.sampling_rate
-            self.time = np.linspace(0, segment_duration, self.nb_point, endpoint=False)
+            self.time = get_time_axis(segment_duration, self.nb_point, self.segment_formated_data["vDeflection"].dtype)
     
     def get_force_vs_indentation(self, poc, spring_constant):
         """
@@ -118,13 +163,14 @@ class Segment:
                 Returns: None
         """
         # Set the center position to 0, 0 and get a force curve
-        center_force_x = poc[0] - poc[1]
-        center_force_y = poc[1] * spring_constant
+        center_force_x = _asdtype(poc[0] - poc[1], self.zheight)
+        center_force_y = _asdtype(poc[1] * spring_constant, self.vdeflection)
+        spring_constant = _asdtype(spring_constant, self.vdeflection)
 
         # Indentation = piezo_height(m) − deflection(m) − (piezo_height(CP)(m) − deflection(CP)(m))
         # Force = Kc(N/m) * deflection(m)
-        self.indentation = np.array(self.zheight - self.vdeflection - center_force_x)
-        self.force = np.array(self.vdeflection * spring_constant - center_force_y)
+        self.indentation = np.asarray(self.zheight - self.vdeflection - center_force_x)
+        self.force = np.asarray(self.vdeflection * spring_constant - center_force_y)
 
     def get_force_vs_indentation_precal(self, spring_constant):
         """
@@ -143,5 +189,23 @@ class Segment:
 
         # Indentation = piezo_height(m)
         # Force = Kc(N/m) * deflection(m)
-        self.indentation = np.array(self.zheight)
-        self.force = np.array(self.vdeflection * spring_constant)
\ No newline at end of file
+        # The indentation is a view of zheight, not a copy.
+        self.indentation = np.asarray(self.zheight)
+        self.force = np.asarray(self.vdeflection * _asdtype(spring_constant, self.vdeflection))
+
+    def astype(self, dtype):
+        """
+        Casts the floating point channels of the segment to dtype, i.e: float32
+        to halve the memory used by the data. The channels already stored
+        with dtype are not copied.
+
+                Parameters:
+                        dtype (np.dtype): Dtype of the channels data.
+                
+                Returns: None
+        """
+        dtype = np.dtype(dtype)
+        for channel, values in self.segment_formated_data.items():
+            values = np.asarray(values)
+            if np.issubdtype(values.dtype, np.floating) and values.dtype != dtype:
+                self.segment_formated_data[channel] = values.astype(dtype)
\ No newline at end of file
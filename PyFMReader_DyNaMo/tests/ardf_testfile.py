@@ -0,0 +1,120 @@
+# Helper used by the tests to write small synthetic ARDF files,
+# with random images and force curves of random lengths.
+
+import struct
+import numpy as np
+
+NOTES = (
+    "InvOLS: 5e-08\rSpringConstant: 0.1\rForceDecimation: 2\rNumPtsPerSec: 2000\rTriggerType: Relative\r"
+    "ApproachVelocity: 1e-06\rRetractVelocity: 2e-06\rExtendZ: 1e-06\rRetractZ: 1e-06\r"
+)
+
+def _pointer(size, record_type):
+    # ARDF pointer: crc, size, type and misc.
+    return struct.pack('<II4sI', 0, size, record_type.encode(), 0)
+
+def write_ardf_file(path, lines=4, points=5, nb_images=2, retrace=False, seed=0, channels=('Raw', 'Defl', 'ZSnsr')):
+    """
+    Write a synthetic ARDF file.
+
+            Parameters:
+                    path (str): Path to the file.
+                    lines (int): Number of lines of the force map.
+                    points (int): Number of points per line.
+                    nb_images (int): Number of images.
+                    retrace (bool): If True the points of each line are stored in reverse order.
+                    seed (int): Seed of the random data.
+                    channels (tuple): Names of the force curve channels.
+
+            Returns:
+                    images (list): Data of each image (lines, points).
+                    curves (dict): Relates each (line, point) to its data (channels, nb points)
+                                   and its segment markers (pnt0, pnt1, pnt2).
+    """
+    rng = np.random.default_rng(seed)
+    buffer = bytearray(_pointer(16, 'ARDF'))
+    nb_entries = nb_images + 1
+    ftoc_size = 32 + nb_entries * 24
+    ftoc_position = len(buffer)
+    buffer += bytes(ftoc_size)
+
+    def write_text(text):
+        position = len(buffer)
+        data = text.encode('latin-1')
+        buffer.extend(_pointer(24 + len(data), 'TEXT') + struct.pack('<II', 0, len(data)) + data)
+        return position
+
+    ttoc_position = len(buffer)
+    buffer += bytes(64)
+    notes_position = write_text(NOTES)
+    buffer[ttoc_position:ttoc_position + 64] = (
+        _pointer(64, 'TTOC') + struct.pack('<QII', 64, 1, 32) + _pointer(32, 'TOFF') + struct.pack('<QQ', 1, notes_position)
+    )
+
+    images, image_positions = [], []
+    for image_idx in range(nb_images):
+        image = rng.normal(size=(lines, points)).astype('<f4')
+        images.append(image)
+        image_positions.append(len(buffer))
+        buffer += _pointer(32, 'IMAG') + struct.pack('<QII', 32, 0, 24)
+        image_ttoc = len(buffer)
+        buffer += bytes(64)
+        buffer += _pointer(152, 'IDEF') + struct.pack('<II', points, lines) + bytes(96) + f'Img{image_idx}'.encode().ljust(32, b'\0')
+        line_size = 16 + 4 * points
+        buffer += _pointer(32, 'IBOX') + struct.pack('<QII', 32 + lines * line_size, lines, line_size)
+        for line in range(lines):
+            buffer += _pointer(line_size, 'IDAT') + image[line].tobytes()
+        buffer += _pointer(16, 'GAMI')
+        thumb_position = write_text(f"thumb{image_idx}\rNote{image_idx}: x\r")
+        buffer[image_ttoc:image_ttoc + 64] = (
+            _pointer(64, 'TTOC') + struct.pack('<QII', 64, 1, 32) + _pointer(32, 'TOFF') + struct.pack('<QQ', 1, thumb_position)
+        )
+
+    volume_position = len(buffer)
+    buffer += _pointer(32, 'VOLM') + struct.pack('<QII', 32, 0, 24)
+    buffer += _pointer(32, 'TTOC') + struct.pack('<QII', 32, 0, 32)
+    buffer += _pointer(200, 'VDEF') + struct.pack('<II', points, lines) + bytes(144) + b'Force'.ljust(32, b'\0')
+    for channel in channels:
+        buffer += _pointer(48, 'VCHN') + channel.encode().ljust(32, b'\0')
+    xdef_text = b'xdef text'
+    buffer += _pointer(16 + 8 + len(xdef_text) + 3, 'XDEF') + struct.pack('<II', 0, len(xdef_text)) + xdef_text + bytes(3)
+    buffer += _pointer(32, 'VTOC') + struct.pack('<QII', 32 + lines * 40, lines, 40)
+    voff_position = len(buffer)
+    buffer += bytes(lines * 40)
+    buffer += _pointer(16, 'MLOV')
+
+    curves, force = {}, 0
+    for line in range(lines):
+        line_position = len(buffer)
+        buffer[voff_position + 40 * line:voff_position + 40 * (line + 1)] = (
+            _pointer(40, 'VOFF') + struct.pack('<IIQQ', points, line, 0, line_position)
+        )
+        for point in (range(points - 1, -1, -1) if retrace else range(points)):
+            nb_points = int(rng.integers(20, 40))
+            data = rng.normal(size=(len(channels), nb_points)).astype('<f4')
+            # The last point must not be 0, the tail of 0s is removed when loading.
+            data[:, -1] += 5
+            markers = (0, int(rng.integers(5, nb_points - 5)), nb_points - 1)
+            curves[(line, point)] = (data, markers)
+            vset_position = len(buffer)
+            buffer += _pointer(48, 'VSET') + struct.pack('<IIII', force, line, point, 0) + struct.pack('<QQ', 0, 0)
+            name = f'Force{force}'.encode()
+            buffer += _pointer(32 + len(name) + 3, 'VNAM') + struct.pack('<IIII', force, line, point, len(name)) + name + bytes(3)
+            for channel_idx in range(len(channels)):
+                buffer += _pointer(56 + 4 * nb_points, 'VDAT') + struct.pack(
+                    '<10I', force, line, point, nb_points, 0, *markers, 0, 0
+                ) + data[channel_idx].tobytes()
+            buffer += _pointer(20, 'XDAT') + bytes(4)
+            # Position of the next VSET.
+            struct.pack_into('<Q', buffer, vset_position + 40, len(buffer))
+            force += 1
+
+    buffer[ftoc_position:ftoc_position + 32] = _pointer(ftoc_size, 'FTOC') + struct.pack('<QII', ftoc_size, nb_entries, 24)
+    for entry_idx, position in enumerate(image_positions + [volume_position]):
+        entry_type = 'IMAG' if entry_idx < nb_images else 'VOLM'
+        buffer[ftoc_position + 32 + 24 * entry_idx:ftoc_position + 56 + 24 * entry_idx] = (
+            _pointer(24, entry_type) + struct.pack('<Q', position)
+        )
+    with open(path, 'wb') as file:
+        file.write(buffer)
+    return images, curves
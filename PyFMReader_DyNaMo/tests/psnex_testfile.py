@@ -0,0 +1,64 @@
+# Helper used by the tests to write small synthetic PS_nex TDMS files,
+# with a single force curve and random data.
+
+import numpy as np
+from nptdms import TdmsWriter, RootObject, GroupObject, ChannelObject
+
+FILE_PROPERTIES = {
+    "filename": "test", "date": "2024", "number_consecutive_scans": 0, "TDMS_HSFS_file_version": "1",
+    "FPGA_SW_version": "2", "instrument": "PSnex 1", "instrument_clorckrate_(Mhz)": "40",
+    "instrument_tick_time_(us)": "0.025", "instrument_model": "model", "instrument_scanner": "scanner",
+    "sample_name": "sample", "sample_species": "species", "user": "user", "tip_half_angle_(deg)": "17",
+    "tip_geometry": "cone", "tip_height_(m)": "1e-5", "tip_radius_(m)": "1e-8", "invOLS_(nm/V)": "50",
+    "system_mount_angle_(deg)": "0", "system_X_piezo_gain": "1", "system_X_piezo_sensitivity_(nm/V)": "10",
+    "system_Y_piezo_gain": "1", "system_Y_piezo_sensitivity_(nm/V)": "10", "mapping_(bool)": 0,
+    "cantilever_Acoefficient_GCI_(nN.s^1.3/m)": "1", "cantilever_model": "model", "cantilever_shape": "rectangular",
+    "cantilever_resonance_frequency_air_calib_(Hz)": "1e4", "cantilever_resonance_frequency_calib_(Hz)": "5e3",
+    "cantilever_spring_constant_calib_(N/m)": "0.1", "cantilever_spring_constant_nominal_(N/m)": "0.1",
+    "cantilever_quality_factor": "2", "system_Z_stage_piezo_sensitivity_(nm/V)": "1000", "time": "12.5"
+}
+
+def write_psnex_file(path, segments=(('App', 4000, 50), ('Con', 2000, 30), ('Ret', 4000, 50)), seed=0):
+    """
+    Write a synthetic PS_nex TDMS file. The data is written in several
+    TDMS segments, as done by the acquisition software.
+
+            Parameters:
+                    path (str): Path to the file.
+                    segments (tuple): Type, duration (thousands of ticks) and sampling rate (kS/s) of each segment.
+                    seed (int): Seed of the random data.
+
+            Returns:
+                    deflection (np.array): Data of the deflection channel.
+                    height (np.array): Data of the piezo channel.
+                    nb_points (list): Number of points of each segment.
+    """
+    rng = np.random.default_rng(seed)
+    properties = dict(FILE_PROPERTIES, number_segments=str(len(segments)))
+    nb_points = []
+    for segment_id, (segment_type, duration, sampling_rate) in enumerate(segments):
+        ticks, rate = duration * 1000, sampling_rate * 1000
+        nb_points.append(int(ticks * rate * 0.025e-6))
+        properties.update({
+            f"segment_{segment_id}_type": segment_type, f"segment_{segment_id}_dec_factor": "1",
+            f"segment_{segment_id}_duration_(ticks)": str(ticks), f"segment_{segment_id}_initial_deflection_(V)": "0.1",
+            f"segment_{segment_id}_nb": str(segment_id), f"segment_{segment_id}_nb_points_(points)": str(nb_points[-1]),
+            f"segment_{segment_id}_relative_setpoint_(bool)": 1, f"segment_{segment_id}_sampling_rate_(S/s)": str(rate),
+            f"segment_{segment_id}_setpoint_(V)": "0.5", f"segment_{segment_id}_setpoint_on_(bool)": 1,
+            f"segment_{segment_id}_setpoint_trigger_channel": "defl", f"segment_{segment_id}_velocity(V/tick)": "1e-6",
+            f"segment_{segment_id}_Z_position_setpoint_trigger_(V)": "1", f"segment_{segment_id}_zpiezo_control_out": "z",
+            f"segment_{segment_id}_Z_retract_length_(V)": "2"
+        })
+    # Some points are stored after the last segment.
+    total = sum(nb_points) + 100
+    deflection, height = rng.normal(size=total), rng.normal(size=total)
+    with TdmsWriter(path) as tdms_writer:
+        for chunk, (start, stop) in enumerate(((0, total // 3), (total // 3, 2 * total // 3), (2 * total // 3, total))):
+            objects = [
+                ChannelObject('Force Curve', 'Deflection (V)', deflection[start:stop]),
+                ChannelObject('Force Curve', 'Zpiezo stage (V)', height[start:stop])
+            ]
+            if chunk == 0:
+                objects = [RootObject(), GroupObject('Force Curve', properties=properties)] + objects
+            tdms_writer.write_segment(objects)
+    return deflection, height, nb_points
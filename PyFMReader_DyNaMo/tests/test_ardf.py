@@ -0,0 +1,103 @@
+# Unit tests for the ARDF readers, using synthetic ARDF files
+# (see ardf_testfile.py).
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from pyfmreader import loadfile
+from pyfmreader.ardf.ardf_index import ARDFIndex
+from pyfmreader.ardf.get_ardf_data import extract_ardf_data, extract_ardf_curve, extract_ardf_volume
+from pyfmreader.ardf.read_ardf import read_ardf_metadata
+
+from ardf_testfile import write_ardf_file
+
+class TestARDF(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.ARDF_PATH = os.path.join(self.tempdir, 'test.ARDF')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_ardf_index(self):
+        # The indexed reader returns the same data as extract_ardf_data.
+        for retrace in (False, True):
+            with self.subTest(retrace=retrace):
+                _, curves = write_ardf_file(self.ARDF_PATH, retrace=retrace)
+                file_struct = read_ardf_metadata(self.ARDF_PATH)
+                ardf_index = ARDFIndex(file_struct)
+                with open(self.ARDF_PATH, 'rb') as fid:
+                    for (line, point), (data, markers) in curves.items():
+                        # extract_ardf_data pads the curves with 0s to the longest curve of the line.
+                        expected = extract_ardf_data(self.ARDF_PATH, line, point, 1, file_struct)
+                        length = data.shape[1]
+                        np.testing.assert_array_equal(expected['y'][:length].T, data)
+                        self.assertFalse(expected['y'][length:].any())
+                        curve = extract_ardf_curve(fid, ardf_index, line, point)
+                        self.assertEqual(curve['y'].dtype, expected['y'].dtype)
+                        np.testing.assert_array_equal(curve['y'], expected['y'][:length])
+                        for marker, value in zip(('pnt0', 'pnt1', 'pnt2'), markers):
+                            self.assertEqual(curve[marker], expected[marker])
+                            self.assertEqual(curve[marker], value)
+
+    def test_ardf_getcurve_dtype(self):
+        # The curves are loaded as float64 by default.
+        write_ardf_file(self.ARDF_PATH)
+        force_curve = loadfile(self.ARDF_PATH).getcurve(0)
+        for _, segment in force_curve.get_segments():
+            for channel, values in segment.segment_formated_data.items():
+                self.assertEqual(values.dtype, np.float64, channel)
+
+    def test_ardf_volume(self):
+        # The whole-volume reader returns the same data as the indexed reader.
+        for retrace in (False, True):
+            with self.subTest(retrace=retrace):
+                _, curves = write_ardf_file(self.ARDF_PATH, retrace=retrace)
+                ardf_index = ARDFIndex(read_ardf_metadata(self.ARDF_PATH))
+                with open(self.ARDF_PATH, 'rb') as fid:
+                    volume = extract_ardf_volume(fid, ardf_index)
+                    self.assertEqual(volume['y'].dtype, np.float64)
+                    for (line, point), (data, markers) in curves.items():
+                        curve = extract_ardf_curve(fid, ardf_index, line, point)
+                        length = data.shape[1]
+                        self.assertEqual(volume['length'][line, point], length)
+                        np.testing.assert_array_equal(volume['y'][line, point, :length], curve['y'])
+                        self.assertFalse(volume['y'][line, point, length:].any())
+                        for marker, value in zip(('pnt0', 'pnt1', 'pnt2'), markers):
+                            self.assertEqual(volume[marker][line, point], value)
+
+    def test_ardf_volume_lines(self):
+        write_ardf_file(self.ARDF_PATH)
+        ardf_index = ARDFIndex(read_ardf_metadata(self.ARDF_PATH))
+        with open(self.ARDF_PATH, 'rb') as fid:
+            volume = extract_ardf_volume(fid, ardf_index)
+            lines = extract_ardf_volume(fid, ardf_index, get_lines=[3, 1])
+        np.testing.assert_array_equal(lines['lines'], [3, 1])
+        for position, line in enumerate(lines['lines']):
+            length = lines['length'][position]
+            np.testing.assert_array_equal(length, volume['length'][line])
+            for point in range(ardf_index.nb_points):
+                np.testing.assert_array_equal(
+                    lines['y'][position, point, :length[point]], volume['y'][line, point, :length[point]]
+                )
+
+    def test_ardf_getcurves(self):
+        write_ardf_file(self.ARDF_PATH)
+        afm_file = loadfile(self.ARDF_PATH)
+        nb_curves = afm_file.filemetadata['Entry_tot_nb_curve']
+        curveidxs = [nb_curves - 1, 0, 7, 12]
+        for curveidx, force_curve in zip(curveidxs, afm_file.getcurves(curveidxs)):
+            expected = afm_file.getcurve(curveidx)
+            self.assertEqual(force_curve.curve_index, expected.curve_index)
+            for (_, segment), (_, expected_segment) in zip(force_curve.get_segments(), expected.get_segments()):
+                self.assertEqual(segment.nb_point, expected_segment.nb_point)
+                for channel, values in expected_segment.segment_formated_data.items():
+                    self.assertEqual(segment.segment_formated_data[channel].dtype, values.dtype, channel)
+                    np.testing.assert_array_equal(segment.segment_formated_data[channel], values, err_msg=channel)
+
+if __name__ == '__main__':
+    unittest.main()
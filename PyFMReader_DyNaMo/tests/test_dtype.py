@@ -0,0 +1,111 @@
+# Unit tests for the dtype option of loadfile, checking that
+# every reader returns the curves data in the requested dtype.
+
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from pyfmreader import loadfile
+from pyfmreader.utils.segment import Segment
+
+from ardf_testfile import write_ardf_file
+from psnex_testfile import write_psnex_file
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+TESTFILES_DIR = os.path.join(TESTS_DIR, 'testfiles')
+IBW_FILES = sorted(glob.glob(os.path.join(TESTS_DIR, '..', 'src', 'pyfmreader', 'ardf', 'test', '*.ibw')))
+
+TEST_FILES = [
+    'map-data-2021.11.05-17.37.44.432.jpk-force-map',
+    '20200903_Egel2.0_00023.spm',
+    '20200904_Egel4-Z1.0_00025.spm'
+]
+
+class TestDtype(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assertCurveDtype(self, force_curve, expected, dtype=np.float32):
+        # The channels have the dtype and the values of the float64 curve, up to the float32 precision.
+        segments, expected_segments = force_curve.get_segments(), expected.get_segments()
+        self.assertEqual(len(segments), len(expected_segments))
+        for (_, segment), (_, expected_segment) in zip(segments, expected_segments):
+            self.assertEqual(list(segment.segment_formated_data), list(expected_segment.segment_formated_data))
+            for channel, values in expected_segment.segment_formated_data.items():
+                self.assertEqual(segment.segment_formated_data[channel].dtype, dtype, channel)
+                np.testing.assert_allclose(
+                    segment.segment_formated_data[channel], values,
+                    rtol=1e-6, atol=1e-6 * np.abs(values).max(initial=0), err_msg=channel
+                )
+
+    def test_dtype(self):
+        for file_name in TEST_FILES:
+            with self.subTest(file_name=file_name):
+                file_path = os.path.join(TESTFILES_DIR, file_name)
+                afm_file = loadfile(file_path)
+                float32_file = loadfile(file_path, dtype=np.float32)
+                expected = afm_file.getcurve(0)
+                for force_curve in (float32_file.getcurve(0), next(float32_file.iter_curves(indices=[0]))):
+                    self.assertCurveDtype(force_curve, expected)
+                    # The preprocessed channels keep the dtype.
+                    force_curve.preprocess_force_curve(
+                        float32_file.filemetadata['defl_sens_nmbyV'] / 1e9, float32_file.filemetadata['height_channel_key']
+                    )
+                    for _, segment in force_curve.get_segments():
+                        self.assertEqual(segment.vdeflection.dtype, np.float32)
+                        self.assertEqual(segment.zheight.dtype, np.float32)
+                        self.assertEqual(segment.time.dtype, np.float32)
+                # The dtype given to getcurve overrides the dtype of the file.
+                self.assertCurveDtype(afm_file.getcurve(0, dtype=np.float32), expected)
+                self.assertCurveDtype(float32_file.getcurve(0, dtype=np.float64), expected, np.float64)
+                if afm_file.isFV:
+                    self.assertEqual(float32_file.getpiezoimg().dtype, np.float32)
+                # The cache stores the data with the dtype.
+                loadfile(file_path, cache=self.tempdir, dtype=np.float32)
+                cached_file = loadfile(file_path, cache=self.tempdir, dtype=np.float32)
+                self.assertIsNotNone(cached_file._uffzdata)
+                self.assertCurveDtype(cached_file.getcurve(0), expected)
+                self.assertCurveDtype(cached_file.getcurve(0, dtype=np.float64), expected, np.float64)
+
+    def test_ardf_dtype(self):
+        file_path = os.path.join(self.tempdir, 'test.ARDF')
+        write_ardf_file(file_path)
+        afm_file = loadfile(file_path)
+        float32_file = loadfile(file_path, dtype=np.float32)
+        curve_indices = [0, 7, 19]
+        for force_curve, expected in zip(float32_file.getcurves(curve_indices), afm_file.getcurves(curve_indices)):
+            self.assertCurveDtype(force_curve, expected)
+            self.assertCurveDtype(float32_file.getcurve(force_curve.curve_index), expected)
+
+    def test_ibw_dtype(self):
+        for file_path in IBW_FILES:
+            with self.subTest(file_name=os.path.basename(file_path)):
+                self.assertCurveDtype(loadfile(file_path, dtype=np.float32).getcurve(0), loadfile(file_path).getcurve(0))
+
+    def test_psnex_dtype(self):
+        file_path = os.path.join(self.tempdir, 'test.tdms')
+        write_psnex_file(file_path)
+        self.assertCurveDtype(loadfile(file_path, dtype=np.float32).getcurve(0), loadfile(file_path).getcurve(0))
+
+    def test_preprocess_time_dtype(self):
+        # The time axis computed from the sampling rate has the dtype of the deflection.
+        segment = Segment('test', 0, 'Approach')
+        segment.segment_formated_data = {
+            'height': np.linspace(0, 1, 8, dtype=np.float32), 'vDeflection': np.linspace(1, 2, 8, dtype=np.float32)
+        }
+        segment.nb_point = 8
+        segment.sampling_rate = 1e-3
+        segment.preprocess_segment(np.float32(5e-8), 'height')
+        self.assertEqual(segment.time.dtype, np.float32)
+        self.assertEqual(len(segment.time), 8)
+        self.assertEqual(segment.vdeflection.dtype, np.float32)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# Unit tests for the ForceCurve and Segment classes.
+
+import pickle
+import unittest
+
+import numpy as np
+from pyfmreader.utils.forcecurve import ForceCurve
+from pyfmreader.utils.segment import Segment, get_time_axis
+
+def make_segment(segment_id, segment_type, nb_point=4):
+    segment = Segment('test', segment_id, segment_type)
+    segment.segment_formated_data = {
+        'height': np.linspace(0, 1, nb_point), 'vDeflection': np.linspace(1, 2, nb_point)
+    }
+    segment.nb_point = nb_point
+    return segment
+
+class TestForceCurve(unittest.TestCase):
+
+    def test_get_segments(self):
+        force_curve = ForceCurve(0, 'test')
+        approach, pause, retract = make_segment(0, 'Approach'), make_segment(1, 'Pause'), make_segment(2, 'Retract')
+        force_curve.retract_segments.append((2, retract))
+        force_curve.extend_segments.append((0, approach))
+        force_curve.pause_segments.append((1, pause))
+        self.assertEqual(force_curve.get_segments(), [(0, approach), (1, pause), (2, retract)])
+        # The segments changed in place are returned.
+        new_retract = make_segment(2, 'Retract')
+        force_curve.retract_segments[0] = (2, new_retract)
+        self.assertIs(force_curve.get_segments()[-1][1], new_retract)
+        force_curve.pause_segments = []
+        self.assertEqual(force_curve.get_segments(), [(0, approach), (2, new_retract)])
+
+    def test_pickle(self):
+        force_curve = ForceCurve(3, 'test')
+        force_curve.extend_segments.append((0, make_segment(0, 'Approach')))
+        unpickled = pickle.loads(pickle.dumps(force_curve))
+        self.assertEqual(unpickled.curve_index, 3)
+        (segment_id, segment), = unpickled.get_segments()
+        self.assertEqual(segment_id, 0)
+        self.assertEqual(segment.segment_code, 'AP')
+        np.testing.assert_array_equal(segment.segment_formated_data['height'], np.linspace(0, 1, 4))
+
+class TestTimeAxis(unittest.TestCase):
+
+    def test_get_time_axis(self):
+        time = get_time_axis(1.0, 4)
+        np.testing.assert_array_equal(time, [0, 0.25, 0.5, 0.75])
+        self.assertFalse(time.flags.writeable)
+        # The axis is shared by the segments with the same duration and number of points.
+        self.assertIs(get_time_axis(1.0, 4), time)
+        self.assertEqual(get_time_axis(1.0, 4, np.float32).dtype, np.float32)
+
+if __name__ == '__main__':
+    unittest.main()
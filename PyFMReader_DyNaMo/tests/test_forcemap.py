@@ -0,0 +1,77 @@
+# Unit tests for the ForceMap container.
+
+import os
+import unittest
+
+import numpy as np
+from pyfmreader import loadfile
+from pyfmreader.utils.forcecurve import ForceCurve
+from pyfmreader.utils.forcemap import ForceMap
+from pyfmreader.utils.segment import Segment
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+
+def make_force_curve(curve_index, height_length, deflection_length):
+    force_curve = ForceCurve(curve_index, 'test')
+    segment = Segment('test', '0', 'Approach')
+    segment.segment_formated_data = {
+        'height': np.arange(height_length, dtype=np.float64) + 10 * curve_index,
+        'vDeflection': np.arange(deflection_length, dtype=np.float64) + 100 * curve_index
+    }
+    segment.nb_point = deflection_length
+    force_curve.extend_segments.append((0, segment))
+    return force_curve
+
+class TestForceMap(unittest.TestCase):
+
+    def test_channels_with_different_lengths(self):
+        # The piezo and deflection channels of ARDF curves can have different lengths.
+        force_curves = [make_force_curve(0, 3, 5), make_force_curve(1, 4, 2), make_force_curve(2, 3, 5)]
+        force_map = ForceMap('test', force_curves)
+        stack = force_map.segments['0']
+        for position, force_curve in enumerate(force_curves):
+            expected = force_curve.extend_segments[0][1].segment_formated_data
+            for channel in ('height', 'vDeflection'):
+                np.testing.assert_array_equal(stack.get_channel(channel, position), expected[channel])
+                np.testing.assert_array_equal(
+                    force_map.get_curve(position).extend_segments[0][1].segment_formated_data[channel], expected[channel]
+                )
+        padded = stack.get_padded('height')
+        self.assertEqual(padded.shape, (3, 4))
+        np.testing.assert_array_equal(padded[0], [0, 1, 2, np.nan])
+        self.assertEqual(stack.get_padded('vDeflection').shape, (3, 5))
+
+    def test_missing_channels(self):
+        # The curves only get the channels their segments had.
+        force_curves = [make_force_curve(0, 3, 3), make_force_curve(1, 2, 2)]
+        del force_curves[1].extend_segments[0][1].segment_formated_data['height']
+        force_map = ForceMap('test', force_curves)
+        segment_channels = lambda position: list(force_map.get_curve(position).extend_segments[0][1].segment_formated_data)
+        self.assertEqual(segment_channels(0), ['height', 'vDeflection'])
+        self.assertEqual(segment_channels(1), ['vDeflection'])
+        padded = force_map.segments['0'].get_padded('height')
+        self.assertTrue(np.isnan(padded[1]).all())
+
+    def test_getforcemap(self):
+        # The curves of the map keep the segment keys and ids of the original curves ('0' or 0).
+        for file_name in ('map-data-2021.11.05-17.37.44.432.jpk-force-map', '20200903_Egel2.0_00023.spm'):
+            with self.subTest(file_name=file_name):
+                afm_file = loadfile(os.path.join(TESTFILES_DIR, file_name))
+                force_map = afm_file.getforcemap()
+                self.assertEqual(len(force_map), afm_file.filemetadata['Entry_tot_nb_curve'])
+                for position in (0, 7, len(force_map) - 1):
+                    force_curve, expected = force_map.get_curve(position), afm_file.getcurve(position)
+                    segments, expected_segments = force_curve.get_segments(), expected.get_segments()
+                    self.assertEqual(
+                        [segment_id for segment_id, _ in segments], [segment_id for segment_id, _ in expected_segments]
+                    )
+                    for (segment_id, segment), (expected_segment_id, expected_segment) in zip(segments, expected_segments):
+                        self.assertIs(type(segment_id), type(expected_segment_id))
+                        self.assertEqual(segment.segment_id, expected_segment.segment_id)
+                        self.assertIs(type(segment.segment_id), type(expected_segment.segment_id))
+                        self.assertEqual(list(segment.segment_formated_data), list(expected_segment.segment_formated_data))
+                        for channel, values in expected_segment.segment_formated_data.items():
+                            np.testing.assert_array_equal(segment.segment_formated_data[channel], values)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+# Unit tests for the ibw reader, using the ibw files of the ardf test folder.
+
+import glob
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+from pyfmreader import loadfile
+from pyfmreader.ardf import loadibwcurve
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+IBW_FILES = sorted(glob.glob(os.path.join(TESTS_DIR, '..', 'src', 'pyfmreader', 'ardf', 'test', '*.ibw')))
+
+class TestIBW(unittest.TestCase):
+
+    def test_ibw_parsed_once(self):
+        for file_path in IBW_FILES:
+            with self.subTest(file_name=os.path.basename(file_path)):
+                afm_file = loadfile(file_path)
+                # getcurve reuses the channels decoded by loadfile.
+                with mock.patch.object(loadibwcurve, 'load_igor', side_effect=AssertionError('file parsed again')):
+                    force_curves = [afm_file.getcurve(0), afm_file.getcurve(0)]
+                # The curves are the same as the ones loaded parsing the file.
+                expected = loadibwcurve.loadIBWcurve(afm_file.filemetadata)
+                for force_curve in force_curves:
+                    segments, expected_segments = force_curve.get_segments(), expected.get_segments()
+                    self.assertEqual([segid for segid, _ in segments], ['0', '1'])
+                    for (_, segment), (_, expected_segment) in zip(segments, expected_segments):
+                        self.assertEqual(segment.nb_point, expected_segment.nb_point)
+                        for channel, values in expected_segment.segment_formated_data.items():
+                            np.testing.assert_array_equal(segment.segment_formated_data[channel], values, err_msg=channel)
+                # The channels are read-only views of the decoded channels shared by the curves.
+                for channel in ('height', 'vDeflection', 'time'):
+                    first, second = (fc.extend_segments[0][1].segment_formated_data[channel] for fc in force_curves)
+                    self.assertTrue(np.shares_memory(first, second), channel)
+                    self.assertFalse(first.flags.writeable, channel)
+
+if __name__ == '__main__':
+    unittest.main()
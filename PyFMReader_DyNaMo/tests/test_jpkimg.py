@@ -0,0 +1,93 @@
+# Unit tests for the JPK image data.
+
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import numpy as np
+import tifffile
+from pyfmreader import loadfile
+from pyfmreader.jpk import jpkindex
+from pyfmreader.jpk.jpkindex import JPKMember, readJPKmember
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+
+class TestJPKImageData(unittest.TestCase):
+
+    def setUp(self):
+        self.JPK_FV_PATH = os.path.join(TESTFILES_DIR, 'map-data-2021.11.05-17.37.44.432.jpk-force-map')
+        self.JPK_FV_FILE = loadfile(self.JPK_FV_PATH)
+
+    def get_expected_images(self, imagedata):
+        # Decode the channels from the whole data-image member.
+        with zipfile.ZipFile(self.JPK_FV_PATH) as afm_file:
+            contents = afm_file.read('data-image.force')
+        with tifffile.TiffFile(io.BytesIO(contents)) as tif:
+            return {
+                channel: tif.pages[page_index].asarray() * mult + offset
+                for channel, (page_index, mult, offset) in imagedata.channels.items()
+            }
+
+    def test_image_channels(self):
+        imagedata = self.JPK_FV_FILE.imagedata
+        self.assertIn('Height(measured)', imagedata)
+        expected = self.get_expected_images(imagedata)
+        for channel, image in imagedata.items():
+            self.assertEqual(image.shape, (4, 4), channel)
+            self.assertEqual(image.dtype, np.float64, channel)
+            np.testing.assert_array_equal(image, expected[channel], err_msg=channel)
+        self.assertEqual(imagedata.get_channel('Height', np.float32).dtype, np.float32)
+
+    def test_image_channels_without_layout(self):
+        # Channels whose data is not stored contiguously are decoded with tifffile.
+        imagedata = self.JPK_FV_FILE.imagedata
+        expected = self.get_expected_images(imagedata)
+        imagedata.layouts = {}
+        for channel, image in imagedata.items():
+            np.testing.assert_array_equal(image, expected[channel], err_msg=channel)
+
+    def test_image_data_pickle(self):
+        imagedata = self.JPK_FV_FILE.imagedata
+        image = imagedata['Height(measured)']
+        unpickled = pickle.loads(pickle.dumps(imagedata))
+        self.assertEqual(len(unpickled._cache), 0)
+        np.testing.assert_array_equal(unpickled['Height(measured)'], image)
+
+class TestReadJPKMember(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.contents = np.arange(50000, dtype='>i4').tobytes()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_read_member_span(self):
+        file_path = os.path.join(self.tempdir, 'test.zip')
+        with zipfile.ZipFile(file_path, 'w') as zip_file:
+            zip_file.writestr('stored', self.contents, zipfile.ZIP_STORED)
+            zip_file.writestr('deflated', self.contents, zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(file_path) as zip_file:
+            members = [
+                JPKMember(info.header_offset, info.compress_size, info.file_size, info.compress_type)
+                for info in zip_file.infolist()
+            ]
+        # Read the compressed member in several chunks.
+        read_chunk_size = jpkindex._read_chunk_size
+        jpkindex._read_chunk_size = 4096
+        try:
+            with open(file_path, 'rb') as afm_file:
+                for member in members:
+                    for start, stop in ((0, 10), (12345, 123456), (len(self.contents) - 8, len(self.contents) + 8)):
+                        self.assertEqual(
+                            readJPKmember(afm_file, member, span=(start, stop)), self.contents[start:stop]
+                        )
+        finally:
+            jpkindex._read_chunk_size = read_chunk_size
+
+if __name__ == '__main__':
+    unittest.main()
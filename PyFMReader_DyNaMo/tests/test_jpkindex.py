@@ -0,0 +1,102 @@
+# Unit tests for the index of the segment members of JPK files.
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import numpy as np
+from pyfmreader import loadfile
+from pyfmreader.jpk.jpkindex import JPKMember, buildJPKindex, readJPKmember
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+JPK_FORCE_MAP = os.path.join(TESTFILES_DIR, 'map-data-2021.11.05-17.37.44.432.jpk-force-map')
+
+def member_name(curve_index, segment_id, channel_name):
+    # Path of a member of a curve of a force map.
+    if channel_name == 'segment-header':
+        return f'index/{curve_index}/segments/{segment_id}/segment-header.properties'
+    return f'index/{curve_index}/segments/{segment_id}/channels/{channel_name}.dat'
+
+class TestJPKIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_jpk_index(self):
+        afm_file = loadfile(JPK_FORCE_MAP)
+        jpk_index = afm_file._jpkindex
+        self.assertEqual(sorted(jpk_index.channels), ['height', 'measuredHeight', 'vDeflection'])
+        # The members are sorted by curve, segment and channel.
+        members = jpk_index.members
+        keys = list(zip(members['curve'].tolist(), members['segment'].tolist(), members['channel'].tolist()))
+        self.assertEqual(keys, sorted(keys))
+        with zipfile.ZipFile(JPK_FORCE_MAP) as zip_file, open(JPK_FORCE_MAP, 'rb') as raw_file:
+            names = [name for name in zip_file.namelist() if name.startswith('index/') and not name.endswith('/')]
+            # Only the segment members are indexed.
+            self.assertEqual(len(members), len([name for name in names if '/segments/' in name]))
+            for curve_index in (0, 1, afm_file.filemetadata['Entry_tot_nb_curve'] - 1):
+                segments = jpk_index.get_curve_segments(curve_index)
+                headers = jpk_index.get_curve_segments(curve_index, headers=True)
+                prefix = f'index/{curve_index}/segments/'
+                segment_ids = sorted({int(name[len(prefix):].split('/')[0]) for name in names if name.startswith(prefix)})
+                self.assertEqual(list(segments), segment_ids)
+                self.assertEqual(list(headers), segment_ids)
+                for segment_id, channels in segments.items():
+                    for channel_name, member in channels.items():
+                        name = member_name(curve_index, segment_id, channel_name)
+                        self.assertEqual(readJPKmember(raw_file, member), zip_file.read(name))
+                        self.assertEqual(readJPKmember(raw_file, member, tail=4), zip_file.read(name)[-4:])
+                        self.assertEqual(jpk_index.get_member(curve_index, segment_id, channel_name), member)
+                    name = member_name(curve_index, segment_id, 'segment-header')
+                    self.assertEqual(readJPKmember(raw_file, headers[segment_id]), zip_file.read(name))
+                    self.assertEqual(jpk_index.get_member(curve_index, segment_id, 'segment-header'), headers[segment_id])
+        # Missing members are not found.
+        self.assertIsNone(jpk_index.get_member(0, 0, 'missingChannel'))
+        self.assertIsNone(jpk_index.get_member(0, 100, 'vDeflection'))
+
+    def test_jpk_force_paths(self):
+        # Single curve files store the segments at the root of the archive.
+        # The segments are sorted as numbers and each segment keeps its own channels.
+        file_path = os.path.join(self.tempdir, 'test.jpk-force')
+        contents = {}
+        with zipfile.ZipFile(file_path, 'w') as zip_file:
+            zip_file.writestr('header.properties', b'')
+            zip_file.writestr('segments/', b'')
+            for segment_id in range(12):
+                channels = ['vDeflection', 'height'] if segment_id % 2 else ['height']
+                zip_file.writestr(f'segments/{segment_id}/segment-header.properties', b'segment %d' % segment_id)
+                for channel_name in channels:
+                    name = f'segments/{segment_id}/channels/{channel_name}.dat'
+                    contents[name] = np.arange(segment_id + 1, dtype='>i4').tobytes()
+                    zip_file.writestr(name, contents[name], zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(file_path) as zip_file:
+            jpk_index = buildJPKindex(zip_file, {'channel_properties': {}, 'Entry_tot_nb_curve': 1})
+        self.assertEqual(jpk_index.channels, ['height', 'vDeflection'])
+        self.assertEqual(jpk_index.dtypes, [np.dtype('>i4')] * 2)
+        segments = jpk_index.get_curve_segments(0)
+        self.assertEqual(list(segments), list(range(12)))
+        with open(file_path, 'rb') as raw_file:
+            for segment_id, channels in segments.items():
+                self.assertEqual(sorted(channels), ['height', 'vDeflection'] if segment_id % 2 else ['height'])
+                for channel_name, member in channels.items():
+                    self.assertIsInstance(member, JPKMember)
+                    name = f'segments/{segment_id}/channels/{channel_name}.dat'
+                    self.assertEqual(readJPKmember(raw_file, member), contents[name])
+            header = jpk_index.get_member(0, 11, 'segment-header')
+            self.assertEqual(readJPKmember(raw_file, header), b'segment 11')
+        self.assertIsNone(jpk_index.get_member(0, 0, 'vDeflection'))
+
+    def test_pickle(self):
+        jpk_index = loadfile(JPK_FORCE_MAP)._jpkindex
+        unpickled = pickle.loads(pickle.dumps(jpk_index))
+        np.testing.assert_array_equal(unpickled.members, jpk_index.members)
+        self.assertEqual(unpickled.get_curve_segments(3), jpk_index.get_curve_segments(3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# Unit tests for the txt UFF loader.
+
+import os
+import unittest
+from pyfmreader import loadfile
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+
+class TestLoadUFF(unittest.TestCase):
+
+    def setUp(self):
+        # The file ends with a **** terminator line.
+        UFF_PATH = os.path.join(TESTFILES_DIR, '20200904_Egel4-Z1.0_00025.uff')
+        self.UFF_FILE = loadfile(UFF_PATH)
+
+    def test_load_UFF_header(self):
+        metadata = self.UFF_FILE.filemetadata
+        self.assertEqual(metadata.get('Entry_filename', None), '20200904_Egel4-Z1.0_00025.spm')
+        self.assertEqual(metadata.get('file_type', None), '.uff')
+        self.assertEqual(metadata.get('Recording_number_segment', None), 2)
+
+    def test_load_UFF_curve(self):
+        force_curve = self.UFF_FILE.getcurve(0)
+        segments = force_curve.get_segments()
+        self.assertEqual([segment_id for segment_id, _ in segments], [0, 1])
+        approach = segments[0][1]
+        self.assertEqual(approach.segment_type, 'Approach')
+        self.assertEqual(approach.nb_point, 1024)
+        self.assertEqual(len(approach.segment_formated_data['Displacement']), 1024)
+        self.assertEqual(approach.segment_formated_data['Deflection'][0], 1.599)
+        self.assertEqual(approach.segment_formated_data['Deflection'][-1], 0.321)
+        retract = segments[1][1]
+        self.assertEqual(retract.segment_type, 'Retract')
+        self.assertEqual(retract.nb_point, 1024)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Unit tests for the NANOSCOPE header parser.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyfmreader.nanosc.parsenanoscheader import parseNANOSCheader
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+FV_FILE = os.path.join(TESTFILES_DIR, '20200903_Egel2.0_00023.spm')
+FC_FILE = os.path.join(TESTFILES_DIR, '20200904_Egel4-Z1.0_00025.spm')
+
+# Fields of the header that describe the file the data is read from.
+FILE_FIELDS = ('file_path', 'Entry_filename', 'file_size_bytes')
+
+HEADER_END = '\\*File list end'
+
+class TestNANOSCheader(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        with open(FC_FILE, 'rb') as afmfile:
+            content = afmfile.read()
+        end = content.index(HEADER_END.encode('latin_1'))
+        end = content.index(b'\n', end) + 1
+        self.header_lines = content[:end].decode('latin_1').splitlines(keepends=True)
+        self.data = content[end:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write_file(self, header_lines, data=b''):
+        filepath = os.path.join(self.tempdir, 'test.spm')
+        with open(filepath, 'wb') as afmfile:
+            afmfile.write(''.join(header_lines).encode('latin_1'))
+            afmfile.write(data)
+        return filepath
+
+    def insert_lines(self, key, lines, after=False):
+        # Insert lines before (or after) the first header line starting with key.
+        position = next(idx for idx, line in enumerate(self.header_lines) if line.startswith(key))
+        position += after
+        return self.header_lines[:position] + lines + self.header_lines[position:]
+
+    def assertSameHeader(self, header, expected):
+        for field in FILE_FIELDS:
+            header.pop(field), expected.pop(field)
+        self.assertEqual(header, expected)
+
+    def test_parse_header(self):
+        header = parseNANOSCheader(FV_FILE)
+        self.assertEqual(header['Entry_filename'], '20200903_Egel2.0_00023.spm')
+        self.assertEqual(header['file_type'], 'spm')
+        self.assertEqual(header['force_volume'], 1)
+        self.assertEqual(header['peakforce'], 0)
+        self.assertEqual(header['zscan_sens_nmbyV'], 13.203)
+        self.assertEqual(header['defl_sens_nmbyV'], 27.39)
+        self.assertEqual(header['defl_sens_Vbybyte'], 0.000375)
+        self.assertEqual(header['spring_const_Nbym'], 0.1332)
+        self.assertEqual((header['nb_point_approach'], header['nb_point_retract']), (1024, 1024))
+        self.assertEqual(header['data_offset'], 80960)
+        self.assertEqual(header['FDC_data_length'], 2097152)
+        self.assertEqual((header['FV_nb_sampsline'], header['FV_nb_lines']), (16, 16))
+        self.assertEqual(header['Entry_tot_nb_curve'], 256)
+        self.assertEqual(header['FV_ima_offset'], 2178112)
+        self.assertEqual((header['scan_size_x'], header['scan_size_y']), (2e-06, 2e-06))
+        self.assertEqual(header['ramp_size_nm'], 2000.0)
+        self.assertEqual(header['zstep_approach_nm'], 1.953125)
+
+        header = parseNANOSCheader(FC_FILE)
+        self.assertEqual(header['force_volume'], 0)
+        self.assertEqual(header['Entry_tot_nb_curve'], 1)
+        self.assertEqual(header['ramp_size_nm'], 3000.0)
+        self.assertEqual(header['FDC_data_length'], 8192)
+        self.assertNotIn('FV_ima_offset', header)
+
+    def test_header_end(self):
+        # The lines after the end of the header are not parsed.
+        expected = parseNANOSCheader(FC_FILE)
+        filepath = self.write_file(self.header_lines, self.data + b''.join([
+            b'\\*Ciao force image list\r\n', b'\\Data offset: 1\r\n', b'\\@Sens. Zsens: V 1.0 nm/V\r\n',
+            b'\\Version: not a header line\r\n', b'\\Scan Size: not a number\r\n', bytes(range(256))
+        ]))
+        self.assertSameHeader(parseNANOSCheader(filepath), expected)
+
+    def test_zsens_precedence(self):
+        # Zsens is used over Zscan, wherever the lines are found.
+        expected = parseNANOSCheader(FC_FILE)
+        for after in (False, True):
+            with self.subTest(after=after):
+                header_lines = self.insert_lines('\\@Sens. Zsens', ['\\@Sens. Zscan: V 99.00000 nm/V\r\n'], after)
+                self.assertSameHeader(parseNANOSCheader(self.write_file(header_lines, self.data)), dict(expected))
+        # Without Zsens, Zscan is used.
+        header_lines = [
+            '\\@Sens. Zscan: V 99.00000 nm/V\r\n' if line.startswith('\\@Sens. Zsens:') else line
+            for line in self.header_lines
+        ]
+        self.assertEqual(parseNANOSCheader(self.write_file(header_lines, self.data))['zscan_sens_nmbyV'], 99.0)
+
+    def test_first_data_offset(self):
+        # Only the data offset of the first force image is used.
+        header_lines = self.insert_lines(HEADER_END, ['\\*Ciao force image list\r\n', '\\Data offset: 12345\r\n'])
+        self.assertEqual(parseNANOSCheader(self.write_file(header_lines, self.data))['data_offset'], 80960)
+
+    def test_list_keys(self):
+        # The keys are only handled in the list they belong to.
+        header_lines = self.insert_lines('\\*Ciao force list', ['\\Data offset: 12345\r\n'])
+        self.assertEqual(parseNANOSCheader(self.write_file(header_lines, self.data))['data_offset'], 80960)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# Unit tests for the PS_nex reader, using synthetic TDMS files
+# (see psnex_testfile.py).
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from pyfmreader import loadfile
+
+from psnex_testfile import write_psnex_file
+
+class TestPSNEX(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.PSNEX_PATH = os.path.join(self.tempdir, 'test.tdms')
+        self.deflection, self.height, self.nb_points = write_psnex_file(self.PSNEX_PATH)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_load_PSNEX_curve(self):
+        # Each segment reads its range of the data channels.
+        force_curve = loadfile(self.PSNEX_PATH).getcurve(0)
+        segments = force_curve.get_segments()
+        self.assertEqual([segment_id for segment_id, _ in segments], [0, 1, 2])
+        start = 0
+        for (_, segment), nb_points in zip(segments, self.nb_points):
+            self.assertEqual(segment.nb_point, nb_points)
+            data = segment.segment_formated_data
+            np.testing.assert_array_equal(data['vDeflection'], self.deflection[start:start + nb_points])
+            np.testing.assert_array_equal(data['Zpiezo stage (V)'], self.height[start:start + nb_points])
+            self.assertEqual(len(data['time']), nb_points)
+            start += nb_points
+
+    def test_PSNEX_file_handle(self):
+        # The TDMS file is only kept open during a reader session.
+        afm_file = loadfile(self.PSNEX_PATH)
+        self.assertIsNone(afm_file._tdmsfile)
+        expected = afm_file.getcurve(0)
+        self.assertIsNone(afm_file._tdmsfile)
+        with afm_file:
+            self.assertIsNotNone(afm_file._tdmsfile)
+            with afm_file:
+                force_curve = afm_file.getcurve(0)
+            self.assertIsNotNone(afm_file._tdmsfile)
+        self.assertIsNone(afm_file._tdmsfile)
+        for (_, segment), (_, expected_segment) in zip(force_curve.get_segments(), expected.get_segments()):
+            np.testing.assert_array_equal(
+                segment.segment_formated_data['vDeflection'], expected_segment.segment_formated_data['vDeflection']
+            )
+        # The session is not pickled.
+        with afm_file:
+            unpickled = pickle.loads(pickle.dumps(afm_file))
+        self.assertIsNone(unpickled._tdmsfile)
+        self.assertEqual(len(list(unpickled.iter_curves())), 1)
+        self.assertIsNone(unpickled._tdmsfile)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# Unit tests for the curve loaders of the UFF class,
+# comparing the bulk loaders with UFF.getcurve.
+
+import os
+import unittest
+
+import numpy as np
+from pyfmreader import loadfile
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+
+TEST_FILES = [
+    'map-data-2021.11.05-17.37.44.432.jpk-force-map',
+    '20200903_Egel2.0_00023.spm',
+    '20200904_Egel4-Z1.0_00025.spm'
+]
+
+class TestUFF(unittest.TestCase):
+
+    def assertSameCurve(self, force_curve, expected):
+        self.assertEqual(force_curve.curve_index, expected.curve_index)
+        self.assertEqual(force_curve.z_at_setpoint, expected.z_at_setpoint)
+        for group in ('extend_segments', 'retract_segments', 'pause_segments', 'modulation_segments'):
+            segments, expected_segments = getattr(force_curve, group), getattr(expected, group)
+            self.assertEqual([segid for segid, _ in segments], [segid for segid, _ in expected_segments], group)
+            for (_, segment), (_, expected_segment) in zip(segments, expected_segments):
+                self.assertEqual(segment.segment_id, expected_segment.segment_id)
+                self.assertEqual(segment.nb_point, expected_segment.nb_point)
+                self.assertEqual(list(segment.segment_formated_data), list(expected_segment.segment_formated_data))
+                for channel, values in expected_segment.segment_formated_data.items():
+                    self.assertEqual(segment.segment_formated_data[channel].dtype, values.dtype, channel)
+                    np.testing.assert_array_equal(segment.segment_formated_data[channel], values, err_msg=channel)
+
+    def test_getcurves(self):
+        for file_name in TEST_FILES:
+            with self.subTest(file_name=file_name):
+                afm_file = loadfile(os.path.join(TESTFILES_DIR, file_name))
+                nb_curves = afm_file.filemetadata['Entry_tot_nb_curve'] if afm_file.isFV else 1
+                # The curves are returned in the requested order.
+                curveidxs = sorted({nb_curves - 1, 0, nb_curves // 2}, reverse=True)
+                force_curves = afm_file.getcurves(curveidxs, max_workers=2)
+                self.assertEqual(len(force_curves), len(curveidxs))
+                for curveidx, force_curve in zip(curveidxs, force_curves):
+                    self.assertSameCurve(force_curve, afm_file.getcurve(curveidx))
+
+    def test_iter_curves(self):
+        for file_name in TEST_FILES:
+            with self.subTest(file_name=file_name):
+                afm_file = loadfile(os.path.join(TESTFILES_DIR, file_name))
+                nb_curves = afm_file.filemetadata['Entry_tot_nb_curve'] if afm_file.isFV else 1
+                force_curves = list(afm_file.iter_curves(chunk=7))
+                self.assertEqual(len(force_curves), nb_curves)
+                for curveidx, force_curve in enumerate(force_curves):
+                    self.assertSameCurve(force_curve, afm_file.getcurve(curveidx))
+                # Only the requested curves are loaded, in order.
+                indices = [nb_curves - 1, 0]
+                self.assertEqual([fc.curve_index for fc in afm_file.iter_curves(indices, chunk=1)], [
+                    afm_file.getcurve(curveidx).curve_index for curveidx in indices
+                ])
+                # The file is closed once the iteration ends.
+                self.assertIsNone(afm_file._filehandle)
+
+if __name__ == '__main__':
+    unittest.main()
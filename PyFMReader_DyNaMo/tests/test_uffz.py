@@ -0,0 +1,115 @@
+# Unit tests for the binary UFF container (.uffz)
+# and the loadfile cache.
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections.abc import Mapping
+
+import numpy as np
+from pyfmreader import loadfile
+from pyfmreader.uffcache import saveUFFcache
+
+TESTFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles')
+
+TEST_FILES = [
+    'map-data-2021.11.05-17.37.44.432.jpk-force-map',
+    '20200903_Egel2.0_00023.spm',
+    '20200904_Egel4-Z1.0_00025.spm'
+]
+
+# Fields of the file metadata that describe the file the data is read from.
+FILE_FIELDS = ('file_path', 'file_size_bytes', 'source_file_path', 'cache_path')
+
+class TestUFFZ(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assertSameValue(self, value, expected, path='value'):
+        # Compare the values and their types, recursively.
+        if isinstance(expected, Mapping):
+            self.assertIsInstance(value, Mapping, path)
+            self.assertEqual(list(value.keys()), list(expected.keys()), path)
+            for key in expected:
+                self.assertSameValue(value[key], expected[key], f"{path}[{key!r}]")
+        elif isinstance(expected, (list, tuple)):
+            self.assertIs(type(value), type(expected), path)
+            self.assertEqual(len(value), len(expected), path)
+            for idx, (item, expected_item) in enumerate(zip(value, expected)):
+                self.assertSameValue(item, expected_item, f"{path}[{idx}]")
+        elif isinstance(expected, np.ndarray):
+            self.assertEqual(np.asarray(value).dtype, expected.dtype, path)
+            np.testing.assert_array_equal(value, expected, err_msg=path)
+        elif isinstance(expected, float) and np.isnan(expected):
+            self.assertIs(type(value), type(expected), path)
+            self.assertTrue(np.isnan(value), path)
+        else:
+            self.assertIs(type(value), type(expected), path)
+            self.assertEqual(value, expected, path)
+
+    def assertSameCurve(self, force_curve, expected):
+        self.assertEqual(force_curve.curve_index, expected.curve_index)
+        for group in ('extend_segments', 'retract_segments', 'pause_segments', 'modulation_segments'):
+            segments, expected_segments = getattr(force_curve, group), getattr(expected, group)
+            self.assertEqual(len(segments), len(expected_segments), group)
+            for (segid, segment), (expected_segid, expected_segment) in zip(segments, expected_segments):
+                self.assertSameValue(segid, expected_segid, 'segment key')
+                self.assertSameValue(segment.segment_id, expected_segment.segment_id, 'segment_id')
+                self.assertEqual(segment.segment_type, expected_segment.segment_type)
+                self.assertEqual(segment.nb_point, expected_segment.nb_point)
+                self.assertSameValue(segment.segment_metadata, expected_segment.segment_metadata, 'segment_metadata')
+                self.assertEqual(list(segment.segment_formated_data), list(expected_segment.segment_formated_data))
+                for channel, values in expected_segment.segment_formated_data.items():
+                    np.testing.assert_array_equal(segment.segment_formated_data[channel], values, err_msg=channel)
+
+    def assertSameMetadata(self, filemetadata, expected):
+        for key, value in expected.items():
+            if key in FILE_FIELDS:
+                continue
+            self.assertIn(key, filemetadata)
+            self.assertSameValue(filemetadata[key], value, f"filemetadata[{key!r}]")
+
+    def test_uffz_round_trip(self):
+        for file_name in TEST_FILES:
+            with self.subTest(file_name=file_name):
+                afm_file = loadfile(os.path.join(TESTFILES_DIR, file_name))
+                uffz_path = os.path.join(self.tempdir, file_name + '.uffz')
+                afm_file.to_uffz(uffz_path)
+                uffz_file = loadfile(uffz_path)
+                self.assertEqual(uffz_file._uffzdata.header['skipped_fields'], [])
+                self.assertSameMetadata(uffz_file.filemetadata, afm_file.filemetadata)
+                self.assertEqual(uffz_file.filemetadata['source_file_path'], afm_file.filemetadata['file_path'])
+                nb_curves = afm_file.filemetadata['Entry_tot_nb_curve'] if afm_file.isFV else 1
+                for curveidx in sorted({0, nb_curves // 2, nb_curves - 1}):
+                    self.assertSameCurve(uffz_file.getcurve(curveidx), afm_file.getcurve(curveidx))
+                if afm_file.isFV:
+                    np.testing.assert_array_equal(uffz_file.getpiezoimg(), afm_file.getpiezoimg())
+
+    def test_cache(self):
+        file_path = os.path.join(TESTFILES_DIR, TEST_FILES[0])
+        afm_file = loadfile(file_path)
+        first_load = loadfile(file_path, cache=self.tempdir)
+        self.assertEqual(len(os.listdir(self.tempdir)), 1)
+        cached_file = loadfile(file_path, cache=self.tempdir)
+        self.assertIsNotNone(cached_file._uffzdata)
+        self.assertEqual(cached_file.filemetadata['file_path'], file_path)
+        self.assertSameMetadata(cached_file.filemetadata, afm_file.filemetadata)
+        for curveidx in (0, 5, afm_file.filemetadata['Entry_tot_nb_curve'] - 1):
+            self.assertSameCurve(first_load.getcurve(curveidx), afm_file.getcurve(curveidx))
+            self.assertSameCurve(cached_file.getcurve(curveidx), afm_file.getcurve(curveidx))
+
+    def test_cache_incomplete_metadata(self):
+        # The file is not cached if its metadata can not be stored.
+        file_path = os.path.join(TESTFILES_DIR, TEST_FILES[2])
+        afm_file = loadfile(file_path)
+        afm_file.filemetadata['not_serializable'] = object()
+        self.assertIsNone(saveUFFcache(file_path, self.tempdir, afm_file))
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+if __name__ == '__main__':
+    unittest.main()